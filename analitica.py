@@ -0,0 +1,321 @@
+import argparse
+import functools
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+import database
+from archivo import ruta_archivo
+from database import conexion, enviar_escritura
+from trabajos import tipo_trabajo
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+# Snapshot analítico: los ítems de los pedidos cerrados (Completado/Cancelado) se copian a un
+# dataset Parquet particionado por mes (mes=AAAA-MM/...). Los reportes históricos leen de ahí
+# solo las columnas y los meses que necesitan, sin tocar la base transaccional.
+#
+# Cada cierre de pedido deja una fila en cola_analitica (triggers de las migraciones 7 y 11). La
+# marca de agua (último seq exportado) vive en estado.json junto al dataset, así cada corrida
+# solo agrega lo nuevo. Si un pedido cerrado cambia de estado (Completado -> Cancelado, o se
+# reabre), se exporta otra vez y al leer gana la versión con el seq más alto; si esa versión ya
+# no está cerrada, el pedido no cuenta.
+#
+# Los pedidos movidos a la base histórica (archivo.py) se leen de ella, adjunta a la consulta:
+# la cola puede tenerlos pendientes y la reconstrucción los vuelve a incluir.
+#
+#   python analitica.py snapshot
+#   python analitica.py snapshot --reconstruir     # borra el dataset y lo genera desde cero
+
+DIRECTORIO_ANALITICA = os.path.join("analitica", "items_pedido")
+ARCHIVO_ESTADO = "estado.json"
+# Pedidos por lote: cada lote es una consulta y una escritura de archivos Parquet
+PEDIDOS_POR_LOTE = 50_000
+
+# Columnas del dataset: (nombre, tipo pyarrow)
+COLUMNAS = [
+    ("seq", "int64"),
+    ("id_item", "int64"),
+    ("id_pedido", "int64"),
+    ("fecha", "string"), # día de creación del pedido, AAAA-MM-DD
+    ("estado", "string"),
+    ("id_cliente", "int64"),
+    ("cliente", "string"),
+    ("id_producto", "int64"),
+    ("producto", "string"),
+    ("cantidad", "int64"),
+    ("precio_unitario", "float64"),
+    ("subtotal", "float64"),
+    ("mes", "string"), # columna de partición
+]
+
+ESTADOS_CERRADOS = ("Completado", "Cancelado")
+
+DIMENSIONES = {
+    'Mes': ["mes"],
+    'Producto': ["id_producto", "producto"],
+    'Cliente': ["id_cliente", "cliente"],
+}
+
+_snapshot_lock = threading.Lock()
+
+
+def disponible():
+    """True si pyarrow está instalado (sin él no hay snapshot analítico)."""
+    try:
+        import pyarrow # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+    except ImportError:
+        raise ValueError("El modo analítico necesita 'pyarrow' (está en requirements.txt).")
+    return pa, ds
+
+
+def _historica():
+    """{'archivo': ruta} de la base histórica de la base actual, si existe (para adjuntarla)."""
+    ruta = ruta_archivo()
+    return {'archivo': ruta} if os.path.exists(ruta) else None
+
+
+def _particionado(pa, ds):
+    return ds.partitioning(pa.schema([("mes", pa.string())]), flavor="hive")
+
+
+def directorio_analitica():
+    """Dataset de la base actual: DIRECTORIO_ANALITICA para DB_NAME, analitica/<base>/items_pedido para cada sucursal."""
+    db_path = database.base_actual()
+    if db_path == database.DB_NAME:
+        return DIRECTORIO_ANALITICA
+    return os.path.join("analitica", os.path.splitext(os.path.basename(db_path))[0], "items_pedido")
+
+
+def leer_estado(directorio=None):
+    """Marca de agua y totales del último snapshot (dict vacío si aún no hay)."""
+    directorio = directorio or directorio_analitica()
+    ruta = os.path.join(directorio, ARCHIVO_ESTADO)
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _guardar_estado(estado, directorio):
+    ruta = os.path.join(directorio, ARCHIVO_ESTADO)
+    temporal = ruta + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(estado, f, ensure_ascii=False, indent=2)
+    os.replace(temporal, ruta) # atómico: nunca queda un estado.json a medias
+
+
+def pendientes_snapshot_db(directorio=None):
+    """Número de cierres de pedido aún no exportados al snapshot."""
+    marca = leer_estado(directorio).get('marca_agua', 0)
+    with conexion() as conn:
+        return conn.execute("SELECT COUNT(*) FROM cola_analitica WHERE seq > ?", (marca,)).fetchone()[0]
+
+
+def actualizar_snapshot(directorio=None, progreso=None):
+    """
+    Agrega al dataset los pedidos cerrados desde la última corrida.
+    Devuelve un dict con pedidos y filas exportados y la nueva marca de agua.
+    """
+    pa, ds = _pyarrow()
+    esquema = pa.schema([(nombre, getattr(pa, tipo)()) for nombre, tipo in COLUMNAS])
+    directorio = directorio or directorio_analitica()
+
+    with _snapshot_lock: # dos corridas a la vez escribirían lo mismo dos veces
+        os.makedirs(directorio, exist_ok=True)
+        estado = leer_estado(directorio)
+        marca = estado.get('marca_agua', 0)
+        with conexion() as conn:
+            hasta, pendientes = conn.execute("SELECT MAX(seq), COUNT(*) FROM cola_analitica WHERE seq > ?", (marca,)).fetchone()
+        resultado = {'pedidos': 0, 'filas': 0, 'marca_agua': marca}
+        if not pendientes:
+            return resultado
+
+        historica = _historica()
+        # Versión actual de cada pedido de la cola; un pedido reabierto entra con su estado abierto
+        sql_filas = """
+            SELECT q.seq, i.id, p.id, date(p.fecha_creacion), p.estado, p.id_cliente, p.nombre_cliente,
+                   i.id_producto, i.nombre_producto, i.cantidad, i.precio_unitario, i.subtotal,
+                   strftime('%Y-%m', p.fecha_creacion)
+            FROM cola_analitica q
+            JOIN main.pedidos p ON p.id = q.id_pedido
+            JOIN main.items_pedido i ON i.id_pedido = p.id
+            WHERE q.seq > :desde AND q.seq <= :hasta AND p.fecha_creacion IS NOT NULL
+        """
+        if historica:
+            sql_filas += """
+            UNION ALL
+            SELECT q.seq, i.id, p.id, date(p.fecha_creacion), p.estado, p.id_cliente, p.nombre_cliente,
+                   i.id_producto, i.nombre_producto, i.cantidad, i.precio_unitario, i.subtotal,
+                   strftime('%Y-%m', p.fecha_creacion)
+            FROM cola_analitica q
+            JOIN archivo.pedidos p ON p.id = q.id_pedido
+            JOIN archivo.items_pedido i ON i.id_pedido = p.id
+            WHERE q.seq > :desde AND q.seq <= :hasta AND p.fecha_creacion IS NOT NULL
+              AND p.id NOT IN (SELECT id FROM main.pedidos)
+            """
+
+        while marca < hasta:
+            with conexion(adjuntas=historica) as conn:
+                # seq del último pedido de este lote
+                fin_lote = conn.execute("""
+                    SELECT MAX(seq) FROM (SELECT seq FROM cola_analitica WHERE seq > ? AND seq <= ? ORDER BY seq LIMIT ?)
+                """, (marca, hasta, PEDIDOS_POR_LOTE)).fetchone()[0]
+                filas = conn.execute(sql_filas, {'desde': marca, 'hasta': fin_lote}).fetchall()
+                pedidos_lote = conn.execute("SELECT COUNT(*) FROM cola_analitica WHERE seq > ? AND seq <= ?",
+                                            (marca, fin_lote)).fetchone()[0]
+
+            if filas:
+                tabla = pa.Table.from_arrays(
+                    [pa.array(valores, type=esquema.field(i).type) for i, valores in enumerate(zip(*filas))],
+                    schema=esquema)
+                # Nombre de archivo único por lote: las corridas nuevas nunca pisan archivos previos
+                ds.write_dataset(tabla, directorio, format="parquet", partitioning=_particionado(pa, ds),
+                                 basename_template=f"parte-{fin_lote}-{{i}}.parquet",
+                                 existing_data_behavior="overwrite_or_ignore")
+
+            marca = fin_lote
+            resultado['pedidos'] += pedidos_lote
+            resultado['filas'] += len(filas)
+            estado.update({
+                'marca_agua': marca,
+                'ultima_actualizacion': datetime.now().isoformat(timespec="seconds"),
+                'filas': estado.get('filas', 0) + len(filas),
+                'pedidos': estado.get('pedidos', 0) + pedidos_lote,
+            })
+            _guardar_estado(estado, directorio)
+            if progreso is not None:
+                progreso(resultado['pedidos'] / pendientes, f"{resultado['pedidos']:,} de {pendientes:,} pedidos")
+
+        # La cola ya exportada no se vuelve a leer
+        enviar_escritura(_vaciar_cola, marca).result()
+        resultado['marca_agua'] = marca
+    _leer_agregado.cache_clear()
+    return resultado
+
+
+def _vaciar_cola(conn, marca):
+    conn.execute("DELETE FROM cola_analitica WHERE seq <= ?", (marca,))
+
+
+def reconstruir_snapshot(directorio=None, progreso=None):
+    """Borra el dataset y vuelve a encolar todos los pedidos cerrados, también los archivados."""
+    directorio = directorio or directorio_analitica()
+    historica = _historica()
+    archivados = []
+    if historica:
+        # Se leen antes: el escritor no puede adjuntar otra base en medio de su transacción
+        with conexion(historica['archivo']) as conn:
+            archivados = [fila[0] for fila in conn.execute("SELECT id FROM pedidos")]
+
+    def reencolar(conn):
+        ids = {fila[0] for fila in conn.execute("SELECT id FROM pedidos WHERE estado IN (?, ?)", ESTADOS_CERRADOS)}
+        ids.update(archivados)
+        conn.execute("DELETE FROM cola_analitica")
+        conn.executemany("INSERT INTO cola_analitica (id_pedido) VALUES (?)", [(id_pedido,) for id_pedido in sorted(ids)])
+
+    with _snapshot_lock:
+        if os.path.isdir(directorio):
+            shutil.rmtree(directorio)
+        enviar_escritura(reencolar).result()
+    return actualizar_snapshot(directorio, progreso)
+
+
+@tipo_trabajo("snapshot_analitica", "Actualizar el snapshot analítico (Parquet)")
+def trabajo_snapshot(parametros, progreso):
+    if parametros.get('reconstruir'):
+        reconstruir_snapshot(progreso=progreso)
+    else:
+        actualizar_snapshot(progreso=progreso)
+    return None
+
+
+# --- Lectura (solo Parquet, nunca SQLite) ---
+def leer_items(columnas, fecha_desde=None, fecha_hasta=None, estados=None, directorio=None):
+    """
+    Ítems del snapshot con solo `columnas`, filtrando por rango de fechas y estados.
+    El rango de fechas descarta meses completos por la partición antes de abrir archivos.
+    """
+    pa, ds = _pyarrow()
+    directorio = directorio or directorio_analitica()
+    if not os.path.isdir(directorio):
+        return pd.DataFrame(columns=list(columnas))
+    dataset = ds.dataset(directorio, format="parquet", partitioning=_particionado(pa, ds),
+                         exclude_invalid_files=True, ignore_prefixes=[".", "_", ARCHIVO_ESTADO])
+    filtro = None
+
+    def y(expresion):
+        return expresion if filtro is None else filtro & expresion
+
+    if fecha_desde:
+        fecha_desde = str(fecha_desde)[:10]
+        filtro = y((ds.field("mes") >= fecha_desde[:7]) & (ds.field("fecha") >= fecha_desde))
+    if fecha_hasta:
+        fecha_hasta = str(fecha_hasta)[:10]
+        filtro = y((ds.field("mes") <= fecha_hasta[:7]) & (ds.field("fecha") <= fecha_hasta))
+
+    # seq, id_item y estado se leen siempre: primero se toma la última versión de cada ítem y
+    # solo después se filtra por estado (un Completado que luego se canceló ya no es Completado,
+    # y uno reabierto ya no cuenta)
+    leer = list(dict.fromkeys(["seq", "id_item", "estado"] + list(columnas)))
+    df = dataset.to_table(columns=leer, filter=filtro).to_pandas()
+    if df['id_item'].duplicated().any():
+        df = df.sort_values("seq").drop_duplicates("id_item", keep="last")
+    df = df[df['estado'].isin(ESTADOS_CERRADOS)]
+    if estados:
+        df = df[df['estado'].isin(list(estados))]
+    return df[list(columnas)]
+
+
+@functools.lru_cache(maxsize=32)
+def _leer_agregado(dimension, fecha_desde, fecha_hasta, estados, marca_agua, directorio):
+    claves = DIMENSIONES[dimension]
+    df = leer_items(claves + ["id_pedido", "cantidad", "subtotal"], fecha_desde, fecha_hasta, estados, directorio)
+    if df.empty:
+        return pd.DataFrame(columns=claves + ["Pedidos", "Cantidad", "Ingresos"])
+    agregado = (df.groupby(claves, as_index=False)
+                  .agg(Pedidos=("id_pedido", "nunique"), Cantidad=("cantidad", "sum"), Ingresos=("subtotal", "sum")))
+    orden = claves if dimension == 'Mes' else ["Ingresos"]
+    return agregado.sort_values(orden, ascending=dimension == 'Mes').reset_index(drop=True)
+
+
+def reporte_historico(dimension='Mes', fecha_desde=None, fecha_hasta=None, estados=("Completado",),
+                      directorio=None):
+    """
+    Pedidos, cantidad e ingresos históricos agrupados por mes, producto o cliente.
+    En caché hasta que el snapshot avanza (la clave incluye la marca de agua).
+    """
+    directorio = directorio or directorio_analitica()
+    marca = leer_estado(directorio).get('marca_agua', 0)
+    return _leer_agregado(dimension, str(fecha_desde or "") or None, str(fecha_hasta or "") or None,
+                          tuple(estados or ()), marca, directorio)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Snapshot analítico en Parquet de Alex Fruver ERP")
+    parser.add_argument("comando", choices=["snapshot"])
+    parser.add_argument("--reconstruir", action="store_true", help="Borra el dataset y lo genera desde cero")
+    parser.add_argument("--directorio", default=None, help="Por defecto: el dataset de la base elegida")
+    parser.add_argument("--db", default=database.DB_NAME, help="Archivo de base de datos (por defecto: %(default)s)")
+    args = parser.parse_args()
+
+    database.seleccionar_base(args.db) # el dataset por defecto depende de la base (ver directorio_analitica)
+    directorio = args.directorio or directorio_analitica()
+    if args.reconstruir:
+        resultado = reconstruir_snapshot(directorio)
+    else:
+        resultado = actualizar_snapshot(directorio)
+    print(f"{resultado['pedidos']:,} pedidos ({resultado['filas']:,} ítems) exportados a {directorio}; "
+          f"marca de agua {resultado['marca_agua']}")
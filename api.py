@@ -0,0 +1,180 @@
+import argparse
+import json
+import os
+import re
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import database
+from database import ESTADOS_PEDIDO
+from datos import crear_pedido_db, init_db, obtener_producto_por_id_db, stock_productos_db, update_pedido_estado_db
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+# API HTTP/JSON para tomar pedidos sin pasar por la interfaz de Streamlit (cajas POS y
+# terminales de los repartidores). Usa la misma capa de datos (datos.py) y el mismo archivo
+# SQLite que la app, y puede correr al mismo tiempo que ella:
+#
+#   python api.py --host 0.0.0.0 --puerto 8502
+#
+#   GET   /salud
+#   GET   /productos/stock?ids=1,2,3        stock actual (todos los productos si no hay ids)
+#   GET   /productos/<id>
+#   POST  /pedidos                          {"id_cliente": 1, "items": [{"id_producto": 3, "cantidad": 2}],
+#                                            "fecha_entrega_estimada": "2025-06-01", "estado": "Pendiente"}
+#   PATCH /pedidos/<id>/estado              {"estado": "Completado"}   (también se acepta POST)
+#
+# Si se define ALEXFRUVER_API_TOKEN, cada petición debe enviar "Authorization: Bearer <token>".
+
+PUERTO_POR_DEFECTO = 8502
+MAX_CUERPO_BYTES = 1024 * 1024
+TOKEN = os.environ.get("ALEXFRUVER_API_TOKEN")
+
+_RUTA_PRODUCTO = re.compile(r"^/productos/(\d+)$")
+_RUTA_ESTADO = re.compile(r"^/pedidos/(\d+)/estado$")
+
+
+class ErrorApi(Exception):
+    def __init__(self, estado_http, mensaje):
+        super().__init__(mensaje)
+        self.estado_http = estado_http
+        self.mensaje = mensaje
+
+
+class ManejadorApi(BaseHTTPRequestHandler):
+    # HTTP/1.1: los clientes reutilizan la conexión (keep-alive) entre pedidos
+    protocol_version = "HTTP/1.1"
+    # Cabeceras y cuerpo salen en escrituras separadas: sin esto, Nagle + ACK retrasado
+    # del cliente añaden ~40 ms a cada respuesta sobre una conexión keep-alive
+    disable_nagle_algorithm = True
+    server_version = "AlexFruverAPI/1.0"
+    registrar_peticiones = False
+
+    def do_GET(self):
+        self._atender(self._get)
+
+    def do_POST(self):
+        self._atender(self._post)
+
+    def do_PATCH(self):
+        self._atender(self._post)
+
+    # --- Rutas ---
+    def _get(self, ruta, consulta):
+        if ruta == "/salud":
+            return 200, {'estado': 'ok', 'db': database.DB_NAME}
+        if ruta == "/productos/stock":
+            ids = None
+            if consulta.get("ids"):
+                try:
+                    ids = tuple(sorted({int(i) for i in consulta["ids"][0].split(",") if i.strip()}))
+                except ValueError:
+                    raise ErrorApi(400, "El parámetro 'ids' debe ser una lista de enteros separada por comas")
+            return 200, {'productos': stock_productos_db(ids)}
+        coincidencia = _RUTA_PRODUCTO.match(ruta)
+        if coincidencia:
+            producto = obtener_producto_por_id_db(int(coincidencia.group(1)))
+            if producto is None:
+                raise ErrorApi(404, "Producto no encontrado")
+            return 200, producto
+        raise ErrorApi(404, f"Ruta no encontrada: {ruta}")
+
+    def _post(self, ruta, consulta):
+        cuerpo = self._leer_json()
+        if ruta == "/pedidos" and self.command == "POST":
+            try:
+                pedido = crear_pedido_db(
+                    cuerpo.get("id_cliente"),
+                    cuerpo.get("items") or [],
+                    fecha_entrega_estimada=cuerpo.get("fecha_entrega_estimada"),
+                    estado=cuerpo.get("estado") or "Pendiente",
+                )
+            except (KeyError, TypeError, AttributeError):
+                raise ErrorApi(400, "Cada ítem necesita 'id_producto' y 'cantidad'")
+            except ValueError as e:
+                raise ErrorApi(400, str(e))
+            return 201, pedido
+        coincidencia = _RUTA_ESTADO.match(ruta)
+        if coincidencia:
+            estado = cuerpo.get("estado")
+            if estado not in ESTADOS_PEDIDO:
+                raise ErrorApi(400, f"Estado inválido: {estado!r}. Opciones: {', '.join(ESTADOS_PEDIDO)}")
+            resultado = update_pedido_estado_db(int(coincidencia.group(1)), estado)
+            if resultado is None:
+                raise ErrorApi(404, "Pedido no encontrado")
+            return 200, resultado
+        raise ErrorApi(404, f"Ruta no encontrada: {self.command} {ruta}")
+
+    # --- Infraestructura ---
+    def _atender(self, manejador):
+        url = urlparse(self.path)
+        try:
+            if TOKEN and self.headers.get("Authorization") != f"Bearer {TOKEN}":
+                raise ErrorApi(401, "Token inválido o ausente")
+            estado_http, respuesta = manejador(url.path.rstrip("/") or "/", parse_qs(url.query))
+        except ErrorApi as e:
+            estado_http, respuesta = e.estado_http, {'error': e.mensaje}
+        except Exception as e:
+            self.log_error("Error atendiendo %s %s: %r", self.command, self.path, e)
+            estado_http, respuesta = 500, {'error': "Error interno del servidor"}
+        self._responder(estado_http, respuesta)
+
+    def _leer_json(self):
+        longitud = int(self.headers.get("Content-Length") or 0)
+        if longitud > MAX_CUERPO_BYTES:
+            raise ErrorApi(413, "Cuerpo de la petición demasiado grande")
+        datos = self.rfile.read(longitud) if longitud else b"{}"
+        try:
+            cuerpo = json.loads(datos)
+        except ValueError:
+            raise ErrorApi(400, "El cuerpo no es JSON válido")
+        if not isinstance(cuerpo, dict):
+            raise ErrorApi(400, "El cuerpo debe ser un objeto JSON")
+        return cuerpo
+
+    def _responder(self, estado_http, respuesta):
+        cuerpo = json.dumps(respuesta, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(estado_http)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        if self.registrar_peticiones:
+            super().log_message(formato, *args)
+
+    def log_error(self, formato, *args):
+        # Los errores se registran siempre, aunque el registro de peticiones esté apagado
+        BaseHTTPRequestHandler.log_message(self, formato, *args)
+
+
+class ServidorApi(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128 # ráfagas de terminales conectándose a la vez
+
+
+def crear_servidor(host="127.0.0.1", puerto=PUERTO_POR_DEFECTO, registrar_peticiones=False):
+    """Inicializa la base (migraciones) y devuelve el servidor listo para serve_forever()."""
+    init_db()
+    ManejadorApi.registrar_peticiones = registrar_peticiones
+    return ServidorApi((host, puerto), ManejadorApi)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API HTTP de pedidos de Alex Fruver ERP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=PUERTO_POR_DEFECTO)
+    parser.add_argument("--db", default=database.DB_NAME, help="Archivo de base de datos (por defecto: %(default)s)")
+    parser.add_argument("--verbose", action="store_true", help="Registra cada petición en la consola")
+    args = parser.parse_args()
+
+    database.DB_NAME = args.db
+    servidor = crear_servidor(args.host, args.puerto, args.verbose)
+    print(f"API de Alex Fruver escuchando en http://{args.host}:{servidor.server_address[1]} (db: {args.db})")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        database.cerrar_pools()
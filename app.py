@@ -1,413 +1,361 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime
-import sqlite3
+import functools
+import uuid
+from datetime import date, datetime, timedelta
 
 # Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
-# Configuración de la base de datos
-DB_NAME = 'alexfruver_erp.db' # NOMBRE DE LA BASE DE DATOS ACTUALIZADO
+# Configuración de la base de datos (nombre del archivo y pool de conexiones en database.py)
+from database import ESTADOS_PEDIDO, seleccionar_base
+import analitica
+from inventario import historial_movimientos_db, registrar_movimiento_db, stock_en_fecha_db
+from pronostico import DIAS_REPOSICION, DIAS_REVISION, NIVEL_SERVICIO, pronostico_pendiente_db, sugerencias_compra_db
+from archivo import EDAD_ARCHIVO_DIAS, obtener_pedido_archivado_db, sugerir_pedidos_archivados_db
+from carrito import Carrito
+from despacho import ESTADOS_DESPACHO, hoja_despacho_html, lista_despacho, lista_despacho_csv
+# Funciones de acceso a datos (sin Streamlit, ver datos.py)
+from datos import (ORDEN_CLIENTES, ORDEN_PEDIDOS, ORDEN_PRODUCTOS, add_cliente_db, add_pedido_db, add_producto_db,
+                   catalogo_productos_db, delete_cliente_db, delete_producto_db, get_categorias_db, init_db, listar_clientes_db,
+                   listar_pedidos_db, listar_productos_db, obtener_cliente_por_id_db, obtener_producto_por_id_db,
+                   sugerir_clientes_db, sugerir_pedidos_db, sugerir_productos_db, update_cliente_db,
+                   update_pedido_estado_db, update_producto_db)
+from exportacion import CONJUNTOS, FORMATOS
+from importacion import importar_pedidos_db, leer_archivo_pedidos
+from sucursales import SUCURSAL_PRINCIPAL, crear_sucursal, listar_sucursales, reporte_consolidado
+from reportes import (PERIODOS, pedidos_por_estado_db, productos_bajo_stock_db, productos_mas_vendidos_db,
+                      reporte_stock_db, resumen_general_db, ventas_por_periodo_db)
+from trabajos import TIPOS, enviar_trabajo, leer_resultado, listar_trabajos_db, ultimo_trabajo_db
+import trazas
 
 # ==============================================================================
-# 1. FUNCIONES DE INICIALIZACIÓN Y TABLAS
+# 1. INICIALIZACIÓN
 # ==============================================================================
-def init_db():
-    """Inicializa la base de datos y crea las tablas si no existen, asegurando la estructura correcta."""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-
-    # --- DEFINICIÓN DE TABLAS ---
-
-    # Tabla clientes (Se mantiene igual)
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS clientes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre TEXT NOT NULL,
-            contacto TEXT,
-            email TEXT,
-            telefono TEXT,
-            direccion TEXT
-        )
-    ''')
-
-    # Tabla CATEGORIAS
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS categorias (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre TEXT NOT NULL UNIQUE
-        )
-    ''')
-    
-    # Tabla PRODUCTOS (CORREGIDA: Añade 'costo_flete_unitario' y elimina 'DROP TABLE')
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS productos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre TEXT NOT NULL UNIQUE,
-            descripcion TEXT,
-            precio_unitario REAL NOT NULL,
-            costo_flete_unitario REAL DEFAULT 0.0,
-            stock INTEGER,
-            id_categoria INTEGER,         
-            unidad_medida TEXT,           
-            FOREIGN KEY (id_categoria) REFERENCES categorias(id)
-        )
-    ''')
-
-    # Tabla pedidos (Simplificada a la versión original sin la columna 'items' JSON)
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS pedidos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            id_cliente INTEGER NOT NULL,
-            nombre_cliente TEXT NOT NULL,
-            fecha_creacion TEXT,
-            fecha_entrega_estimada TEXT,
-            estado TEXT,
-            total REAL,
-            FOREIGN KEY (id_cliente) REFERENCES clientes(id)
-        )
-    ''')
-
-    # Tabla items de pedido
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS items_pedido (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            id_pedido INTEGER NOT NULL,
-            id_producto INTEGER NOT NULL,
-            nombre_producto TEXT NOT NULL,
-            cantidad INTEGER NOT NULL,
-            precio_unitario REAL NOT NULL,
-            subtotal REAL NOT NULL,
-            FOREIGN KEY (id_pedido) REFERENCES pedidos(id),
-            FOREIGN KEY (id_producto) REFERENCES productos(id)
-        )
-    ''')
-
-    conn.commit()
-
-    # --- INSERCIÓN DE DATOS INICIALES ---
-
-    # 1. POBLACIÓN INICIAL DE CATEGORÍAS (Alex Fruver)
-    categorias_iniciales = ["Fruta", "Verdura", "Otros"]
-    for cat_nombre in categorias_iniciales:
-        try:
-            c.execute("INSERT INTO categorias (nombre) VALUES (?)", (cat_nombre,))
-        except sqlite3.IntegrityError:
-            pass # Si ya existe, no hace nada
-    conn.commit()
-    
-    # 2. Obtener el mapa de IDs de categorías
-    c.execute("SELECT id, nombre FROM categorias")
-    categorias_map = {nombre: id for id, nombre in c.fetchall()}
-    
-    id_fruta = categorias_map.get("Fruta")
-    id_verdura = categorias_map.get("Verdura")
-
-    # 3. Datos de los 39 Productos (Precio Venta COP/Kg)
-    # Formato: (Nombre, id_cat, Precio_Venta_Final)
-    productos_data = [
-        # --- FRUTAS (15 productos) ---
-        ("Mango", id_fruta, 3374), 
-        ("Papaya", id_fruta, 1644), 
-        ("Piña", id_fruta, 1361),
-        ("Banano", id_fruta, 3708), 
-        ("Guayaba", id_fruta, 2180), 
-        ("Maracuyá", id_fruta, 2081),
-        ("Naranja", id_fruta, 2011), 
-        ("Limón", id_fruta, 1736), 
-        ("Mandarina", id_fruta, 3632),
-        ("Manzana", id_fruta, 1614), 
-        ("Pera", id_fruta, 3496), 
-        ("Durazno", id_fruta, 3705),
-        ("Aguacate", id_fruta, 3065), 
-        ("Tomate de Di", id_fruta, 1564), 
-        ("Mora", id_fruta, 3214),
-        
-        # --- VERDURAS/HORTALIZAS (24 productos) ---
-        ("Lechuga", id_verdura, 2862), 
-        ("Repollo", id_verdura, 1384), 
-        ("Espinaca", id_verdura, 1377),
-        ("Tomate", id_verdura, 1585), 
-        ("Pepino", id_verdura, 1995), 
-        ("Calabacín", id_verdura, 2041),
-        ("Pimentón", id_verdura, 2934), 
-        ("Zanahoria", id_verdura, 3251), 
-        ("Remolacha", id_verdura, 1366),
-        ("Rábano", id_verdura, 3118), 
-        ("Cebolla bl", id_verdura, 1931), 
-        ("Cebolla rc", id_verdura, 3625),
-        ("Ajo", id_verdura, 3408), 
-        ("Apio", id_verdura, 3577), 
-        ("Cilantro", id_verdura, 3065),
-        ("Cebollín", id_verdura, 2654), 
-        ("Ají", id_verdura, 2001), 
-        ("Jengibre", id_verdura, 2750),
-        ("Yuca", id_verdura, 3209), 
-        ("Ñame", id_verdura, 2190), 
-        ("Brócoli", id_verdura, 3921),
-        ("Papa", id_verdura, 1300), 
-        ("Plátano", id_verdura, 3766), 
-        ("Ahuyama", id_verdura, 3920) 
-    ]
-    
-    # 4. Insertar Productos solo si la tabla está vacía
-    c.execute("SELECT COUNT(*) FROM productos")
-    if c.fetchone()[0] == 0:
-        for nombre, id_cat, precio_venta in productos_data:
-            try:
-                c.execute("""
-                    INSERT INTO productos (nombre, descripcion, precio_unitario, costo_flete_unitario, stock, id_categoria, unidad_medida) 
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (nombre, 'Producto fresco', precio_venta, 0.0, 100, id_cat, 'Kg')) 
-            except sqlite3.IntegrityError:
-                pass # Evita error si el nombre ya existía (aunque ya se chequeó si la tabla estaba vacía)
-                
-    conn.commit()
-    conn.close()
+# Debe ser la primera llamada de Streamlit (la barra lateral de sucursales se dibuja enseguida)
+st.set_page_config(layout="wide", page_title="Alex Fruver ERP - Gestión de Productos Frescos")
 
-# Inicialización de datos
-init_db()
+# Instrumentación opcional: solo se mide esta recarga si la sesión activó el panel de rendimiento
+if st.session_state.get("panel_rendimiento", trazas.ACTIVAS_POR_DEFECTO):
+    registro_rerun = trazas.iniciar_rerun()
+else:
+    registro_rerun = None
+    trazas.terminar_rerun()
 
-if 'current_order_items' not in st.session_state:
-    st.session_state.current_order_items = []
+@st.cache_resource(show_spinner=False)
+def inicializar_bd(ruta):
+    """
+    Ejecuta init_db una sola vez por proceso del servidor (y por archivo de sucursal).
+    Streamlit re-ejecuta este script en cada interacción; gracias a la caché de recursos
+    las siguientes recargas no tocan el esquema ni los datos iniciales.
+    """
+    return init_db()
+
+if 'carrito' not in st.session_state:
+    st.session_state.carrito = Carrito()
+
+# Sucursal de la sesión: cada una tiene su propio archivo SQLite (ver sucursales.py). Se fija
+# para este hilo antes de cualquier consulta; los fragmentos la vuelven a fijar al re-ejecutarse.
+sucursales = listar_sucursales()
+if st.session_state.get("sucursal") not in sucursales:
+    st.session_state.sucursal = SUCURSAL_PRINCIPAL
+if len(sucursales) > 1:
+    # Los ids del pedido en construcción son de la sucursal anterior: al cambiar se vacía
+    st.sidebar.selectbox("Sucursal", list(sucursales), key="sucursal", on_change=lambda: st.session_state.carrito.vaciar())
+# Los fragmentos usan la base guardada en la sesión, sin volver a listar las sucursales
+st.session_state.base_sucursal = sucursales[st.session_state.sucursal]
+seleccionar_base(st.session_state.base_sucursal)
+with st.sidebar.expander("Nueva sucursal", expanded="sucursal_creada" in st.session_state):
+    # El aviso se guarda en la sesión: el st.rerun() que muestra la sucursal nueva borraría un st.success
+    if "sucursal_creada" in st.session_state:
+        st.success(st.session_state.pop("sucursal_creada"))
+    nombre_sucursal = st.text_input("Nombre", key="nueva_sucursal_nombre")
+    if st.button("Crear sucursal", key="btn_crear_sucursal"):
+        try:
+            st.session_state.sucursal_creada = f"Sucursal creada en {crear_sucursal(nombre_sucursal)}."
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            st.rerun()
+
+# Inicialización de datos (una vez por proceso y sucursal; devuelve los tiempos del arranque)
+tiempos_arranque = inicializar_bd(st.session_state.base_sucursal)
+if 'id_sesion' not in st.session_state:
+    st.session_state.id_sesion = uuid.uuid4().hex
 
 # ==============================================================================
-# 2. FUNCIONES DE INTERACCIÓN CON LA BASE DE DATOS
+# 2. FUNCIONES AUXILIARES DE LA INTERFAZ
 # ==============================================================================
 
-# --- Funciones para clientes (Se mantienen igual) ---
-def add_cliente_db(nombre, contacto, email, telefono, direccion):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("INSERT INTO clientes (nombre, contacto, email, telefono, direccion) VALUES (?, ?, ?, ?, ?)",
-              (nombre, contacto, email, telefono, direccion))
-    new_id = c.lastrowid
-    conn.commit()
-    conn.close()
-    return new_id
-
-def get_clientes_db():
-    conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql_query("SELECT * FROM clientes", conn)
-    conn.close()
-    return df.to_dict(orient='records')
-
-def obtener_cliente_por_id_db(id_cliente):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT * FROM clientes WHERE id = ?", (id_cliente,))
-    cliente_data = c.fetchone()
-    conn.close()
-    if cliente_data:
-        columns = [description[0] for description in c.description]
-        return dict(zip(columns, cliente_data))
-    return None
-
-def update_cliente_db(id_cliente, nombre, contacto, email, telefono, direccion):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("UPDATE clientes SET nombre = ?, contacto = ?, email = ?, telefono = ?, direccion = ? WHERE id = ?",
-              (nombre, contacto, email, telefono, direccion, id_cliente))
-    conn.commit()
-    conn.close()
-
-def delete_cliente_db(cliente_id):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("DELETE FROM clientes WHERE id = ?", (cliente_id,))
-    conn.commit()
-    conn.close()
-
-# --- Funciones para Productos (MODIFICADAS) ---
-
-# Función modificada para incluir id_categoria y unidad_medida
-def add_producto_db(nombre, descripcion, precio_unitario, stock, id_categoria, unidad_medida):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    
-    # 1. VERIFICACIÓN DE EXISTENCIA
-    c.execute("SELECT id FROM productos WHERE nombre = ?", (nombre,))
-    if c.fetchone():
-        conn.close()
-        # Devuelve None para indicar que el producto ya existe
-        return None 
-    
-    # 2. INSERCIÓN (si no existe)
-    c.execute("INSERT INTO productos (nombre, descripcion, precio_unitario, stock, id_categoria, unidad_medida) VALUES (?, ?, ?, ?, ?, ?)",
-              (nombre, descripcion, precio_unitario, stock, id_categoria, unidad_medida))
-    new_id = c.lastrowid
-    conn.commit()
-    conn.close()
-    return new_id
-
-# Función modificada para incluir CATEGORIA y UNIDAD_MEDIDA (con JOIN)
-def get_productos_db():
-    conn = sqlite3.connect(DB_NAME)
-    # Unir productos con categorías para obtener el nombre de la categoría
-    query = """
-    SELECT 
-        p.id, 
-        p.nombre, 
-        c.nombre AS categoria, 
-        p.descripcion, 
-        p.precio_unitario, 
-        p.stock, 
-        p.unidad_medida,
-        p.id_categoria -- Mantener el ID para la edición
-    FROM productos p
-    LEFT JOIN categorias c ON p.id_categoria = c.id
-    """
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    return df.to_dict(orient='records')
-
-def obtener_producto_por_id_db(id_producto):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    # Modificado para traer la categoria y unidad
-    c.execute("""
-        SELECT p.*, c.nombre AS nombre_categoria 
-        FROM productos p 
-        LEFT JOIN categorias c ON p.id_categoria = c.id
-        WHERE p.id = ?
-    """, (id_producto,))
-    producto_data = c.fetchone()
-    conn.close()
-    if producto_data:
-        # Nota: La descripción del cursor contendrá las columnas de ambas tablas
-        columns = [description[0] for description in c.description] 
-        return dict(zip(columns, producto_data))
-    return None
-
-# Función modificada para incluir id_categoria y unidad_medida
-def update_producto_db(id_producto, nombre, descripcion, precio_unitario, stock, id_categoria, unidad_medida):
-    """
-    Actualiza la información completa de un producto por su ID.
-    
-    CORRECCIÓN: Se asegura que el SQL y el tuple de valores tengan 8 elementos, 
-    incluyendo costo_flete_unitario con valor 0.0, para asegurar la consistencia con la tabla de productos.
-    """
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    
-    # 8 marcadores de posición (?) en el SQL (7 en SET + 1 en WHERE)
-    c.execute("""
-        UPDATE productos 
-        SET 
-            nombre = ?, 
-            descripcion = ?, 
-            precio_unitario = ?, 
-            costo_flete_unitario = ?,  
-            stock = ?, 
-            id_categoria = ?, 
-            unidad_medida = ? 
-        WHERE id = ?
-    """,
-    # 8 variables en el tuple, con costo_flete_unitario fijado a 0.0:
-    (
-        nombre, 
-        descripcion, 
-        precio_unitario, 
-        0.0, # <--- Valor fijo para costo_flete_unitario
-        stock, 
-        id_categoria, 
-        unidad_medida, 
-        id_producto
-    ))
-    conn.commit()
-    conn.close()
-
-# Actualizar solo el stock de un producto (Se mantiene igual)
-def update_producto_stock_db(id_producto, nueva_cantidad_stock):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("UPDATE productos SET stock = ? WHERE id = ?",
-              (nueva_cantidad_stock, id_producto))
-    conn.commit()
-    conn.close()
-
-def delete_producto_db(producto_id):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("DELETE FROM productos WHERE id = ?", (producto_id,))
-    conn.commit()
-    conn.close()
-
-# --- Funciones para Pedidos y Stock (Se mantienen/modificadas ligeramente) ---
-def add_pedido_db(id_cliente, nombre_cliente, fecha_creacion, fecha_entrega_estimada, estado, total, items):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    # Insertar Pedido
-    c.execute("INSERT INTO pedidos (id_cliente, nombre_cliente, fecha_creacion, fecha_entrega_estimada, estado, total) VALUES (?, ?, ?, ?, ?, ?)",
-              (id_cliente, nombre_cliente, fecha_creacion, fecha_entrega_estimada, estado, total))
-    new_pedido_id = c.lastrowid
-    # Insertar Ítems del Pedido
-    for item in items:
-        c.execute("INSERT INTO items_pedido (id_pedido, id_producto, nombre_producto, cantidad, precio_unitario, subtotal) VALUES (?, ?, ?, ?, ?, ?)",
-                  (new_pedido_id, item['id_producto'], item['nombre_producto'], item['cantidad'], item['precio_unitario'], item['subtotal']))
-    
-    conn.commit()
-    conn.close()
-    return new_pedido_id
-
-def get_pedidos_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    # Obtener pedidos principales
-    c.execute("SELECT * FROM pedidos")
-    pedidos_data = c.fetchall()
-    columns_pedidos = [description[0] for description in c.description]
-    pedidos_list = []
-    for p_data in pedidos_data:
-        pedido_dict = dict(zip(columns_pedidos, p_data))
-        # Obtener ítems para cada pedido
-        c.execute("SELECT * FROM items_pedido WHERE id_pedido = ?", (pedido_dict['id'],))
-        items_data = c.fetchall()
-        columns_items = [description[0] for description in c.description]
-        pedido_dict['items'] = [dict(zip(columns_items, item)) for item in items_data]
-        pedidos_list.append(pedido_dict)
-    
-    conn.close()
-    return pedidos_list
-
-# Función para actualizar estado de pedido y manejar el stock
-def update_pedido_estado_db(pedido_id, nuevo_estado):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
+def mostrar_resultado_estado_pedido(resultado):
+    """Muestra en la interfaz el resultado de update_pedido_estado_db."""
+    for mov in resultado['movimientos']:
+        if mov['faltante']:
+            st.warning(f"Advertencia: El stock del producto '{mov['nombre']}' (ID {mov['id_producto']}) intentó ser negativo "
+                       f"(faltaron {mov['faltante']}). Se estableció en 0.")
+        st.success(f"Stock actualizado: Producto ID {mov['id_producto']} - Cantidad vendida: {mov['cantidad_vendida']}. Nuevo stock: {mov['stock_nuevo']}")
+
+def mostrar_panel_rendimiento(registro):
+    """Panel plegable de la barra lateral con las métricas de la recarga actual (ver trazas.py)."""
+    tiempo_total = registro.tiempo_total()
+    tiempo_funciones = sum(funcion[1] for funcion in registro.funciones.values())
+    with st.sidebar.expander("⏱ Rendimiento de esta recarga"):
+        col_a, col_b = st.columns(2)
+        with col_a:
+            st.metric("Consultas SQL", registro.consultas)
+            st.metric("Tiempo SQL", f"{registro.tiempo_db * 1000:,.1f} ms")
+        with col_b:
+            st.metric("Lecturas en caché", registro.lecturas_cache)
+            st.metric("Tiempo total", f"{tiempo_total * 1000:,.1f} ms")
+        st.caption(f"Funciones de datos (SQL + pandas): {tiempo_funciones * 1000:,.1f} ms · "
+                   f"resto (interfaz y Streamlit): {max(tiempo_total - tiempo_funciones, 0) * 1000:,.1f} ms")
+
+        if registro.funciones:
+            df_funciones = pd.DataFrame(
+                [(nombre, llamadas, segundos * 1000, consultas) for nombre, (llamadas, segundos, consultas) in registro.funciones.items()],
+                columns=['Función', 'Llamadas', 'ms', 'Consultas'],
+            ).sort_values('ms', ascending=False)
+            st.dataframe(df_funciones, use_container_width=True, hide_index=True)
+
+        if trazas.consultas_lentas:
+            st.write(f"Consultas lentas (≥ {trazas.UMBRAL_LENTA_MS:g} ms, más recientes primero)")
+            st.dataframe(pd.DataFrame(list(reversed(trazas.consultas_lentas))), use_container_width=True, hide_index=True)
+
+def mostrar_trabajos_segundo_plano():
+    """Lanza reportes pesados en segundo plano (trabajos.py) y muestra su avance y descarga."""
+    with st.expander("Reportes y exportaciones en segundo plano"):
+        st.caption("Los trabajos corren en el servidor: puedes seguir usando la app y volver por el resultado.")
+        col_tipo, col_boton = st.columns([3, 1])
+        with col_tipo:
+            tipo = st.selectbox("Trabajo", list(TIPOS), format_func=lambda t: TIPOS[t][0], key="trabajo_tipo")
+        parametros = {}
+        if tipo == "reporte_dashboard":
+            parametros['umbral_stock'] = st.session_state.get("stock_slider", 10)
+        elif tipo == "exportacion":
+            col_conjunto, col_formato = st.columns(2)
+            with col_conjunto:
+                parametros['conjunto'] = st.selectbox("Datos", list(CONJUNTOS), format_func=lambda c: CONJUNTOS[c]['descripcion'], key="exportar_conjunto")
+            with col_formato:
+                parametros['formato'] = st.selectbox("Formato", list(FORMATOS), format_func=FORMATOS.get, key="exportar_formato")
+            if parametros['conjunto'] == "pedidos":
+                col_estados, col_fechas = st.columns(2)
+                with col_estados:
+                    parametros['estados'] = st.multiselect("Estados (vacío = todos)", ESTADOS_PEDIDO, key="exportar_estados")
+                with col_fechas:
+                    rango_exportar = st.date_input("Fecha de creación (opcional)", value=[], key="exportar_fechas")
+                if len(rango_exportar) == 2:
+                    parametros['fecha_desde'], parametros['fecha_hasta'] = (f.isoformat() for f in rango_exportar)
+        with col_boton:
+            st.write("")
+            if st.button("Iniciar", key="trabajo_iniciar", use_container_width=True):
+                id_trabajo = enviar_trabajo(tipo, parametros, sesion=st.session_state.id_sesion)
+                st.success(f"Trabajo #{id_trabajo} en cola.")
+
+        trabajos = listar_trabajos_db(limite=8)
+        if not trabajos:
+            st.info("Aún no se ha lanzado ningún trabajo.")
+            return
+        for trabajo in trabajos:
+            st.write(f"**#{trabajo['id']}** {trabajo['descripcion']} · {trabajo['estado']} · {trabajo['creado']}")
+            if trabajo['estado'] in ("En cola", "En ejecución"):
+                st.progress(trabajo['progreso'], text=trabajo['mensaje'] or trabajo['estado'])
+            elif trabajo['estado'] == "Error":
+                st.error(trabajo['error'])
+
+        # El archivo elegido solo se lee del disco al pedirlo ("Preparar descarga"), no en cada
+        # recarga: una exportación grande pesaría en todas las interacciones de la sesión
+        terminados = [t for t in trabajos if t['estado'] == "Terminado" and t['archivo']]
+        if terminados:
+            col_resultado, col_descarga = st.columns([3, 1])
+            with col_resultado:
+                trabajo = st.selectbox("Resultado", terminados, key="trabajo_resultado",
+                                       format_func=lambda t: f"#{t['id']} {t['nombre_archivo']}")
+            with col_descarga:
+                st.write("")
+                elegido = (st.session_state.sucursal, trabajo['id']) # los ids de trabajo son de cada sucursal
+                if st.session_state.get("trabajo_preparado") != elegido:
+                    st.button("Preparar descarga", key="trabajo_preparar", use_container_width=True,
+                              on_click=lambda: st.session_state.update(trabajo_preparado=elegido))
+                else:
+                    contenido = leer_resultado(trabajo)
+                    if contenido is None:
+                        st.warning("Archivo no disponible")
+                    elif st.download_button("Descargar", contenido, file_name=trabajo['nombre_archivo'],
+                                            key="trabajo_descargar", use_container_width=True):
+                        st.session_state.pop("trabajo_preparado", None)
+        st.button("Actualizar estado", key="trabajos_actualizar")
+
+def mostrar_dashboard_analitico():
+    """Reportes históricos leídos del snapshot Parquet (analitica.py), sin consultar SQLite."""
+    estado = analitica.leer_estado()
+    col_estado, col_boton = st.columns([3, 1])
+    with col_estado:
+        if estado:
+            st.caption(f"Snapshot al {estado['ultima_actualizacion']} · {estado['pedidos']:,} pedidos cerrados · "
+                       f"{estado['filas']:,} ítems. Los pedidos cerrados después aparecen al actualizarlo.")
+        else:
+            st.info("Aún no hay snapshot analítico: créalo con el botón (o `python analitica.py snapshot`).")
+    with col_boton:
+        if st.button("Actualizar snapshot", key="snapshot_actualizar", use_container_width=True):
+            id_trabajo = enviar_trabajo("snapshot_analitica", sesion=st.session_state.id_sesion)
+            st.success(f"Trabajo #{id_trabajo} en cola.")
+    if not estado:
+        return
+
+    col_dimension, col_rango, col_estados = st.columns([1, 2, 2])
+    with col_dimension:
+        dimension = st.radio("Agrupar por", list(analitica.DIMENSIONES), horizontal=True, key="analitico_dimension")
+    with col_rango:
+        rango = st.date_input("Fecha de creación (opcional)", value=[], key="analitico_rango")
+    with col_estados:
+        estados = st.multiselect("Estados incluidos", ["Completado", "Cancelado"], default=["Completado"], key="analitico_estados")
+
+    fecha_desde, fecha_hasta = (rango[0].isoformat(), rango[1].isoformat()) if len(rango) == 2 else (None, None)
+    try:
+        reporte = analitica.reporte_historico(dimension, fecha_desde, fecha_hasta, tuple(estados))
+    except ValueError as e:
+        st.error(str(e))
+        return
+    if reporte.empty:
+        st.info("No hay pedidos cerrados con esos filtros.")
+        return
+
+    st.metric(label="Ingresos en el periodo", value=f"${reporte['Ingresos'].sum():,.2f}")
+    if dimension == 'Mes':
+        st.line_chart(reporte.set_index('mes')['Ingresos'])
+        st.dataframe(reporte, use_container_width=True, hide_index=True)
+    else:
+        etiqueta = 'producto' if dimension == 'Producto' else 'cliente'
+        principales = reporte.head(20)
+        st.bar_chart(principales.set_index(etiqueta)['Ingresos'])
+        st.dataframe(reporte.drop(columns=[f"id_{etiqueta}"]), use_container_width=True, hide_index=True)
+
+def mostrar_modos_dashboard():
+    """Interruptores de modo del Dashboard (el consolidado solo si hay más de una sucursal)."""
+    col_analitico, col_consolidado = st.columns(2)
+    with col_analitico:
+        st.toggle("Modo analítico (histórico desde Parquet)", key="modo_analitico")
+    if len(sucursales) > 1:
+        with col_consolidado:
+            st.toggle("Consolidado de todas las sucursales", key="modo_consolidado")
+
+def mostrar_dashboard_consolidado():
+    """Dashboard de la empresa: las agregaciones de cada sucursal en paralelo (sucursales.py), combinadas."""
+    col_periodo, col_rango, col_estados = st.columns([1, 2, 2])
+    with col_periodo:
+        periodo = st.radio("Agrupar por", list(PERIODOS.keys()), horizontal=True, index=2, key="consolidado_periodo")
+    with col_rango:
+        rango = st.date_input("Rango de fechas", value=(date.today() - timedelta(days=365), date.today()), key="consolidado_rango")
+    with col_estados:
+        estados = st.multiselect("Estados incluidos", ESTADOS_PEDIDO, default=[e for e in ESTADOS_PEDIDO if e != "Cancelado"], key="consolidado_estados")
+    if len(rango) != 2:
+        return
+
+    with st.spinner(f"Consultando {len(sucursales)} sucursales..."):
+        reporte = reporte_consolidado(periodo, rango[0].isoformat(), rango[1].isoformat(), tuple(estados))
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Total Clientes", f"{reporte['resumen']['clientes']:,}")
+    col2.metric("Productos (todas las sucursales)", f"{reporte['resumen']['productos']:,}")
+    col3.metric("Total Pedidos", f"{reporte['resumen']['pedidos']:,}")
+    col4.metric("Ingresos Acumulados", f"${reporte['resumen']['ingresos']:,.2f}")
+
+    st.write("#### Por sucursal")
+    st.dataframe(reporte['sucursales'], use_container_width=True, hide_index=True)
+    st.bar_chart(reporte['sucursales'].set_index('Sucursal')['Ingresos'])
+
+    st.write("#### Pedidos por Estado")
+    st.bar_chart(reporte['estados'].set_index('Estado')[['Número de Pedidos']])
+
+    st.write("#### Ventas en el Tiempo")
+    if reporte['ventas'].empty:
+        st.info("No hay ventas en el rango seleccionado.")
+    else:
+        st.line_chart(reporte['ventas'].set_index('Periodo')['Ingresos'])
 
-    # Primero, obtener el estado actual del pedido para evitar doble descuento
-    c.execute("SELECT estado FROM pedidos WHERE id = ?", (pedido_id,))
-    estado_anterior = c.fetchone()[0]
+    st.write("#### Productos Más Vendidos (por Cantidad)")
+    st.dataframe(reporte['productos'], use_container_width=True, hide_index=True)
 
-    c.execute("UPDATE pedidos SET estado = ? WHERE id = ?", (nuevo_estado, pedido_id))
+    with st.expander("Stock por sucursal"):
+        st.dataframe(reporte['stock'], use_container_width=True, hide_index=True)
 
-    # Lógica de descuento de stock si pasa a 'Completado'
-    if nuevo_estado == "Completado" and estado_anterior != "Completado":
-        c.execute("SELECT id_producto, cantidad FROM items_pedido WHERE id_pedido = ?", (pedido_id,))
-        items_pedido = c.fetchall()
+def formato_cliente(cliente):
+    return f"{cliente['id']} - {cliente['nombre']} ({cliente['contacto'] or 'sin contacto'})"
 
-        for id_producto, cantidad_vendida in items_pedido:
-            # Obtener el stock actual
-            c.execute("SELECT stock FROM productos WHERE id = ?", (id_producto,))
-            stock_actual = c.fetchone()[0]
+def formato_producto(producto):
+    return f"{producto['nombre']} ({producto.get('unidad_medida') or 'N/A'}) - {producto.get('categoria') or 'N/A'}"
 
-            nuevo_stock = stock_actual - cantidad_vendida
-            
-            if nuevo_stock < 0:
-                nuevo_stock = 0
-                st.warning(f"Advertencia: El stock del producto ID {id_producto} intentó ser negativo. Se estableció en 0.")
+def selector_con_busqueda(etiqueta, sugerir, formato, clave, ayuda="Escribe para buscar"):
+    """
+    Buscador para tablas grandes: un cuadro de texto y un selector con las primeras
+    coincidencias (búsqueda FTS5 en SQLite, ver sugerir_*_db en datos.py) en lugar de
+    enviar la tabla completa al navegador. Devuelve el registro elegido (dict) o None.
+    """
+    texto = st.text_input(f"🔍 {etiqueta}", key=f"{clave}_buscar", placeholder=ayuda)
+    sugerencias = sugerir(texto)
+    if not sugerencias:
+        st.caption("Sin coincidencias.")
+        return None
+    return st.selectbox(etiqueta, [None] + sugerencias, format_func=lambda r: "" if r is None else formato(r),
+                        key=f"{clave}_sel", label_visibility="collapsed")
+
+# Fragmento (st.fragment, Streamlit >= 1.37): al interactuar con un widget de la función
+# decorada solo se vuelve a ejecutar esa función, no la página con todas sus pestañas.
+# Un st.rerun() dentro del fragmento sigue recargando la página completa (p. ej. tras guardar).
+_fragmento_st = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", lambda funcion: funcion)
+
+def fragmento(funcion):
+    """st.fragment que, al re-ejecutarse solo (quizá en otro hilo), vuelve a fijar la sucursal de la sesión."""
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        seleccionar_base(st.session_state.base_sucursal)
+        return funcion(*args, **kwargs)
+    return _fragmento_st(envoltura)
+
+def mostrar_listado_paginado(clave, listar, opciones_orden, filtros=None, descendente_defecto=False):
+    """
+    Dibuja un listado paginado: búsqueda, orden, tamaño de página y botones Anterior/Siguiente.
+    Los cursores de las páginas visitadas se guardan en la sesión para poder volver atrás;
+    cualquier cambio de filtro u orden vuelve a la primera página.
+    """
+    filtros = filtros or {}
+    col_buscar, col_orden, col_desc, col_tam = st.columns([3, 2, 1, 1])
+    with col_buscar:
+        texto = st.text_input("Buscar", key=f"{clave}_texto")
+    with col_orden:
+        orden = st.selectbox("Ordenar por", list(opciones_orden.keys()), key=f"{clave}_orden")
+    with col_desc:
+        descendente = st.checkbox("Descendente", value=descendente_defecto, key=f"{clave}_desc")
+    with col_tam:
+        limite = st.selectbox("Filas", [25, 50, 100], index=1, key=f"{clave}_limite")
+
+    firma = (texto, orden, descendente, limite, repr(sorted(filtros.items())))
+    paginas = st.session_state.setdefault(f"{clave}_paginas", {'firma': None, 'cursores': [None]})
+    if paginas['firma'] != firma:
+        paginas['firma'] = firma
+        paginas['cursores'] = [None]
+    cursores = paginas['cursores']
+
+    df, siguiente = listar(texto=texto, orden=orden, descendente=descendente, limite=limite, cursor=cursores[-1], **filtros)
+    if df.empty:
+        st.info("No hay registros que coincidan." if len(cursores) == 1 else "No hay más registros.")
+    else:
+        st.dataframe(df, use_container_width=True, hide_index=True)
 
-            c.execute("UPDATE productos SET stock = ? WHERE id = ?", (nuevo_stock, id_producto))
-            st.success(f"Stock actualizado: Producto ID {id_producto} - Cantidad vendida: {cantidad_vendida}. Nuevo stock: {nuevo_stock}")
-    
-    conn.commit()
-    conn.close()
+    # Los botones mueven el cursor en su callback, antes de la recarga que provoca el clic: así
+    # basta esa recarga (solo la del fragmento si el listado está en uno) y no hace falta st.rerun()
+    col_ant, col_pag, col_sig = st.columns([1, 2, 1])
+    with col_ant:
+        st.button("⬅ Anterior", key=f"{clave}_anterior", disabled=len(cursores) == 1, on_click=cursores.pop)
+    with col_pag:
+        st.caption(f"Página {len(cursores)}")
+    with col_sig:
+        st.button("Siguiente ➡", key=f"{clave}_siguiente", disabled=siguiente is None,
+                  on_click=cursores.append, args=(siguiente,))
 
 
 # ==============================================================================
 # 3. INTERFAZ DE USUARIO CON STREAMLIT
 # ==============================================================================
 
-st.set_page_config(layout="wide", page_title="Alex Fruver ERP - Gestión de Productos Frescos")
-
 # Efecto de hora del día: ¡el tema respira!
 hour = datetime.now().hour
 glow_intensity = "0.9" if 18 <= hour <= 24 else "0.6"
@@ -475,12 +423,17 @@ st.subheader("Venta y Distribución de Frutas y Verduras Frescas")
 menu = st.sidebar.radio("Módulos del ERP", ["Inicio", "Gestión de Clientes", "Gestión de Productos", "Gestión de Pedidos", "Dashboard/Reportes"])
 
 # Obtener categorías para usarlas en los formularios de producto
-conn_temp = sqlite3.connect(DB_NAME)
-categorias_data = pd.read_sql_query("SELECT id, nombre FROM categorias", conn_temp).to_dict(orient='records')
-conn_temp.close()
+categorias_data = get_categorias_db() # En caché: no consulta SQLite en cada recarga
 categorias_map = {c['nombre']: c['id'] for c in categorias_data}
 categoria_options = list(categorias_map.keys())
 unidad_options = ["Kg", "Unidad", "Atado", "Mano", "Bolsa", "Libra"]
+# Opciones de "Ajustar Stock": etiqueta -> (tipo de movimiento, signo)
+TIPOS_AJUSTE = {
+    "Recepción": ('recepcion', 1),
+    "Merma": ('merma', -1),
+    "Ajuste +": ('ajuste', 1),
+    "Ajuste -": ('ajuste', -1),
+}
 
 
 if menu == "Inicio":
@@ -488,42 +441,45 @@ if menu == "Inicio":
     # st.image("https://via.placeholder.com/600x200?text=Alex+Fruver+ERP", caption="Control de Frescura y Calidad", use_container_width=True)
     st.info("Este sistema te permite gestionar clientes, inventario de frutas y verduras, y pedidos.")
 
+    with st.expander("Tiempos de arranque de la base de datos"):
+        st.caption("Medidos una sola vez al iniciar el servidor; las recargas posteriores no repiten este trabajo.")
+        for etapa, segundos in tiempos_arranque.items():
+            st.write(f"- **{etapa}**: {segundos * 1000:,.1f} ms")
+
 elif menu == "Gestión de Clientes":
     st.header("Gestión de Clientes")
     # ... (El código de gestión de clientes se mantiene igual)
     cliente_tab, editar_cliente_tab, eliminar_cliente_tab = st.tabs(["Registrar Nuevo", "Editar Cliente", "Eliminar Cliente"])
 
     with cliente_tab:
-        st.subheader("Registrar Nuevo Cliente")
-        with st.form("form_cliente", clear_on_submit=True):
-            nombre_cliente = st.text_input("Nombre del Cliente", key="nc")
-            contacto_cliente = st.text_input("Persona de Contacto", key="pc")
-            email_cliente = st.text_input("Email", key="ec")
-            telefono_cliente = st.text_input("Teléfono", key="tc")
-            direccion_cliente = st.text_area("Dirección", key="dc")
-            submitted_cliente = st.form_submit_button("Guardar Cliente")
-
-            if submitted_cliente:
-                if nombre_cliente and contacto_cliente:
-                    add_cliente_db(nombre_cliente, contacto_cliente, email_cliente, telefono_cliente, direccion_cliente)
-                    st.success(f"Cliente '{nombre_cliente}' registrado con éxito y guardado permanentemente.")
-                    st.rerun()
-                else:
-                    st.error("Por favor, ingresa el nombre y la persona de contacto del cliente.")
+        @fragmento
+        def registrar_cliente():
+            st.subheader("Registrar Nuevo Cliente")
+            with st.form("form_cliente", clear_on_submit=True):
+                nombre_cliente = st.text_input("Nombre del Cliente", key="nc")
+                contacto_cliente = st.text_input("Persona de Contacto", key="pc")
+                email_cliente = st.text_input("Email", key="ec")
+                telefono_cliente = st.text_input("Teléfono", key="tc")
+                direccion_cliente = st.text_area("Dirección", key="dc")
+                submitted_cliente = st.form_submit_button("Guardar Cliente")
+
+                if submitted_cliente:
+                    if nombre_cliente and contacto_cliente:
+                        add_cliente_db(nombre_cliente, contacto_cliente, email_cliente, telefono_cliente, direccion_cliente)
+                        st.success(f"Cliente '{nombre_cliente}' registrado con éxito y guardado permanentemente.")
+                        st.rerun()
+                    else:
+                        st.error("Por favor, ingresa el nombre y la persona de contacto del cliente.")
+        registrar_cliente()
 
     with editar_cliente_tab:
-        st.subheader("Editar Cliente Existente")
-        clientes_data_edit = get_clientes_db()
-        if clientes_data_edit:
-            clientes_options_edit = {f"{c['id']} - {c['nombre']}": c['id'] for c in clientes_data_edit}
-            selected_cliente_key = st.selectbox(
-                "Selecciona el cliente a editar",
-                [""] + list(clientes_options_edit.keys()),
-                key="edit_cliente_select"
-            )
-
-            if selected_cliente_key:
-                selected_cliente_id = clientes_options_edit[selected_cliente_key]
+        @fragmento
+        def editar_cliente():
+            st.subheader("Editar Cliente Existente")
+            cliente_editar = selector_con_busqueda("Selecciona el cliente a editar", sugerir_clientes_db, formato_cliente,
+                                                   "edit_cliente_select", "Nombre, contacto, teléfono o email")
+            if cliente_editar:
+                selected_cliente_id = cliente_editar['id']
                 cliente_a_editar = obtener_cliente_por_id_db(selected_cliente_id)
 
                 if cliente_a_editar:
@@ -545,32 +501,27 @@ elif menu == "Gestión de Clientes":
                                 st.error("El nombre y la persona de contacto no pueden estar vacíos.")
                 else:
                     st.warning("Cliente no encontrado para edición.")
-        else:
-            st.info("No hay clientes registrados para editar.")
+        editar_cliente()
     
     with eliminar_cliente_tab:
-        st.subheader("Eliminar Cliente")
-        clientes_data_delete = get_clientes_db()
-        if clientes_data_delete:
-            clientes_options_delete = {c['nombre']: c['id'] for c in clientes_data_delete}
-            cliente_a_eliminar_nombre = st.selectbox("Selecciona el cliente a eliminar", [""] + list(clientes_options_delete.keys()), key="delete_cliente_select")
-            if cliente_a_eliminar_nombre:
-                cliente_a_eliminar_id = clientes_options_delete[cliente_a_eliminar_nombre]
+        @fragmento
+        def eliminar_cliente():
+            st.subheader("Eliminar Cliente")
+            cliente_eliminar = selector_con_busqueda("Selecciona el cliente a eliminar", sugerir_clientes_db, formato_cliente,
+                                                     "delete_cliente_select", "Nombre, contacto, teléfono o email")
+            if cliente_eliminar:
+                cliente_a_eliminar_nombre = cliente_eliminar['nombre']
+                cliente_a_eliminar_id = cliente_eliminar['id']
                 if st.button(f"Confirmar Eliminación de {cliente_a_eliminar_nombre}", key="confirm_delete_cliente"):
                     delete_cliente_db(cliente_a_eliminar_id)
                     st.success(f"Cliente '{cliente_a_eliminar_nombre}' eliminado permanentemente.")
                     st.rerun()
-        else:
-            st.info("No hay clientes registrados para eliminar.")
+        eliminar_cliente()
 
     st.markdown("---")
     st.subheader("Listado de Clientes")
-    clientes_data_display = get_clientes_db()
-    if clientes_data_display:
-        df_clientes = pd.DataFrame(clientes_data_display)
-        st.dataframe(df_clientes, use_container_width=True)
-    else:
-        st.info("No hay clientes registrados aún.")
+    # Solo se consulta y se envía al navegador la página visible
+    fragmento(mostrar_listado_paginado)("listado_clientes", listar_clientes_db, ORDEN_CLIENTES)
 
 
 elif menu == "Gestión de Productos": # TÍTULO CAMBIADO
@@ -580,75 +531,73 @@ elif menu == "Gestión de Productos": # TÍTULO CAMBIADO
     producto_tab, editar_producto_tab, ajustar_stock_tab, eliminar_producto_tab = st.tabs(["Registrar Nuevo", "Editar Producto", "Ajustar Stock", "Eliminar Producto"])
 
     with producto_tab:
-        st.subheader("Registrar Nuevo Producto")
-        with st.form("form_producto", clear_on_submit=True):
-            nombre_producto = st.text_input("Nombre del Producto (Ej: Mango, Lechuga)", key="np")
+        @fragmento
+        def registrar_producto():
+            st.subheader("Registrar Nuevo Producto")
+            with st.form("form_producto", clear_on_submit=True):
+                nombre_producto = st.text_input("Nombre del Producto (Ej: Mango, Lechuga)", key="np")
             
-            col_cat, col_uni = st.columns(2)
-            with col_cat:
-                categoria_seleccionada = st.selectbox("Categoría", categoria_options, key="cat_sel")
-            with col_uni:
-                unidad_medida_sel = st.selectbox("Unidad de Venta/Inventario", unidad_options, key="um_sel")
+                col_cat, col_uni = st.columns(2)
+                with col_cat:
+                    categoria_seleccionada = st.selectbox("Categoría", categoria_options, key="cat_sel")
+                with col_uni:
+                    unidad_medida_sel = st.selectbox("Unidad de Venta/Inventario", unidad_options, key="um_sel")
             
-            descripcion_producto = st.text_area("Descripción (Ej: Calidad extra, Maduro)", key="dp")
-            precio_producto = st.number_input("Precio Unitario ($)", min_value=0.01, format="%.2f", key="pp")
-            stock_producto = st.number_input("Stock (Cantidad Inicial)", min_value=0, value=0, step=1, key="sp")
-            submitted_producto = st.form_submit_button("Guardar Producto")
+                descripcion_producto = st.text_area("Descripción (Ej: Calidad extra, Maduro)", key="dp")
+                precio_producto = st.number_input("Precio Unitario ($)", min_value=0.01, format="%.2f", key="pp")
+                stock_producto = st.number_input("Stock (Cantidad Inicial)", min_value=0, value=0, step=1, key="sp")
+                submitted_producto = st.form_submit_button("Guardar Producto")
 
-            if submitted_producto:
-                id_categoria_seleccionada = categorias_map.get(categoria_seleccionada) 
+                if submitted_producto:
+                    id_categoria_seleccionada = categorias_map.get(categoria_seleccionada) 
                 
-                if nombre_producto and precio_producto > 0 and id_categoria_seleccionada:
-                    # Llamada a la función actualizada con id_categoria y unidad_medida
-                    # AQUÍ ES DONDE CAMBIA LA LÓGICA: Captura el valor de retorno
-                    new_id = add_producto_db(nombre_producto, descripcion_producto, precio_producto, stock_producto, id_categoria_seleccionada, unidad_medida_sel)
+                    if nombre_producto and precio_producto > 0 and id_categoria_seleccionada:
+                        # Llamada a la función actualizada con id_categoria y unidad_medida
+                        # AQUÍ ES DONDE CAMBIA LA LÓGICA: Captura el valor de retorno
+                        new_id = add_producto_db(nombre_producto, descripcion_producto, precio_producto, stock_producto, id_categoria_seleccionada, unidad_medida_sel)
                     
-                    if new_id:
-                        st.success(f"Producto '{nombre_producto}' registrado con éxito.")
-                        st.rerun()
+                        if new_id:
+                            st.success(f"Producto '{nombre_producto}' registrado con éxito.")
+                            st.rerun()
+                        else:
+                            # Este mensaje se mostrará si new_id es None (producto duplicado)
+                            st.error(f"❌ Error de registro: El producto con nombre '{nombre_producto}' ya está registrado en la base de datos.")
                     else:
-                        # Este mensaje se mostrará si new_id es None (producto duplicado)
-                        st.error(f"❌ Error de registro: El producto con nombre '{nombre_producto}' ya está registrado en la base de datos.")
-                else:
-                    st.error("Por favor, ingresa el nombre, un precio unitario válido y una categoría.")
+                        st.error("Por favor, ingresa el nombre, un precio unitario válido y una categoría.")
+        registrar_producto()
     
     with editar_producto_tab:
-        st.subheader("Editar Producto Existente")
-        productos_data_edit = get_productos_db()
-        if productos_data_edit:
-            productos_options_edit = {f"{p['id']} - {p['nombre']} ({p.get('categoria', 'N/A')})": p['id'] for p in productos_data_edit}
-            selected_producto_key = st.selectbox(
-                "Selecciona el producto a editar",
-                [""] + list(productos_options_edit.keys()),
-                key="edit_producto_select"
-            )
-
-            if selected_producto_key:
-                selected_producto_id = productos_options_edit[selected_producto_key]
+        @fragmento
+        def editar_producto():
+            st.subheader("Editar Producto Existente")
+            producto_editar = selector_con_busqueda("Selecciona el producto a editar", sugerir_productos_db, formato_producto,
+                                                    "edit_producto_select", "Nombre o descripción")
+            if producto_editar:
+                selected_producto_id = producto_editar['id']
                 producto_a_editar = obtener_producto_por_id_db(selected_producto_id)
 
                 if producto_a_editar:
                     # Obtener la posición del valor actual para el selectbox
                     current_cat_name = producto_a_editar.get('nombre_categoria', categoria_options[0])
                     current_cat_index = categoria_options.index(current_cat_name) if current_cat_name in categoria_options else 0
-                    
+                
                     current_unit_name = producto_a_editar.get('unidad_medida', unidad_options[0])
                     current_unit_index = unidad_options.index(current_unit_name) if current_unit_name in unidad_options else 0
 
                     with st.form("form_editar_producto", clear_on_submit=False):
                         st.write(f"Editando Producto ID: {producto_a_editar['id']}")
                         edit_nombre_prod = st.text_input("Nombre del Producto", value=producto_a_editar['nombre'], key=f"edit_np_{selected_producto_id}")
-                        
+                    
                         col_cat_e, col_uni_e = st.columns(2)
                         with col_cat_e:
                             edit_categoria_sel = st.selectbox("Categoría", categoria_options, index=current_cat_index, key=f"edit_cat_sel_{selected_producto_id}")
                         with col_uni_e:
                             edit_unidad_medida_sel = st.selectbox("Unidad de Venta/Inventario", unidad_options, index=current_unit_index, key=f"edit_um_sel_{selected_producto_id}")
-                        
+                    
                         edit_descripcion_prod = st.text_area("Descripción", value=producto_a_editar['descripcion'], key=f"edit_dp_{selected_producto_id}")
                         edit_precio_prod = st.number_input("Precio Unitario", min_value=0.01, format="%.2f", value=float(producto_a_editar['precio_unitario']), key=f"edit_pp_{selected_producto_id}")
                         edit_stock_prod = st.number_input("Stock", min_value=0, value=producto_a_editar['stock'], step=1, key=f"edit_sp_{selected_producto_id}")
-                        
+                    
                         submitted_edit_producto = st.form_submit_button("Actualizar Producto")
 
                         if submitted_edit_producto:
@@ -663,280 +612,345 @@ elif menu == "Gestión de Productos": # TÍTULO CAMBIADO
                                 st.error("El nombre, el precio unitario y la categoría no pueden estar vacíos o ser cero.")
                 else:
                     st.warning("Producto no encontrado para edición.")
-        else:
-            st.info("No hay productos o servicios registrados para editar.")
+        editar_producto()
 
     with ajustar_stock_tab:
-        st.subheader("Ajustar Stock de Producto")
-        productos_data_stock = get_productos_db()
-        if productos_data_stock:
-            productos_options_stock = {f"{p['id']} - {p['nombre']} (Stock actual: {p['stock']} {p.get('unidad_medida', '')})": p['id'] for p in productos_data_stock}
-            selected_producto_stock_key = st.selectbox(
-                "Selecciona el producto para ajustar stock",
-                [""] + list(productos_options_stock.keys()),
-                key="ajustar_stock_select"
-            )
-
-            if selected_producto_stock_key:
-                selected_producto_stock_id = productos_options_stock[selected_producto_stock_key]
+        @fragmento
+        def ajustar_stock():
+            st.subheader("Ajustar Stock de Producto")
+            producto_stock = selector_con_busqueda("Selecciona el producto para ajustar stock", sugerir_productos_db,
+                                                   lambda p: f"{formato_producto(p)} · Stock actual: {p['stock']}",
+                                                   "ajustar_stock_select", "Nombre o descripción")
+            if producto_stock:
+                selected_producto_stock_id = producto_stock['id']
                 producto_a_ajustar = obtener_producto_por_id_db(selected_producto_stock_id)
 
                 if producto_a_ajustar:
                     st.write(f"Producto: **{producto_a_ajustar['nombre']}** ({producto_a_ajustar.get('unidad_medida', 'N/A')})")
                     st.write(f"Stock actual: **{producto_a_ajustar['stock']}**")
-                    
-                    ajuste_tipo = st.radio("Tipo de ajuste", ["Añadir Stock", "Restar Stock"], key="ajuste_tipo")
+                
+                    # Cada ajuste queda como movimiento en el libro de inventario (inventario.py)
+                    ajuste_tipo = st.radio("Tipo de movimiento", list(TIPOS_AJUSTE), key="ajuste_tipo", horizontal=True)
                     cantidad_ajuste = st.number_input("Cantidad a ajustar", min_value=1, value=1, step=1, key="cantidad_ajuste")
-                    
+                    nota_ajuste = st.text_input("Nota (opcional)", key="nota_ajuste", placeholder="Proveedor, motivo de la merma...")
+                
                     if st.button("Aplicar Ajuste de Stock", key="confirm_ajuste_stock"):
-                        nuevo_stock = producto_a_ajustar['stock']
-                        if ajuste_tipo == "Añadir Stock":
-                            nuevo_stock += cantidad_ajuste
-                            st.success(f"Se añadieron {cantidad_ajuste} unidades al stock.")
-                        elif ajuste_tipo == "Restar Stock":
-                            if nuevo_stock >= cantidad_ajuste:
-                                nuevo_stock -= cantidad_ajuste
-                                st.success(f"Se restaron {cantidad_ajuste} unidades del stock.")
-                            else:
-                                st.warning(f"No hay suficiente stock para restar {cantidad_ajuste} unidades. Stock actual: {nuevo_stock}.")
-                                nuevo_stock = 0 
-                                
-                        update_producto_stock_db(selected_producto_stock_id, nuevo_stock)
-                        st.info(f"Nuevo stock para '{producto_a_ajustar['nombre']}': {nuevo_stock}")
-                        st.rerun()
+                        tipo_movimiento, signo = TIPOS_AJUSTE[ajuste_tipo]
+                        try:
+                            nuevo_stock = registrar_movimiento_db(selected_producto_stock_id, tipo_movimiento,
+                                                                  signo * cantidad_ajuste, nota_ajuste or None)
+                        except ValueError as e:
+                            st.error(str(e))
+                        else:
+                            st.success(f"Nuevo stock para '{producto_a_ajustar['nombre']}': {nuevo_stock}")
+                            st.rerun()
+
+                    with st.expander("Historial de movimientos"):
+                        st.dataframe(historial_movimientos_db(selected_producto_stock_id), use_container_width=True, hide_index=True)
                 else:
                     st.warning("Producto no encontrado para ajustar stock.")
-        else:
-            st.info("No hay productos registrados para ajustar stock.")
+        ajustar_stock()
 
     with eliminar_producto_tab:
-        st.subheader("Eliminar Producto")
-        productos_data_delete = get_productos_db()
-        if productos_data_delete:
-            productos_options_delete = {p['nombre']: p['id'] for p in productos_data_delete}
-            producto_a_eliminar_nombre = st.selectbox("Selecciona el producto a eliminar", [""] + list(productos_options_delete.keys()), key="delete_producto_select")
-            if producto_a_eliminar_nombre:
-                producto_a_eliminar_id = productos_options_delete[producto_a_eliminar_nombre]
+        @fragmento
+        def eliminar_producto():
+            st.subheader("Eliminar Producto")
+            producto_eliminar = selector_con_busqueda("Selecciona el producto a eliminar", sugerir_productos_db, formato_producto,
+                                                      "delete_producto_select", "Nombre o descripción")
+            if producto_eliminar:
+                producto_a_eliminar_nombre = producto_eliminar['nombre']
+                producto_a_eliminar_id = producto_eliminar['id']
                 if st.button(f"Confirmar Eliminación de {producto_a_eliminar_nombre}", key="confirm_delete_producto"):
                     delete_producto_db(producto_a_eliminar_id)
                     st.success(f"Producto '{producto_a_eliminar_nombre}' eliminado permanentemente.")
                     st.rerun()
-        else:
-            st.info("No hay productos registrados para eliminar.")
+        eliminar_producto()
 
     st.markdown("---")
     st.subheader("Listado de Productos en Inventario")
-    productos_data_display = get_productos_db()
-    if productos_data_display:
-        df_productos = pd.DataFrame(productos_data_display)
-        # Mostrar las columnas actualizadas con nombre de categoría y unidad
-        st.dataframe(df_productos[['id', 'nombre', 'categoria', 'unidad_medida', 'precio_unitario', 'stock', 'descripcion']], use_container_width=True)
-    else:
-        st.info("No hay productos registrados aún.")
+    # Muestra las columnas con nombre de categoría y unidad, una página a la vez
+    fragmento(mostrar_listado_paginado)("listado_productos", listar_productos_db, ORDEN_PRODUCTOS)
 
 elif menu == "Gestión de Pedidos":
     st.header("Gestión de Pedidos y Ventas") # TÍTULO CAMBIADO
 
-    clientes_data = get_clientes_db()
-    productos_data = get_productos_db()
+    # Solo los conteos (una consulta en caché); los selectores buscan bajo demanda
+    resumen_pedidos = resumen_general_db()
 
-    if not clientes_data:
+    if not resumen_pedidos['clientes']:
         st.warning("Para crear un pedido, primero debes registrar clientes en la sección 'Gestión de Clientes'.")
-    if not productos_data:
+    if not resumen_pedidos['productos']:
         st.warning("Para crear un pedido, primero debes registrar productos/servicios en la sección 'Gestión de Productos'.")
 
-    if clientes_data and productos_data:
-        crear_pedido_tab, actualizar_estado_tab = st.tabs(["Crear Nuevo Pedido", "Actualizar Estado de Pedido"])
+    if resumen_pedidos['clientes'] and resumen_pedidos['productos']:
+        crear_pedido_tab, actualizar_estado_tab, importar_pedidos_tab, despacho_tab = st.tabs(
+            ["Crear Nuevo Pedido", "Actualizar Estado de Pedido", "Importar Pedidos", "Despacho del Día"])
 
         with crear_pedido_tab:
             st.subheader("Crear Nuevo Pedido de Fruver")
 
-            with st.form("form_pedido_principal", clear_on_submit=False):
-                clientes_map = {c['nombre']: c['id'] for c in clientes_data}
-                cliente_seleccionado_nombre = st.selectbox(
-                    "Selecciona el Cliente",
-                    list(clientes_map.keys()) if clientes_map else [],
-                    key="sel_cliente_pedido"
-                )
-                id_cliente_pedido = clientes_map[cliente_seleccionado_nombre] if cliente_seleccionado_nombre else None
+            # El buscador va fuera del formulario: dentro, el texto no se aplicaría hasta enviarlo
+            cliente_pedido = selector_con_busqueda("Selecciona el Cliente", sugerir_clientes_db, formato_cliente,
+                                                   "sel_cliente_pedido", "Nombre, contacto, teléfono o email")
+            id_cliente_pedido = cliente_pedido['id'] if cliente_pedido else None
+            cliente_seleccionado_nombre = cliente_pedido['nombre'] if cliente_pedido else None
 
+            with st.form("form_pedido_principal", clear_on_submit=False):
                 fecha_entrega = st.date_input("Fecha de Entrega Estimada", datetime.now(), key="fecha_entrega_pedido")
-                estado_pedido = st.selectbox("Estado del Pedido", ["Pendiente", "En Proceso", "Completado", "Cancelado"], key="estado_pedido_sel")
+                estado_pedido = st.selectbox("Estado del Pedido", ESTADOS_PEDIDO, key="estado_pedido_sel")
 
-                if st.session_state.current_order_items:
+                carrito = st.session_state.carrito
+                if carrito:
                     st.write("---")
                     st.subheader("Ítems del Pedido Actual")
-                    df_current_items = pd.DataFrame(st.session_state.current_order_items)
-                    st.dataframe(df_current_items[['nombre_producto', 'cantidad', 'precio_unitario', 'subtotal']], use_container_width=True)
-                    total_pedido = df_current_items['subtotal'].sum()
-                    st.markdown(f"### Total del Pedido: ${total_pedido:,.2f}")
+                    st.dataframe(carrito.items(), column_order=['nombre_producto', 'cantidad', 'unidad_medida', 'precio_unitario', 'subtotal'],
+                                 use_container_width=True, hide_index=True)
+                    st.markdown(f"### Total del Pedido: ${carrito.total:,.2f}")
                     st.write("---")
-                else:
-                    total_pedido = 0
 
                 submitted_pedido = st.form_submit_button("Guardar Pedido")
 
                 if submitted_pedido:
-                    if id_cliente_pedido and st.session_state.current_order_items:
+                    if id_cliente_pedido and carrito:
                         add_pedido_db(
                             id_cliente_pedido,
                             cliente_seleccionado_nombre,
                             datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                             fecha_entrega.strftime("%Y-%m-%d"),
                             estado_pedido,
-                            total_pedido,
-                            st.session_state.current_order_items
+                            carrito.total,
+                            carrito.items()
                         )
                         st.success(f"Pedido para '{cliente_seleccionado_nombre}' guardado con éxito y de forma permanente.")
-                        st.session_state.current_order_items = []
+                        carrito.vaciar()
                         st.rerun()
                     else:
                         st.error("Asegúrate de seleccionar un cliente y añadir al menos un ítem al pedido.")
 
             st.subheader("Añadir Productos al Pedido Actual")
+            producto_a_agregar = selector_con_busqueda("Producto a añadir", sugerir_productos_db, formato_producto,
+                                                       "paa_item", "Nombre o descripción")
             with st.form("form_add_item", clear_on_submit=True):
-                # Usar el ID y nombre del producto junto con la unidad para claridad
-                productos_map = {f"{p['nombre']} ({p.get('unidad_medida', 'N/A')})": p['id'] for p in productos_data}
-                
-                producto_a_agregar_display = st.selectbox("Producto a añadir", [""] + list(productos_map.keys()), key="paa_item")
                 cantidad_a_agregar = st.number_input("Cantidad", min_value=1, value=1, step=1, key="caa_item")
 
                 submitted_add_item = st.form_submit_button("Añadir Ítem")
 
                 if submitted_add_item:
-                    if producto_a_agregar_display and cantidad_a_agregar > 0:
-                        id_producto_pedido_item = productos_map[producto_a_agregar_display]
-                        producto_obj = obtener_producto_por_id_db(id_producto_pedido_item)
+                    if producto_a_agregar and cantidad_a_agregar > 0:
+                        # Catálogo en memoria (en caché hasta que cambie la tabla productos): sin consulta por ítem
+                        producto_obj = catalogo_productos_db().get(producto_a_agregar['id'])
                         if producto_obj:
-                            if producto_obj['stock'] is not None and producto_obj['stock'] < cantidad_a_agregar:
-                                st.warning(f"¡Atención! No hay suficiente stock de '{producto_obj['nombre']}'. Disponible: {producto_obj['stock']} {producto_obj.get('unidad_medida', 'N/A')}. Cantidad solicitada: {cantidad_a_agregar}.")
+                            # El stock se compara con todo lo pedido del producto, no solo con esta adición
+                            cantidad_total = st.session_state.carrito.cantidad(producto_obj['id']) + cantidad_a_agregar
+                            if producto_obj['stock'] < cantidad_total:
+                                st.warning(f"¡Atención! No hay suficiente stock de '{producto_obj['nombre']}'. Disponible: {producto_obj['stock']} {producto_obj.get('unidad_medida') or 'N/A'}. Cantidad solicitada: {cantidad_total}.")
                             else:
-                                subtotal = producto_obj['precio_unitario'] * cantidad_a_agregar
-                                st.session_state.current_order_items.append({
-                                    'id_producto': id_producto_pedido_item,
-                                    'nombre_producto': producto_obj['nombre'],
-                                    'cantidad': cantidad_a_agregar,
-                                    'precio_unitario': producto_obj['precio_unitario'],
-                                    'subtotal': subtotal
-                                })
-                                st.success(f"'{producto_obj['nombre']}' añadido al pedido.")
+                                st.session_state.carrito.agregar(producto_obj, cantidad_a_agregar)
+                                st.toast(f"'{producto_obj['nombre']}' añadido al pedido.")
+                                st.rerun() # el formulario del pedido (arriba) ya se dibujó sin este ítem
                         else:
                             st.error("Producto no encontrado.")
                     else:
                         st.warning("Selecciona un producto y una cantidad válida.")
 
+            if st.session_state.carrito:
+                col_quitar, col_boton_quitar, col_vaciar = st.columns([3, 1, 1])
+                with col_quitar:
+                    id_quitar = st.selectbox("Quitar del pedido", list(st.session_state.carrito.lineas), key="carrito_quitar",
+                                             format_func=lambda i: st.session_state.carrito.lineas[i]['nombre_producto'])
+                with col_boton_quitar:
+                    st.write("")
+                    if st.button("Quitar", key="carrito_quitar_btn", use_container_width=True):
+                        st.session_state.carrito.quitar(id_quitar)
+                        st.rerun()
+                with col_vaciar:
+                    st.write("")
+                    if st.button("Vaciar pedido", key="carrito_vaciar", use_container_width=True):
+                        st.session_state.carrito.vaciar()
+                        st.rerun()
+
         with actualizar_estado_tab:
             st.subheader("Actualizar Estado de Pedido")
-            pedidos_data_update = get_pedidos_db()
-            if pedidos_data_update:
-                pedido_options = {f"ID: {p['id']} - Cliente: {p['nombre_cliente']} - Estado actual: {p['estado']}": p['id'] for p in pedidos_data_update}
-                
-                selected_pedido_display = st.selectbox(
-                    "Selecciona el pedido a actualizar", 
-                    [""] + list(pedido_options.keys()), 
-                    key="update_pedido_id_sel"
+            # Resultado del último cambio: se guarda en la sesión porque el st.rerun() tras guardar borraría los avisos
+            if "resultado_estado_pedido" in st.session_state:
+                resultado_estado = st.session_state.pop("resultado_estado_pedido")
+                mostrar_resultado_estado_pedido(resultado_estado)
+                st.success(f"Estado del Pedido #{resultado_estado['id_pedido']} actualizado a '{resultado_estado['estado_nuevo']}'.")
+            # Búsqueda por número de pedido o por cliente: no se cargan todos los pedidos
+            pedido_obj = selector_con_busqueda("Selecciona el pedido a actualizar", sugerir_pedidos_db,
+                                               lambda p: f"ID: {p['id']} - Cliente: {p['nombre_cliente']} - Estado actual: {p['estado']}",
+                                               "update_pedido_id_sel", "Número de pedido o cliente")
+            if pedido_obj:
+                pedido_a_actualizar_id = pedido_obj['id']
+                current_index = ESTADOS_PEDIDO.index(pedido_obj['estado'])
+                nuevo_estado = st.selectbox(
+                    f"Nuevo estado para Pedido #{pedido_a_actualizar_id} (Cliente: {pedido_obj['nombre_cliente']})", 
+                    ESTADOS_PEDIDO, 
+                    index=current_index,
+                    key=f"nuevo_estado_sel_{pedido_a_actualizar_id}"
                 )
-
-                if selected_pedido_display:
-                    pedido_a_actualizar_id = pedido_options[selected_pedido_display]
-                    pedido_obj = next((p for p in pedidos_data_update if p['id'] == pedido_a_actualizar_id), None)
-                    if pedido_obj:
-                        current_index = ["Pendiente", "En Proceso", "Completado", "Cancelado"].index(pedido_obj['estado'])
-                        nuevo_estado = st.selectbox(
-                            f"Nuevo estado para Pedido #{pedido_a_actualizar_id} (Cliente: {pedido_obj['nombre_cliente']})", 
-                            ["Pendiente", "En Proceso", "Completado", "Cancelado"], 
-                            index=current_index,
-                            key=f"nuevo_estado_sel_{pedido_a_actualizar_id}"
-                        )
-                        if st.button("Actualizar Estado del Pedido", key=f"btn_update_estado_{pedido_a_actualizar_id}"):
-                            update_pedido_estado_db(pedido_a_actualizar_id, nuevo_estado)
-                            st.success(f"Estado del Pedido #{pedido_a_actualizar_id} actualizado a '{nuevo_estado}'.")
-                            st.rerun()
-                    else:
+                if st.button("Actualizar Estado del Pedido", key=f"btn_update_estado_{pedido_a_actualizar_id}"):
+                    resultado_estado = update_pedido_estado_db(pedido_a_actualizar_id, nuevo_estado)
+                    if resultado_estado is None:
                         st.error("Pedido no encontrado.")
+                    else:
+                        st.session_state.resultado_estado_pedido = resultado_estado
+                        st.rerun()
+
+        with importar_pedidos_tab:
+            st.subheader("Importar Pedidos desde Archivo")
+            st.caption("Una fila por línea de pedido. Columnas obligatorias: cliente, producto, cantidad. "
+                       "Opcionales: referencia (agrupa líneas en un pedido), fecha_entrega (AAAA-MM-DD), estado, precio_unitario.")
+            archivo_pedidos = st.file_uploader("Archivo CSV, Parquet o Excel", type=["csv", "parquet", "xlsx", "xls"], key="archivo_importar_pedidos")
+
+            if archivo_pedidos is not None:
+                try:
+                    df_importar = leer_archivo_pedidos(archivo_pedidos)
+                except ValueError as e:
+                    st.error(str(e))
+                    df_importar = None
+
+                if df_importar is not None:
+                    st.write(f"{len(df_importar):,} líneas leídas. Vista previa:")
+                    st.dataframe(df_importar.head(20), use_container_width=True)
+
+                    if st.button("Importar Pedidos", key="btn_importar_pedidos"):
+                        try:
+                            resultado_importacion = importar_pedidos_db(df_importar)
+                        except ValueError as e:
+                            st.error(str(e))
+                        else:
+                            st.success(f"Se crearon {resultado_importacion['pedidos_creados']:,} pedidos "
+                                       f"con {resultado_importacion['items_creados']:,} ítems.")
+                            if resultado_importacion['errores']:
+                                st.warning(f"{resultado_importacion['pedidos_rechazados']:,} pedidos rechazados por "
+                                           f"{len(resultado_importacion['errores']):,} líneas con errores:")
+                                df_errores = pd.DataFrame(resultado_importacion['errores'])
+                                st.dataframe(df_errores, use_container_width=True)
+                                st.download_button("Descargar reporte de errores (CSV)", df_errores.to_csv(index=False).encode("utf-8"),
+                                                   file_name="errores_importacion.csv", mime="text/csv", key="btn_descargar_errores")
+
+        with despacho_tab:
+            st.subheader("Lista de Despacho por Fecha de Entrega")
+            col_fecha_despacho, col_estados_despacho = st.columns(2)
+            with col_fecha_despacho:
+                fecha_despacho = st.date_input("Fecha de entrega", value=date.today(), key="despacho_fecha")
+            with col_estados_despacho:
+                estados_despacho = st.multiselect("Estados incluidos", ESTADOS_PEDIDO, default=list(ESTADOS_DESPACHO), key="despacho_estados")
+
+            # Una consulta agregada (ver despacho.py): totales para bodega y detalle por dirección/cliente
+            despacho = lista_despacho(fecha_despacho.isoformat(), estados_despacho)
+            if despacho['clientes'].empty:
+                st.info("No hay pedidos para despachar en esa fecha.")
             else:
-                st.info("No hay pedidos registrados para actualizar.")
+                st.write(f"**{len(despacho['productos']):,}** productos para "
+                         f"**{despacho['clientes']['Cliente'].nunique():,}** clientes.")
+                st.write("##### Totales por producto")
+                st.dataframe(despacho['productos'], use_container_width=True, hide_index=True)
+                st.write("##### Detalle por dirección y cliente")
+                st.dataframe(despacho['clientes'], use_container_width=True, hide_index=True)
+                col_csv, col_hoja = st.columns(2)
+                with col_csv:
+                    st.download_button("Descargar CSV", lista_despacho_csv(despacho), file_name=f"despacho_{fecha_despacho.isoformat()}.csv",
+                                       mime="text/csv", key="despacho_csv")
+                with col_hoja:
+                    st.download_button("Hoja imprimible (HTML)", hoja_despacho_html(fecha_despacho, despacho),
+                                       file_name=f"despacho_{fecha_despacho.isoformat()}.html", mime="text/html", key="despacho_hoja")
 
         st.markdown("---")
         st.subheader("Listado de Pedidos")
-        pedidos_data_display = get_pedidos_db()
-        if pedidos_data_display:
-            pedidos_data_for_df = []
-            for p in pedidos_data_display:
-                pedidos_data_for_df.append({
-                    'ID Pedido': p['id'],
-                    'Cliente': p['nombre_cliente'],
-                    'Fecha Creación': p['fecha_creacion'],
-                    'Fecha Entrega Est.': p['fecha_entrega_estimada'],
-                    'Estado': p['estado'],
-                    'Total': f"${p['total']:,.2f}",
-                    'Ítems': ", ".join([f"{item['nombre_producto']} (x{item['cantidad']})" for item in p['items']])
-                })
-            df_pedidos = pd.DataFrame(pedidos_data_for_df)
-            st.dataframe(df_pedidos, use_container_width=True)
-        else:
-            st.info("No hay pedidos registrados aún.")
+        col_estado_filtro, col_fechas_filtro = st.columns(2)
+        with col_estado_filtro:
+            estados_filtro = st.multiselect("Filtrar por estado", ESTADOS_PEDIDO, key="listado_pedidos_estados")
+        with col_fechas_filtro:
+            rango_fechas = st.date_input("Fecha de creación (rango)", value=(), key="listado_pedidos_fechas")
+        filtros_pedidos = {'estado': estados_filtro}
+        if len(rango_fechas) == 2:
+            filtros_pedidos['fecha_desde'], filtros_pedidos['fecha_hasta'] = rango_fechas
+        mostrar_listado_paginado("listado_pedidos", listar_pedidos_db, ORDEN_PEDIDOS, filtros_pedidos, descendente_defecto=True)
+
+        # Los pedidos cerrados antiguos viven en la base histórica (archivo.py): se buscan allí aparte
+        with st.expander(f"Pedidos archivados (cerrados hace más de {EDAD_ARCHIVO_DIAS} días)"):
+            pedido_archivado = selector_con_busqueda("Busca un pedido archivado", sugerir_pedidos_archivados_db,
+                                                     lambda p: f"ID: {p['id']} - Cliente: {p['nombre_cliente']} - {p['estado']} - {p['fecha_creacion']}",
+                                                     "pedido_archivado", "Número de pedido o cliente")
+            if pedido_archivado:
+                detalle = obtener_pedido_archivado_db(pedido_archivado['id'])
+                st.write(f"**Pedido #{detalle['id']}** · {detalle['nombre_cliente']} · {detalle['estado']} · "
+                         f"Total ${detalle['total']:,.2f} · archivado el {detalle['archivado']}")
+                st.dataframe(detalle['items'], use_container_width=True, hide_index=True)
+
+elif menu == "Dashboard/Reportes" and st.session_state.get("modo_consolidado") and len(sucursales) > 1:
+    st.header("Dashboard Consolidado de la Empresa")
+    # Cada sucursal se agrega en su propio proceso y los resultados parciales se suman
+    mostrar_modos_dashboard()
+    mostrar_dashboard_consolidado()
+
+elif menu == "Dashboard/Reportes" and st.session_state.get("modo_analitico"):
+    st.header("Dashboard y Reportes Operacionales")
+    # Histórico completo desde el snapshot Parquet: no compite con los pedidos en SQLite
+    mostrar_modos_dashboard()
+    mostrar_trabajos_segundo_plano()
+    mostrar_dashboard_analitico()
 
 elif menu == "Dashboard/Reportes":
     st.header("Dashboard y Reportes Operacionales")
+    mostrar_modos_dashboard()
+    mostrar_trabajos_segundo_plano()
 
-    clientes_data = get_clientes_db()
-    productos_data = get_productos_db() # Esta es la función que hace el JOIN
-    pedidos_data = get_pedidos_db()
+    # Solo se traen los totales ya agregados en SQLite (ver reportes.py)
+    resumen = resumen_general_db()
 
     st.subheader("Resumen General")
     col1, col2, col3 = st.columns(3)
 
     with col1:
-        st.metric(label="Total Clientes", value=len(clientes_data))
+        st.metric(label="Total Clientes", value=resumen['clientes'])
     with col2:
-        st.metric(label="Total Productos en Catálogo", value=len(productos_data))
+        st.metric(label="Total Productos en Catálogo", value=resumen['productos'])
     with col3:
-        st.metric(label="Total Pedidos Registrados", value=len(pedidos_data))
+        st.metric(label="Total Pedidos Registrados", value=resumen['pedidos'])
 
     st.markdown("---")
 
     st.subheader("Análisis de Pedidos")
 
-    if pedidos_data:
-        df_pedidos_analisis = pd.DataFrame(pedidos_data)
-
+    if resumen['pedidos']:
         st.write("#### Pedidos por Estado")
-        estado_counts = df_pedidos_analisis['estado'].value_counts().reset_index()
-        estado_counts.columns = ['Estado', 'Número de Pedidos']
-        st.bar_chart(estado_counts.set_index('Estado'))
+        estado_counts = pedidos_por_estado_db()
+        st.bar_chart(estado_counts.set_index('Estado')[['Número de Pedidos']])
 
         st.write("#### Ingresos Totales por Pedidos")
-        ingresos_totales = df_pedidos_analisis['total'].sum()
-        st.metric(label="Ingresos Acumulados", value=f"${ingresos_totales:,.2f}")
+        st.metric(label="Ingresos Acumulados", value=f"${resumen['ingresos']:,.2f}")
+
+        st.write("#### Ventas en el Tiempo")
+        col_periodo, col_rango, col_estados = st.columns([1, 2, 2])
+        with col_periodo:
+            periodo_ventas = st.radio("Agrupar por", list(PERIODOS.keys()), horizontal=True, key="ventas_periodo")
+        with col_rango:
+            rango_ventas = st.date_input("Rango de fechas", value=(date.today() - timedelta(days=90), date.today()), key="ventas_rango")
+        with col_estados:
+            estados_ventas = st.multiselect("Estados incluidos", ESTADOS_PEDIDO, default=[e for e in ESTADOS_PEDIDO if e != "Cancelado"], key="ventas_estados")
+
+        if len(rango_ventas) == 2:
+            # Lee solo la tabla resumen ventas_diarias (actualizada por triggers en cada pedido)
+            ventas_tiempo = ventas_por_periodo_db(periodo_ventas, rango_ventas[0].isoformat(), rango_ventas[1].isoformat(), tuple(estados_ventas))
+            if ventas_tiempo.empty:
+                st.info("No hay ventas en el rango seleccionado.")
+            else:
+                col_ingresos, col_cantidad = st.columns(2)
+                with col_ingresos:
+                    st.caption("Ingresos")
+                    st.line_chart(ventas_tiempo.set_index('Periodo')['Ingresos'])
+                with col_cantidad:
+                    st.caption("Cantidad vendida")
+                    st.bar_chart(ventas_tiempo.set_index('Periodo')['Cantidad'])
 
         st.write("#### Productos Más Vendidos (por Cantidad)")
-        all_items = []
-        for pedido in pedidos_data:
-            for item in pedido['items']:
-                all_items.append(item)
-
-        if all_items:
-            df_all_items = pd.DataFrame(all_items)
-            
-            # 1. Agrupar por nombre_producto y sumar la cantidad vendida
-            top_productos = df_all_items.groupby('nombre_producto')['cantidad'].sum().reset_index()
-            top_productos.columns = ['Producto', 'Cantidad Vendida']
-            
-            # 2. Convertir productos_data a DataFrame y mapear la Unidad de Medida
-            df_productos_catalogo = pd.DataFrame(productos_data)[['nombre', 'unidad_medida']]
-            # Nombra la columna 'Unidad' para el merge
-            df_productos_catalogo.columns = ['Producto', 'Unidad'] 
-            
-            # 3. Combinar (Merge) el reporte de ventas con la unidad de medida del catálogo
-            top_productos = pd.merge(top_productos, df_productos_catalogo, on='Producto', how='left')
-            
-            # 4. (ELIMINADO el paso de concatenar el número)
-            #    Simplemente renombramos 'Unidad' a 'Unidad de Venta' para la visualización final
-            top_productos.rename(columns={'Unidad': 'Unidad de Venta'}, inplace=True) 
-            
-            top_productos = top_productos.sort_values(by='Cantidad Vendida', ascending=False)
+        # Agrupado por id_producto en SQL; la unidad sale del catálogo con el mismo JOIN
+        top_productos = productos_mas_vendidos_db()
 
+        if not top_productos.empty:
             # Mostrar la tabla con la columna 'Unidad de Venta' (solo el texto: Kg, Unidad, etc.)
             st.dataframe(top_productos[['Producto', 'Unidad de Venta', 'Cantidad Vendida']], use_container_width=True)
             
@@ -945,28 +959,74 @@ elif menu == "Dashboard/Reportes":
 
         st.markdown("---")
         st.write("#### Reporte de Stock de Productos")
-        if productos_data:
-            df_productos_stock = pd.DataFrame(productos_data)
-            
+        if resumen['productos']:
             # MODIFICADO: Muestra las columnas relevantes para Alex Fruver
-            df_productos_stock_display = df_productos_stock[['nombre', 'categoria', 'unidad_medida', 'stock', 'precio_unitario']]
-            df_productos_stock_display.columns = ['Producto', 'Categoría', 'Unidad', 'Stock Actual', 'Precio Unitario']
-            st.dataframe(df_productos_stock_display, use_container_width=True)
+            st.dataframe(reporte_stock_db(), use_container_width=True)
+
+            with st.expander("Stock en una fecha pasada"):
+                # Última foto diaria anterior a la fecha + movimientos hasta esa fecha (inventario.py)
+                fecha_stock = st.date_input("Stock al final del día", value=date.today() - timedelta(days=1), key="stock_fecha")
+                st.dataframe(stock_en_fecha_db(fecha_stock.isoformat()), use_container_width=True, hide_index=True)
 
             # Opcional: Alertas de stock mínimo
             st.write("##### Alertas de Stock Bajo")
             low_stock_threshold = st.slider("Umbral de alerta de stock mínimo", 0, 50, 10, key="stock_slider")
             
-            productos_bajo_stock = df_productos_stock[df_productos_stock['stock'] <= low_stock_threshold]
+            productos_bajo_stock = productos_bajo_stock_db(low_stock_threshold)
             if not productos_bajo_stock.empty:
                 st.warning(f"¡Alerta! Los siguientes productos tienen stock igual o menor a **{low_stock_threshold}**:")
                 # Muestra las columnas relevantes para la alerta
-                st.dataframe(productos_bajo_stock[['nombre', 'categoria', 'stock', 'unidad_medida']], use_container_width=True)
+                st.dataframe(productos_bajo_stock, use_container_width=True)
             else:
                 st.info(f"Ningún producto por debajo del umbral de stock de {low_stock_threshold}.")
 
+            st.write("##### Sugerencias de Compra")
+            # Punto de reorden por producto a partir de su demanda pronosticada (pronostico.py)
+            # Los días pendientes se procesan en segundo plano (trabajos.py); mientras tanto se usa el último pronóstico
+            # Se encola según el último trabajo del pronóstico, no en cada recarga: uno que falló
+            # no se reintenta solo (fallaría en cada recarga) y uno de hoy ya cubrió hasta ayer
+            if pronostico_pendiente_db():
+                ultimo = ultimo_trabajo_db("pronostico_demanda")
+                id_pronostico = None
+                if ultimo and ultimo['estado'] in ("En cola", "En ejecución"):
+                    id_pronostico = ultimo['id']
+                elif ultimo and ultimo['estado'] == "Error":
+                    st.error(f"No se pudo actualizar el pronóstico de demanda (trabajo #{ultimo['id']}): {ultimo['error']}. "
+                             "Las sugerencias usan el último pronóstico calculado.")
+                    if st.button("Reintentar el pronóstico", key="pronostico_reintentar"):
+                        id_pronostico = enviar_trabajo("pronostico_demanda", sesion=st.session_state.id_sesion)
+                elif not ultimo or (ultimo['terminado'] or "") < date.today().isoformat():
+                    id_pronostico = enviar_trabajo("pronostico_demanda", sesion=st.session_state.id_sesion)
+                if id_pronostico is not None:
+                    st.caption(f"Actualizando el pronóstico de demanda en segundo plano (trabajo #{id_pronostico}); "
+                               "las sugerencias usan el último pronóstico calculado.")
+            col_reposicion, col_revision, col_servicio = st.columns(3)
+            with col_reposicion:
+                dias_reposicion = st.number_input("Días de reposición", min_value=1, max_value=60, value=DIAS_REPOSICION, key="compra_reposicion")
+            with col_revision:
+                dias_revision = st.number_input("Días entre compras", min_value=1, max_value=60, value=DIAS_REVISION, key="compra_revision")
+            with col_servicio:
+                nivel_servicio = st.slider("Nivel de servicio", 0.80, 0.99, NIVEL_SERVICIO, 0.01, key="compra_servicio")
+            sugerencias = sugerencias_compra_db(date.today().isoformat(), int(dias_reposicion), int(dias_revision), float(nivel_servicio))
+            if sugerencias.empty:
+                st.info("Ningún producto está en su punto de reorden.")
+            else:
+                st.warning(f"**{len(sugerencias)}** productos están en su punto de reorden o por debajo:")
+                st.dataframe(sugerencias.drop(columns=["id"]), use_container_width=True, hide_index=True)
+                st.download_button("Descargar sugerencias (CSV)", sugerencias.drop(columns=["id"]).to_csv(index=False).encode("utf-8"),
+                                   file_name=f"sugerencias_compra_{date.today().isoformat()}.csv", mime="text/csv")
+
 
         else:
             st.info("No hay productos registrados para mostrar el stock.")
     else:
-        st.info("No hay pedidos registrados para generar reportes.")
\ No newline at end of file
+        st.info("No hay pedidos registrados para generar reportes.")
+
+# ==============================================================================
+# 4. PANEL DE RENDIMIENTO (opcional)
+# ==============================================================================
+st.sidebar.markdown("---")
+st.sidebar.toggle("Panel de rendimiento", value=trazas.ACTIVAS_POR_DEFECTO, key="panel_rendimiento")
+if registro_rerun is not None:
+    mostrar_panel_rendimiento(registro_rerun)
+    trazas.terminar_rerun()
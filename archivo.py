@@ -0,0 +1,280 @@
+import argparse
+import os
+from datetime import datetime, timedelta
+
+import database
+from database import cache_lectura, conexion, enviar_escritura
+from trabajos import tipo_trabajo
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+# Archivo histórico de pedidos: los pedidos cerrados (Completado/Cancelado) más antiguos que
+# EDAD_ARCHIVO_DIAS se mueven, con sus ítems, a una base aparte (<base>_archivo.db). La base
+# principal conserva solo los pedidos "calientes" y su archivo se mantiene pequeño (páginas en
+# caché, índices cortos, selectores y listados sin años de pedidos cerrados).
+#
+# - Se mueve por lotes, cada uno en transacciones cortas: las ventas en curso no esperan. Las
+#   escrituras van por el escritor único de cada base (el de la principal y el del archivo).
+# - ventas_diarias conserva las ventas archivadas; al reconstruirla
+#   (reportes.reconstruir_ventas_diarias_db) se suma también esta base.
+# - Los totales del Dashboard (pedidos e ingresos por estado) suman resumen_archivado_db,
+#   que solo se recalcula al archivar: el Dashboard no cambia al mover pedidos.
+# - Con pyarrow, solo se archivan pedidos ya exportados al snapshot analítico (analitica.py).
+# - Los pedidos archivados se consultan bajo demanda (obtener_pedido_archivado_db).
+# - Tras archivar, PRAGMA incremental_vacuum devuelve al disco las páginas liberadas.
+#
+#   python archivo.py --dias 365
+#   python archivo.py --activar-vacuum      # una vez, en bases creadas antes del vacuum incremental
+
+EDAD_ARCHIVO_DIAS = 365
+PEDIDOS_POR_LOTE = 2000
+
+_ESQUEMA_ARCHIVO = [
+    '''
+    CREATE TABLE IF NOT EXISTS pedidos (
+        id INTEGER PRIMARY KEY,
+        id_cliente INTEGER NOT NULL,
+        nombre_cliente TEXT NOT NULL,
+        fecha_creacion TEXT,
+        fecha_entrega_estimada TEXT,
+        estado TEXT,
+        total REAL,
+        archivado TEXT NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS items_pedido (
+        id INTEGER PRIMARY KEY,
+        id_pedido INTEGER NOT NULL,
+        id_producto INTEGER NOT NULL,
+        nombre_producto TEXT NOT NULL,
+        cantidad INTEGER NOT NULL,
+        precio_unitario REAL NOT NULL,
+        subtotal REAL NOT NULL
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_items_pedido_pedido ON items_pedido (id_pedido)",
+    "CREATE INDEX IF NOT EXISTS idx_pedidos_cliente ON pedidos (id_cliente)",
+]
+
+_COLUMNAS_PEDIDO = "id, id_cliente, nombre_cliente, fecha_creacion, fecha_entrega_estimada, estado, total"
+_COLUMNAS_ITEM = "id, id_pedido, id_producto, nombre_producto, cantidad, precio_unitario, subtotal"
+
+
+def ruta_archivo(db_path=None):
+    """Archivo de la base histórica que acompaña a `db_path` (alexfruver_erp.db -> alexfruver_erp_archivo.db)."""
+    base, extension = os.path.splitext(db_path or database.base_actual())
+    return f"{base}_archivo{extension or '.db'}"
+
+
+def _crear_esquema(conn):
+    for sentencia in _ESQUEMA_ARCHIVO:
+        conn.execute(sentencia)
+
+
+def _copiar_lote(conn, pedidos, items, ahora):
+    conn.executemany(f"INSERT OR REPLACE INTO pedidos ({_COLUMNAS_PEDIDO}, archivado) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                     [fila + (ahora,) for fila in pedidos])
+    conn.executemany(f"INSERT OR REPLACE INTO items_pedido ({_COLUMNAS_ITEM}) VALUES (?, ?, ?, ?, ?, ?, ?)", items)
+
+
+def _borrar_cerrados(conn, ids):
+    # Solo los que siguen cerrados (otra sesión pudo reabrir alguno); devuelve los borrados
+    borrados = [fila[0] for fila in conn.execute(f"""
+        DELETE FROM pedidos WHERE id IN ({_marcadores(ids)}) AND estado IN ('Completado', 'Cancelado')
+        RETURNING id
+    """, ids)]
+    # El pedido se borra antes que sus ítems: el trigger de borrado de ítems ya no
+    # encuentra su día/estado y ventas_diarias conserva las ventas archivadas.
+    if borrados:
+        conn.execute(f"DELETE FROM items_pedido WHERE id_pedido IN ({_marcadores(borrados)})", borrados)
+    return borrados
+
+
+def _descartar_copias(conn, ids):
+    conn.execute(f"DELETE FROM items_pedido WHERE id_pedido IN ({_marcadores(ids)})", ids)
+    conn.execute(f"DELETE FROM pedidos WHERE id IN ({_marcadores(ids)})", ids)
+
+
+def _sin_cambios(conn):
+    pass
+
+
+def _marcadores(valores):
+    return ", ".join("?" * len(valores))
+
+
+def _candidatos_db(conn, corte, desde_id, limite, respetar_cola):
+    sql = """
+        SELECT id FROM pedidos
+        WHERE estado IN ('Completado', 'Cancelado') AND fecha_creacion < ? AND id > ?
+    """
+    if respetar_cola:
+        # Los pendientes del snapshot analítico (cola_analitica) se quedan hasta exportarse
+        sql += " AND id NOT IN (SELECT id_pedido FROM cola_analitica)"
+    return [fila[0] for fila in conn.execute(sql + " ORDER BY id LIMIT ?", (corte, desde_id, limite))]
+
+
+def archivar_pedidos_db(dias=EDAD_ARCHIVO_DIAS, lote=PEDIDOS_POR_LOTE, progreso=None):
+    """
+    Mueve a la base histórica los pedidos cerrados creados hace más de `dias` días.
+    Antes exporta al snapshot analítico (analitica.py) los pedidos pendientes de la cola; los
+    que sigan en ella no se archivan. Sin pyarrow no hay snapshot: se archiva sin esperar a la
+    cola (el snapshot que se cree después los lee de la base histórica).
+    Devuelve {'pedidos', 'items', 'paginas_liberadas'}.
+    """
+    import analitica
+
+    db_path = database.base_actual()
+    archivo = ruta_archivo(db_path)
+    enviar_escritura(_crear_esquema, db_path=archivo).result()
+    con_snapshot = analitica.disponible()
+    if con_snapshot:
+        if progreso is not None:
+            progreso(0.0, "Exportando pedidos pendientes al snapshot analítico")
+        analitica.actualizar_snapshot()
+    corte = (datetime.now() - timedelta(days=dias)).strftime("%Y-%m-%d")
+    ahora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    resultado = {'pedidos': 0, 'items': 0, 'paginas_liberadas': 0}
+    desde_id = 0
+
+    while True:
+        with conexion(db_path) as conn:
+            ids = _candidatos_db(conn, corte, desde_id, lote, con_snapshot)
+            if not ids:
+                break
+            pedidos = conn.execute(f"SELECT {_COLUMNAS_PEDIDO} FROM pedidos WHERE id IN ({_marcadores(ids)})", ids).fetchall()
+            items = conn.execute(f"SELECT {_COLUMNAS_ITEM} FROM items_pedido WHERE id_pedido IN ({_marcadores(ids)})", ids).fetchall()
+
+        # 1) Copia en el archivo. Son dos bases: si el proceso cae entre 1) y 2), el lote queda
+        #    en ambas y la siguiente corrida lo vuelve a copiar (OR REPLACE) y lo borra.
+        enviar_escritura(_copiar_lote, pedidos, items, ahora, db_path=archivo).result()
+
+        # 2) Borrado en la base principal, solo de los que siguen cerrados
+        borrados = enviar_escritura(_borrar_cerrados, ids, tablas=("pedidos", "pedidos_archivados"),
+                                    db_path=db_path).result()
+        borrados_set = set(borrados)
+        reabiertos = sorted(set(ids) - borrados_set)
+        if reabiertos:
+            enviar_escritura(_descartar_copias, reabiertos, db_path=archivo).result()
+            # La base histórica cambió: resumen_archivado_db se recalcula (también en otros procesos)
+            enviar_escritura(_sin_cambios, tablas=("pedidos_archivados",), db_path=db_path).result()
+
+        desde_id = ids[-1]
+        resultado['pedidos'] += len(borrados)
+        resultado['items'] += sum(1 for item in items if item[1] in borrados_set)
+        if progreso is not None:
+            progreso(0.0, f"{resultado['pedidos']:,} pedidos archivados")
+
+    resultado['paginas_liberadas'] = liberar_espacio_db(db_path)
+    return resultado
+
+
+def liberar_espacio_db(db_path=None):
+    """Devuelve al sistema de archivos las páginas libres (requiere auto_vacuum=INCREMENTAL). Devuelve cuántas."""
+    # Fuera del escritor: incremental_vacuum no puede ir dentro de su BEGIN IMMEDIATE
+    with conexion(db_path) as conn:
+        libres = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2 or not libres:
+            return 0
+        # executescript avanza la sentencia hasta el final (execute libera una sola página por paso)
+        conn.executescript("PRAGMA incremental_vacuum")
+        return libres - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def activar_vacuum_incremental(db_path=None):
+    """
+    Convierte una base existente a auto_vacuum=INCREMENTAL (las nuevas ya lo traen, ver
+    database.configurar_conexion). Hace un VACUUM completo: se ejecuta una sola vez y sin
+    usuarios conectados. Devuelve True si hubo que convertirla.
+    """
+    # Fuera del escritor: VACUUM no puede ejecutarse dentro de una transacción
+    with conexion(db_path) as conn:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return False
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    return True
+
+
+# --- Consulta de pedidos archivados ---
+@cache_lectura("pedidos_archivados")
+def resumen_archivado_db():
+    """
+    Pedidos e ingresos archivados por estado: {estado: (pedidos, ingresos)}, {} sin base histórica.
+    En caché hasta la siguiente corrida de archivar_pedidos_db, que invalida 'pedidos_archivados'.
+    """
+    db_path = database.base_actual()
+    archivo = ruta_archivo(db_path)
+    if not os.path.exists(archivo):
+        return {}
+    # Un lote interrumpido sigue también en la base principal, que ya lo cuenta
+    with conexion(archivo, adjuntas={'principal': db_path}) as conn:
+        filas = conn.execute("""
+            SELECT estado, COUNT(*), COALESCE(SUM(total), 0) FROM pedidos
+            WHERE id NOT IN (SELECT id FROM principal.pedidos)
+            GROUP BY estado
+        """).fetchall()
+    return {estado: (pedidos, ingresos) for estado, pedidos, ingresos in filas}
+
+
+# Búsqueda y detalle bajo demanda, sin caché
+def _filas_a_dicts(c):
+    columnas = [d[0] for d in c.description]
+    return [dict(zip(columnas, fila)) for fila in c.fetchall()]
+
+
+def sugerir_pedidos_archivados_db(texto="", limite=20):
+    """Pedidos archivados por número o por nombre del cliente (los más recientes primero)."""
+    archivo = ruta_archivo()
+    if not os.path.exists(archivo):
+        return []
+    texto = (texto or "").strip().lstrip("#")
+    sql = "SELECT id, nombre_cliente, estado, fecha_creacion, total FROM pedidos"
+    if texto.isdigit():
+        sql, params = sql + " WHERE id = ?", [int(texto)]
+    elif texto:
+        sql, params = sql + " WHERE nombre_cliente LIKE ?", [f"%{texto}%"]
+    else:
+        params = []
+    with conexion(archivo) as conn:
+        return _filas_a_dicts(conn.execute(sql + " ORDER BY id DESC LIMIT ?", params + [limite]))
+
+
+def obtener_pedido_archivado_db(id_pedido):
+    """Pedido archivado con su lista de 'items', o None si no está en el archivo."""
+    archivo = ruta_archivo()
+    if not os.path.exists(archivo):
+        return None
+    with conexion(archivo) as conn:
+        pedidos = _filas_a_dicts(conn.execute("SELECT * FROM pedidos WHERE id = ?", (id_pedido,)))
+        if not pedidos:
+            return None
+        pedidos[0]['items'] = _filas_a_dicts(conn.execute(
+            "SELECT id_producto, nombre_producto, cantidad, precio_unitario, subtotal FROM items_pedido WHERE id_pedido = ? ORDER BY id",
+            (id_pedido,)))
+    return pedidos[0]
+
+
+@tipo_trabajo("archivar_pedidos", "Archivar pedidos cerrados antiguos")
+def trabajo_archivar(parametros, progreso):
+    resultado = archivar_pedidos_db(int(parametros.get('dias', EDAD_ARCHIVO_DIAS)), progreso=progreso)
+    progreso(1.0, f"{resultado['pedidos']:,} pedidos archivados, {resultado['paginas_liberadas']:,} páginas liberadas")
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archiva los pedidos cerrados antiguos de Alex Fruver ERP")
+    parser.add_argument("--dias", type=int, default=EDAD_ARCHIVO_DIAS, help="Edad mínima (días desde la creación)")
+    parser.add_argument("--lote", type=int, default=PEDIDOS_POR_LOTE, help="Pedidos movidos por transacción")
+    parser.add_argument("--activar-vacuum", action="store_true",
+                        help="Convierte la base a auto_vacuum incremental (VACUUM completo, una sola vez)")
+    parser.add_argument("--db", default=database.DB_NAME, help="Archivo de base de datos (por defecto: %(default)s)")
+    args = parser.parse_args()
+
+    database.DB_NAME = args.db
+    if args.activar_vacuum:
+        print("Base convertida a auto_vacuum incremental." if activar_vacuum_incremental()
+              else "La base ya usa auto_vacuum incremental.")
+    resultado = archivar_pedidos_db(args.dias, args.lote)
+    print(f"{resultado['pedidos']:,} pedidos ({resultado['items']:,} ítems) archivados en {ruta_archivo()}; "
+          f"{resultado['paginas_liberadas']:,} páginas liberadas")
@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import time
+import tracemalloc
+from datetime import datetime
+
+import database
+from generar_datos import ESCALAS, generar_base
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+# Benchmark de las funciones de datos a varias escalas. Genera (una vez) una base sintética
+# por escala, mide latencia p50/p95 y pico de memoria de cada función y guarda el resultado
+# en JSON para comparar entre versiones.
+#
+#   python benchmark.py --escalas pequena mediana --salida bench_results/actual.json
+#   python benchmark.py --escalas pequena --comparar bench_results/anterior.json
+
+# Cargar todos los pedidos con sus ítems en memoria solo se mide hasta este tamaño
+MAX_PEDIDOS_CARGA_COMPLETA = 200_000
+UMBRAL_REGRESION = 1.25 # p50 más de un 25 % peor que la referencia
+
+
+def _sin_cache(funcion):
+    """Las lecturas en caché se miden contra SQLite, no contra el diccionario en memoria."""
+    return getattr(funcion, "sin_cache", funcion)
+
+
+def _casos(rnd, conteos):
+    """Lista de (nombre, función sin argumentos, repeticiones)."""
+    import datos
+    import reportes
+
+    ids_productos = [fila[0] for fila in _consulta("SELECT id FROM productos")]
+    id_max_pedido = _consulta("SELECT MAX(id) FROM pedidos")[0][0] or 1
+    id_max_cliente = _consulta("SELECT MAX(id) FROM clientes")[0][0] or 1
+
+    def nuevo_pedido():
+        items = []
+        for id_producto in rnd.sample(ids_productos, 5):
+            cantidad = rnd.randint(1, 10)
+            items.append({'id_producto': id_producto, 'nombre_producto': 'bench', 'cantidad': cantidad,
+                          'precio_unitario': 1000.0, 'subtotal': 1000.0 * cantidad})
+        return datos.add_pedido_db(rnd.randint(1, id_max_cliente), "Cliente benchmark",
+                                   datetime.now().strftime("%Y-%m-%d %H:%M:%S"), None, "Pendiente",
+                                   sum(i['subtotal'] for i in items), items)
+
+    def id_pedido_al_azar():
+        return rnd.randint(1, id_max_pedido)
+
+    def completar_pedido():
+        id_pedido = nuevo_pedido()
+        return datos.update_pedido_estado_db(id_pedido, "Completado")
+
+    casos = [
+        ("get_productos_db", _sin_cache(datos.get_productos_db), 30),
+        ("get_clientes_db", _sin_cache(datos.get_clientes_db), 5),
+        ("obtener_producto_por_id_db", lambda: datos.obtener_producto_por_id_db(rnd.choice(ids_productos)), 200),
+        ("obtener_cliente_por_id_db", lambda: datos.obtener_cliente_por_id_db(rnd.randint(1, id_max_cliente)), 200),
+        ("buscar_pedidos_db(limite=50)", lambda: datos.buscar_pedidos_db(limite=50), 50),
+        ("buscar_pedidos_db(estado, limite=50)", lambda: datos.buscar_pedidos_db(estado="Pendiente", limite=50), 50),
+        ("buscar_pedidos_db(id_cliente)", lambda: datos.buscar_pedidos_db(id_cliente=rnd.randint(1, id_max_cliente)), 50),
+        ("listar_pedidos_db(pagina)", lambda: datos.listar_pedidos_db(limite=50, cursor=(id_pedido_al_azar(),) * 2), 50),
+        ("listar_clientes_db(pagina)", lambda: datos.listar_clientes_db(limite=50), 50),
+        ("sugerir_clientes_db(texto)", lambda: _sin_cache(datos.sugerir_clientes_db)(rnd.choice(["mar", "rest gom", "310", "hotel"])), 100),
+        ("sugerir_pedidos_db(texto)", lambda: _sin_cache(datos.sugerir_pedidos_db)(rnd.choice(["mar", "rest gom", str(id_pedido_al_azar())])), 100),
+        ("resumen_general_db", _sin_cache(reportes.resumen_general_db), 10),
+        ("pedidos_por_estado_db", _sin_cache(reportes.pedidos_por_estado_db), 10),
+        ("productos_mas_vendidos_db", _sin_cache(reportes.productos_mas_vendidos_db), 5),
+        ("ventas_por_periodo_db(Mes)", lambda: _sin_cache(reportes.ventas_por_periodo_db)("Mes"), 10),
+        ("add_pedido_db(5 items)", nuevo_pedido, 50),
+        ("update_pedido_estado_db(Completado)", completar_pedido, 50),
+    ]
+    if conteos['pedidos'] <= MAX_PEDIDOS_CARGA_COMPLETA:
+        casos.insert(2, ("get_pedidos_db", datos.get_pedidos_db, 3))
+    return casos
+
+
+def _consulta(sql):
+    with database.conexion() as conn:
+        return conn.execute(sql).fetchall()
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    k = (len(ordenados) - 1) * p / 100
+    inferior = int(k)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (k - inferior)
+
+
+def medir(funcion, repeticiones):
+    """Devuelve latencias (ms) de `repeticiones` llamadas y el pico de memoria (MB) de una llamada extra."""
+    funcion() # calentamiento: caché de páginas de SQLite y de sentencias preparadas
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+
+    # La memoria se mide aparte porque tracemalloc distorsiona los tiempos
+    tracemalloc.start()
+    funcion()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'n': repeticiones,
+        'p50_ms': round(_percentil(tiempos, 50), 3),
+        'p95_ms': round(_percentil(tiempos, 95), 3),
+        'media_ms': round(statistics.fmean(tiempos), 3),
+        'max_ms': round(max(tiempos), 3),
+        'pico_memoria_mb': round(pico / 1024 / 1024, 3),
+    }
+
+
+def ejecutar_escala(nombre, ruta, semilla=42, filtro=None):
+    anterior = database.DB_NAME
+    database.DB_NAME = ruta
+    try:
+        conteos = {tabla: _consulta(f"SELECT COUNT(*) FROM {tabla}")[0][0]
+                   for tabla in ("clientes", "productos", "pedidos", "items_pedido")}
+        print(f"\n== Escala '{nombre}': {conteos}")
+        rnd = random.Random(semilla)
+        resultados = {}
+        for caso, funcion, repeticiones in _casos(rnd, conteos):
+            if filtro and not any(f in caso for f in filtro):
+                continue
+            resultados[caso] = medir(funcion, repeticiones)
+            r = resultados[caso]
+            print(f"  {caso:<42} p50 {r['p50_ms']:>10.2f} ms   p95 {r['p95_ms']:>10.2f} ms   pico {r['pico_memoria_mb']:>8.2f} MB")
+        return {'filas': conteos, 'funciones': resultados}
+    finally:
+        database.DB_NAME = anterior
+        database.cerrar_pools()
+
+
+def comparar(actual, referencia):
+    """Imprime las funciones cuyo p50 empeoró más allá de UMBRAL_REGRESION. Devuelve cuántas."""
+    regresiones = 0
+    for escala, datos_escala in actual['escalas'].items():
+        previos = referencia.get('escalas', {}).get(escala, {}).get('funciones', {})
+        for caso, r in datos_escala['funciones'].items():
+            previo = previos.get(caso)
+            if not previo or not previo['p50_ms']:
+                continue
+            razon = r['p50_ms'] / previo['p50_ms']
+            marca = "REGRESIÓN" if razon > UMBRAL_REGRESION else ""
+            regresiones += bool(marca)
+            print(f"  [{escala}] {caso:<42} {previo['p50_ms']:>10.2f} -> {r['p50_ms']:>10.2f} ms  x{razon:.2f} {marca}")
+    return regresiones
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de las funciones de datos de Alex Fruver ERP")
+    parser.add_argument("--escalas", nargs="+", choices=list(ESCALAS), default=["pequena", "mediana"])
+    parser.add_argument("--directorio", default="bench_data", help="Dónde se guardan las bases generadas")
+    parser.add_argument("--salida", help="Archivo JSON de resultados (por defecto bench_results/<fecha>.json)")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior para detectar regresiones")
+    parser.add_argument("--solo", nargs="+", help="Mide solo los casos cuyo nombre contenga alguno de estos textos")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+
+    os.makedirs(args.directorio, exist_ok=True)
+    resultado = {
+        'fecha': datetime.now().isoformat(timespec="seconds"),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'plataforma': platform.platform(),
+        'escalas': {},
+    }
+    for escala in args.escalas:
+        ruta = os.path.join(args.directorio, f"{escala}.db")
+        if not os.path.exists(ruta):
+            n_clientes, n_pedidos = ESCALAS[escala]
+            generar_base(ruta, n_clientes, n_pedidos, semilla=args.semilla)
+        resultado['escalas'][escala] = ejecutar_escala(escala, ruta, args.semilla, args.solo)
+
+    salida = args.salida or os.path.join("bench_results", f"{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(salida) or ".", exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados guardados en {salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            referencia = json.load(f)
+        print(f"\nComparación contra {args.comparar}:")
+        if comparar(resultado, referencia):
+            raise SystemExit(1)
@@ -0,0 +1,160 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+
+from benchmark import _percentil
+from generar_datos import generar_base
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+# Prueba de rendimiento de api.py: varios hilos envían pedidos por HTTP (con keep-alive,
+# como lo haría una caja POS) y se mide cuántos pedidos por segundo se confirman.
+#
+#   python benchmark_api.py                         # base temporal y API en un proceso aparte
+#   python benchmark_api.py --pedidos 5000 --hilos 16 --minimo 300
+#   python benchmark_api.py --url http://127.0.0.1:8502 --db alexfruver_erp.db
+#
+# Termina con código 1 si la tasa queda por debajo de --minimo o si alguna petición falla.
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _esperar_api(host, puerto, timeout=30):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            conn = http.client.HTTPConnection(host, puerto, timeout=2)
+            conn.request("GET", "/salud")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"La API no respondió en {host}:{puerto}")
+
+
+def _ids_validos(host, puerto):
+    """Ids de productos desde la propia API; los de clientes se asumen 1..n (base generada)."""
+    conn = http.client.HTTPConnection(host, puerto, timeout=10)
+    conn.request("GET", "/productos/stock")
+    productos = json.loads(conn.getresponse().read())['productos']
+    conn.close()
+    return [p['id'] for p in productos]
+
+
+def _trabajador(host, puerto, n_pedidos, ids_productos, n_clientes, semilla, latencias, errores, proporcion_estado):
+    rnd = random.Random(semilla)
+    conn = http.client.HTTPConnection(host, puerto, timeout=30)
+    cabeceras = {"Content-Type": "application/json"}
+    token = os.environ.get("ALEXFRUVER_API_TOKEN")
+    if token:
+        cabeceras["Authorization"] = f"Bearer {token}"
+    ultimo_pedido = None
+    for _ in range(n_pedidos):
+        if ultimo_pedido and rnd.random() < proporcion_estado:
+            metodo, ruta = "PATCH", f"/pedidos/{ultimo_pedido}/estado"
+            cuerpo = {'estado': rnd.choice(["En Proceso", "Completado"])}
+        else:
+            metodo, ruta = "POST", "/pedidos"
+            cuerpo = {
+                'id_cliente': rnd.randint(1, n_clientes),
+                'items': [{'id_producto': id_producto, 'cantidad': rnd.randint(1, 10)}
+                          for id_producto in rnd.sample(ids_productos, rnd.randint(1, 5))],
+            }
+        inicio = time.perf_counter()
+        try:
+            conn.request(metodo, ruta, body=json.dumps(cuerpo), headers=cabeceras)
+            respuesta = conn.getresponse()
+            datos = respuesta.read()
+        except (OSError, http.client.HTTPException) as e:
+            errores.append(repr(e))
+            conn.close()
+            conn = http.client.HTTPConnection(host, puerto, timeout=30)
+            continue
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        if respuesta.status >= 400:
+            errores.append(f"{respuesta.status} {datos[:200]!r}")
+        elif metodo == "POST":
+            ultimo_pedido = json.loads(datos)['id_pedido']
+    conn.close()
+
+
+def ejecutar(host, puerto, n_pedidos, hilos, n_clientes, semilla=42, proporcion_estado=0.0):
+    """Lanza `hilos` clientes concurrentes y devuelve las métricas de la corrida."""
+    ids_productos = _ids_validos(host, puerto)
+    latencias, errores = [], []
+    por_hilo = [n_pedidos // hilos + (1 if i < n_pedidos % hilos else 0) for i in range(hilos)]
+    trabajadores = [
+        threading.Thread(target=_trabajador, args=(host, puerto, n, ids_productos, n_clientes, semilla + i,
+                                                   latencias, errores, proporcion_estado))
+        for i, n in enumerate(por_hilo)
+    ]
+    inicio = time.perf_counter()
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+    duracion = time.perf_counter() - inicio
+    return {
+        'peticiones': len(latencias),
+        'errores': len(errores),
+        'primeros_errores': errores[:5],
+        'segundos': round(duracion, 3),
+        'peticiones_por_segundo': round(len(latencias) / duracion, 1) if duracion else 0.0,
+        'p50_ms': round(_percentil(latencias, 50), 3) if latencias else None,
+        'p95_ms': round(_percentil(latencias, 95), 3) if latencias else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de rendimiento de la API de pedidos")
+    parser.add_argument("--url", help="API ya en marcha (si no se indica, se arranca una en un proceso aparte)")
+    parser.add_argument("--db", help="Base a usar al arrancar la API (por defecto una base temporal generada)")
+    parser.add_argument("--clientes", type=int, default=500, help="Clientes de la base temporal (ids 1..n)")
+    parser.add_argument("--pedidos", type=int, default=3000)
+    parser.add_argument("--hilos", type=int, default=8)
+    parser.add_argument("--estado", type=float, default=0.0,
+                        help="Proporción de peticiones que cambian el estado del último pedido creado")
+    parser.add_argument("--minimo", type=float, default=200, help="Peticiones por segundo exigidas")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+
+    proceso = None
+    temporal = None
+    if args.url:
+        url = urlparse(args.url)
+        host, puerto = url.hostname, url.port or 80
+    else:
+        ruta = args.db
+        if ruta is None:
+            temporal = tempfile.TemporaryDirectory()
+            ruta = os.path.join(temporal.name, "api.db")
+            generar_base(ruta, args.clientes, 1000, semilla=args.semilla, verbose=False)
+        host, puerto = "127.0.0.1", _puerto_libre()
+        proceso = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "api.py"),
+                                    "--db", ruta, "--puerto", str(puerto)], stdout=subprocess.DEVNULL)
+    try:
+        _esperar_api(host, puerto)
+        resultado = ejecutar(host, puerto, args.pedidos, args.hilos, args.clientes, args.semilla, args.estado)
+    finally:
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait()
+        if temporal is not None:
+            temporal.cleanup()
+
+    print(json.dumps(resultado, ensure_ascii=False, indent=2))
+    if resultado['errores'] or resultado['peticiones_por_segundo'] < args.minimo:
+        raise SystemExit(1)
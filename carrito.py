@@ -0,0 +1,59 @@
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+# Carrito del pedido en construcción (sin Streamlit ni base de datos).
+#
+# Una línea por producto: añadir otra vez el mismo producto suma la cantidad en su línea.
+# El total se mantiene al añadir y quitar, así que ni mostrarlo ni guardarlo recorre los ítems.
+# Precio, nombre y unidad se toman del catálogo en memoria (datos.catalogo_productos_db) en el
+# momento de añadir, y quedan fijos en la línea aunque el catálogo cambie después.
+
+
+class Carrito:
+    def __init__(self):
+        self.lineas = {} # id_producto -> ítem con el formato de items_pedido
+        self.total = 0.0
+
+    def __len__(self):
+        return len(self.lineas)
+
+    def cantidad(self, id_producto):
+        """Cantidad ya añadida de un producto (0 si no está en el carrito)."""
+        linea = self.lineas.get(id_producto)
+        return linea['cantidad'] if linea else 0
+
+    def agregar(self, producto, cantidad):
+        """
+        Añade `cantidad` de `producto` (un dict del catálogo con id, nombre y precio_unitario).
+        Devuelve la línea resultante.
+        """
+        if cantidad <= 0:
+            raise ValueError("La cantidad debe ser mayor que cero")
+        linea = self.lineas.get(producto['id'])
+        if linea is None:
+            linea = self.lineas[producto['id']] = {
+                'id_producto': producto['id'],
+                'nombre_producto': producto['nombre'],
+                'unidad_medida': producto.get('unidad_medida'),
+                'cantidad': 0,
+                'precio_unitario': producto['precio_unitario'],
+                'subtotal': 0.0,
+            }
+        subtotal = linea['precio_unitario'] * cantidad
+        linea['cantidad'] += cantidad
+        linea['subtotal'] += subtotal
+        self.total += subtotal
+        return linea
+
+    def quitar(self, id_producto):
+        linea = self.lineas.pop(id_producto, None)
+        if linea is not None:
+            self.total -= linea['subtotal']
+            if not self.lineas:
+                self.total = 0.0 # sin restos de redondeo en un carrito vacío
+
+    def vaciar(self):
+        self.lineas.clear()
+        self.total = 0.0
+
+    def items(self):
+        """Líneas en orden de llegada, listas para add_pedido_db."""
+        return list(self.lineas.values())
@@ -0,0 +1,563 @@
+import functools
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+# Gestor de conexiones SQLite compartido por todo el proceso
+DB_NAME = 'alexfruver_erp.db' # NOMBRE DE LA BASE DE DATOS ACTUALIZADO
+
+# Parámetros de cada conexión (se aplican una sola vez al crearla)
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KIB = 16000 # ~16 MB de caché de páginas por conexión
+MAX_CONEXIONES = 8
+
+# Número máximo de resultados guardados por la caché de lecturas
+MAX_ENTRADAS_CACHE = 256
+
+# Escritor único: escrituras agrupadas como máximo en un commit, e intentos de BEGIN IMMEDIATE
+# si otro proceso (p. ej. api.py) mantiene el bloqueo más allá de busy_timeout
+MAX_ESCRITURAS_POR_COMMIT = 64
+REINTENTOS_BLOQUEO = 5
+
+# Ganchos de instrumentación (ver trazas.py). None = apagada, sin costo.
+TRAZADOR = None
+
+# Base de cada hilo (sucursal de una sesión de Streamlit, trabajo en segundo plano; ver
+# sucursales.py). Sin elegir, se usa DB_NAME.
+_base_del_hilo = threading.local()
+
+# Estados posibles de un pedido (en el orden en que se muestran)
+ESTADOS_PEDIDO = ["Pendiente", "En Proceso", "Completado", "Cancelado"]
+
+
+def configurar_conexion(conn):
+    """Aplica los PRAGMA de rendimiento a una conexión recién abierta."""
+    # Antes que journal_mode: solo surte efecto en un archivo aún vacío (las bases existentes
+    # se convierten una vez con archivo.activar_vacuum_incremental). Permite devolver al
+    # sistema las páginas liberadas al archivar pedidos sin un VACUUM completo.
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    # WAL: los lectores ya no bloquean al escritor (y viceversa)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    # En modo WAL, NORMAL es seguro ante caídas de la aplicación y evita un fsync por commit
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+class PoolConexiones:
+    """Pool de conexiones reutilizables para un archivo SQLite."""
+
+    def __init__(self, db_path, max_conexiones=MAX_CONEXIONES):
+        self.db_path = db_path
+        self.max_conexiones = max_conexiones
+        self._libres = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._creadas = 0
+
+    def _crear_conexion(self):
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        return configurar_conexion(conn)
+
+    def adquirir(self):
+        try:
+            return self._libres.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._creadas < self.max_conexiones:
+                self._creadas += 1
+                crear = True
+            else:
+                crear = False
+        if crear:
+            try:
+                return self._crear_conexion()
+            except Exception:
+                with self._lock:
+                    self._creadas -= 1
+                raise
+        # Pool agotado: esperar a que otra sesión devuelva su conexión
+        return self._libres.get(timeout=BUSY_TIMEOUT_MS / 1000)
+
+    def liberar(self, conn):
+        # Nunca devolver al pool una conexión con una transacción a medias
+        if conn.in_transaction:
+            conn.rollback()
+        self._libres.put(conn)
+
+    def cerrar(self):
+        while True:
+            try:
+                conn = self._libres.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._creadas -= 1
+
+    @contextmanager
+    def conexion(self):
+        conn = self.adquirir()
+        trazador = TRAZADOR
+        if trazador is not None:
+            trazador.al_prestar(conn)
+        try:
+            yield conn
+        finally:
+            if trazador is not None:
+                trazador.al_devolver(conn)
+            self.liberar(conn)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def base_actual():
+    """Archivo de la base del hilo actual (la elegida con seleccionar_base, o DB_NAME)."""
+    return getattr(_base_del_hilo, "db_path", None) or DB_NAME
+
+
+def seleccionar_base(db_path):
+    """Fija la base del hilo actual para todas las funciones que no reciben db_path (None = DB_NAME)."""
+    _base_del_hilo.db_path = db_path
+
+
+@contextmanager
+def usando_base(db_path):
+    """Como seleccionar_base, solo dentro del bloque."""
+    anterior = getattr(_base_del_hilo, "db_path", None)
+    _base_del_hilo.db_path = db_path
+    try:
+        yield
+    finally:
+        _base_del_hilo.db_path = anterior
+
+
+def get_pool(db_path=None):
+    """Devuelve (creándolo si hace falta) el pool del proceso para `db_path`."""
+    db_path = db_path or base_actual()
+    pool = _pools.get(db_path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(db_path)
+            if pool is None:
+                pool = _pools[db_path] = PoolConexiones(db_path)
+    return pool
+
+
+@contextmanager
+def _adjuntando(conn, adjuntas):
+    # ATTACH/DETACH van fuera de cualquier transacción: SQLite no permite ninguno de los dos dentro
+    for alias, ruta in adjuntas.items():
+        conn.execute(f"ATTACH DATABASE ? AS {alias}", (ruta,))
+    try:
+        yield
+    finally:
+        for alias in adjuntas:
+            conn.execute(f"DETACH DATABASE {alias}")
+
+
+@contextmanager
+def conexion(db_path=None, adjuntas=None):
+    """
+    Presta una conexión del pool para lecturas; se devuelve al salir del bloque.
+    `adjuntas` ({alias: archivo}) adjunta otras bases solo durante el bloque.
+    """
+    with get_pool(db_path).conexion() as conn, _adjuntando(conn, adjuntas or {}):
+        yield conn
+
+
+@contextmanager
+def transaccion(db_path=None, invalida=(), inmediata=False, adjuntas=None):
+    """
+    Presta una conexión y hace commit al salir del bloque (rollback si hay error).
+    `invalida` lista las tablas modificadas: su versión se incrementa tras el commit.
+    `inmediata` abre la transacción con BEGIN IMMEDIATE, tomando el bloqueo de escritura
+    desde el principio (para leer-y-escribir sin que otra sesión se cuele en medio).
+    `adjuntas` ({alias: archivo}) adjunta otras bases solo durante el bloque (ATTACH antes de
+    la transacción, DETACH después).
+    Las versiones de `invalida` se publican también en la tabla versiones_tablas, dentro de
+    la misma transacción, para que los demás procesos (p. ej. api.py) descarten su caché.
+    """
+    with get_pool(db_path).conexion() as conn, _adjuntando(conn, adjuntas or {}):
+        try:
+            if inmediata:
+                conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            if invalida:
+                _publicar_versiones(conn, invalida)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    if invalida:
+        invalidar(*invalida, db_path=db_path)
+
+
+def consultar_pagina(conn, columnas, desde, expr_orden, expr_id, condiciones=(), params=(),
+                     descendente=False, limite=50, cursor=None):
+    """
+    Consulta una página con paginación por keyset sobre (expr_orden, expr_id).
+
+    En lugar de OFFSET (que recorre todas las filas anteriores) se continúa desde el
+    cursor (valor_orden, id) de la última fila de la página previa, así que el costo de
+    cada página no crece con el tamaño de la tabla si expr_orden tiene índice.
+    Devuelve (nombres_columnas, filas, siguiente_cursor); siguiente_cursor es None en la última página.
+    """
+    condiciones = list(condiciones)
+    params = list(params)
+    if cursor is not None:
+        condiciones.append(f"({expr_orden}, {expr_id}) {'<' if descendente else '>'} (?, ?)")
+        params.extend(cursor)
+    direccion = "DESC" if descendente else "ASC"
+    sql = f"SELECT {columnas}, {expr_orden} AS _orden, {expr_id} AS _id FROM {desde}"
+    if condiciones:
+        sql += " WHERE " + " AND ".join(condiciones)
+    sql += f" ORDER BY {expr_orden} {direccion}, {expr_id} {direccion} LIMIT ?"
+    params.append(limite + 1) # una fila extra para saber si hay página siguiente
+
+    c = conn.execute(sql, params)
+    nombres = [d[0] for d in c.description]
+    filas = c.fetchall()
+    siguiente_cursor = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        siguiente_cursor = (filas[-1][-2], filas[-1][-1])
+    # Las dos columnas auxiliares de orden no se devuelven
+    return nombres[:-2], [fila[:-2] for fila in filas], siguiente_cursor
+
+
+def cerrar_pools():
+    """Cierra todas las conexiones libres de todos los pools del proceso (y los escritores)."""
+    cerrar_escritores()
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.cerrar()
+        _pools.clear()
+    with _vigilantes_lock:
+        for vigilante in _vigilantes.values():
+            vigilante[0].close()
+        _vigilantes.clear()
+
+
+# ==============================================================================
+# ESCRITOR ÚNICO CON COMMIT EN GRUPO
+# ==============================================================================
+# Todas las modificaciones de datos de la app (clientes, productos, stock, pedidos) pasan por
+# un único hilo escritor por archivo, con su propia conexión. Las sesiones encolan la función
+# y esperan un Future. El escritor toma todo lo que haya en la cola (hasta
+# MAX_ESCRITURAS_POR_COMMIT) y lo ejecuta en UNA transacción: un solo commit para el grupo y
+# ningún "database is locked" entre sesiones del mismo proceso. Cada escritura corre en su
+# SAVEPOINT: si falla, solo se deshace la suya y su Future recibe la excepción.
+#
+# Sin carga, una escritura se confirma sola (no se espera a juntar un grupo); con muchas
+# sesiones, las que llegan mientras se confirma un grupo forman el siguiente.
+#
+#   @escritura("clientes")
+#   def add_cliente_db(conn, nombre, ...):   # se llama sin conn: add_cliente_db(nombre, ...)
+#       conn.execute("INSERT INTO clientes ...")
+_escritores = {}
+_escritores_lock = threading.Lock()
+_hilo_escritor = threading.local() # en el hilo escritor: .conn y .tablas del grupo en curso
+
+
+class _Tarea:
+    __slots__ = ("funcion", "args", "kwargs", "tablas", "futuro", "traza")
+
+    def __init__(self, funcion, args, kwargs, tablas):
+        self.funcion = funcion
+        self.args = args
+        self.kwargs = kwargs
+        self.tablas = tablas
+        self.futuro = Future()
+        # Registro de trazas de quien encola: el escritor mide la escritura en su nombre
+        trazador = TRAZADOR
+        self.traza = trazador.contexto() if trazador is not None else None
+
+
+class Escritor:
+    """Hilo que ejecuta en serie, y confirma en grupo, las escrituras de un archivo SQLite."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._cola = queue.Queue()
+        self._hilo = threading.Thread(target=self._bucle, name=f"escritor-{db_path}", daemon=True)
+        self._hilo.start()
+
+    def enviar(self, funcion, args=(), kwargs=None, tablas=()):
+        tarea = _Tarea(funcion, args, kwargs or {}, tuple(tablas))
+        self._cola.put(tarea)
+        return tarea.futuro
+
+    def cerrar(self):
+        self._cola.put(None)
+        self._hilo.join()
+
+    def _bucle(self):
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+                               isolation_level=None) # BEGIN/COMMIT explícitos
+        configurar_conexion(conn)
+        _hilo_escritor.conn = conn
+        seleccionar_base(self.db_path)
+        try:
+            while True:
+                tarea = self._cola.get()
+                if tarea is None:
+                    return
+                grupo = [tarea]
+                while len(grupo) < MAX_ESCRITURAS_POR_COMMIT:
+                    try:
+                        tarea = self._cola.get_nowait()
+                    except queue.Empty:
+                        break
+                    if tarea is None:
+                        self._cola.put(None) # terminar después de este grupo
+                        break
+                    grupo.append(tarea)
+                self._ejecutar_grupo(conn, [t for t in grupo if t.futuro.set_running_or_notify_cancel()])
+        finally:
+            conn.close()
+
+    def _comenzar(self, conn):
+        for intento in range(REINTENTOS_BLOQUEO):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                return
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) and "busy" not in str(e) or intento == REINTENTOS_BLOQUEO - 1:
+                    raise
+                time.sleep(0.05 * 2 ** intento)
+
+    def _ejecutar_tarea(self, conn, tarea):
+        trazador = TRAZADOR
+        if trazador is None or tarea.traza is None:
+            return tarea.funcion(conn, *tarea.args, **tarea.kwargs)
+        # Mismos ganchos que el pool (trazas.py), con el registro de la sesión que pidió la escritura
+        with trazador.en_contexto(tarea.traza):
+            trazador.al_prestar(conn, tarea.funcion.__name__)
+            try:
+                return tarea.funcion(conn, *tarea.args, **tarea.kwargs)
+            finally:
+                trazador.al_devolver(conn)
+
+    def _ejecutar_grupo(self, conn, grupo):
+        if not grupo:
+            return
+        try:
+            self._comenzar(conn)
+        except Exception as e:
+            for tarea in grupo:
+                tarea.futuro.set_exception(e)
+            return
+
+        _hilo_escritor.tablas = tablas = set()
+        hechas = [] # (tarea, resultado) de las escrituras que quedaron en la transacción
+        for tarea in grupo:
+            conn.execute("SAVEPOINT escritura")
+            tablas_antes = set(tablas)
+            try:
+                resultado = self._ejecutar_tarea(conn, tarea)
+            except BaseException as e:
+                tablas.intersection_update(tablas_antes) # las escrituras anidadas también se deshicieron
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK TO escritura")
+                    conn.execute("RELEASE escritura")
+                    tarea.futuro.set_exception(e)
+                    continue
+                # Error que abortó toda la transacción: se pierden las anteriores del grupo y
+                # las siguientes se ejecutan en un grupo nuevo
+                tarea.futuro.set_exception(e)
+                for hecha, _ in hechas:
+                    hecha.futuro.set_exception(e)
+                self._ejecutar_grupo(conn, grupo[grupo.index(tarea) + 1:])
+                return
+            conn.execute("RELEASE escritura")
+            tablas.update(tarea.tablas)
+            hechas.append((tarea, resultado))
+
+        try:
+            if tablas:
+                _publicar_versiones(conn, tablas)
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for tarea, _ in hechas:
+                tarea.futuro.set_exception(e)
+            return
+        if tablas:
+            invalidar(*tablas, db_path=self.db_path)
+        for tarea, resultado in hechas:
+            tarea.futuro.set_result(resultado)
+
+
+def get_escritor(db_path=None):
+    db_path = db_path or base_actual()
+    escritor = _escritores.get(db_path)
+    if escritor is None:
+        with _escritores_lock:
+            escritor = _escritores.get(db_path)
+            if escritor is None:
+                escritor = _escritores[db_path] = Escritor(db_path)
+    return escritor
+
+
+def enviar_escritura(funcion, *args, tablas=(), db_path=None, **kwargs):
+    """
+    Encola `funcion(conn, *args, **kwargs)` en el escritor de `db_path` y devuelve un Future
+    con su resultado (o su excepción). `tablas` son las tablas que modifica (para la caché);
+    `tablas` y `db_path` van siempre por nombre, para no confundirlos con los argumentos de `funcion`.
+    Llamada desde el propio hilo escritor (una escritura dentro de otra) se ejecuta en el acto.
+    """
+    conn = getattr(_hilo_escritor, "conn", None)
+    if conn is not None:
+        futuro = Future()
+        try:
+            futuro.set_result(funcion(conn, *args, **kwargs))
+            _hilo_escritor.tablas.update(tablas)
+        except Exception as e:
+            futuro.set_exception(e)
+        return futuro
+    return get_escritor(db_path).enviar(funcion, args, kwargs, tablas)
+
+
+def escritura(*tablas):
+    """
+    Decorador para funciones que modifican `tablas`: func(conn, ...) se ejecuta en el hilo
+    escritor y quien la llama (sin conn) espera el resultado. `func.en_cola(...)` devuelve
+    el Future sin esperar.
+    """
+    def decorador(func):
+        @functools.wraps(func)
+        def envoltura(*args, **kwargs):
+            return enviar_escritura(func, *args, tablas=tablas, **kwargs).result()
+
+        envoltura.en_cola = lambda *args, **kwargs: enviar_escritura(func, *args, tablas=tablas, **kwargs)
+        return envoltura
+    return decorador
+
+
+def cerrar_escritores():
+    """Termina los hilos escritores tras confirmar lo que tengan en cola."""
+    with _escritores_lock:
+        escritores = list(_escritores.values())
+        _escritores.clear()
+    for escritor in escritores:
+        escritor.cerrar()
+
+
+# ==============================================================================
+# CACHÉ DE LECTURAS COMPARTIDA ENTRE SESIONES
+# ==============================================================================
+# Cada tabla tiene un número de versión que las escrituras incrementan. Un resultado
+# guardado solo se reutiliza si las versiones de las tablas que leyó no han cambiado,
+# así que las recargas de Streamlit no tocan SQLite ni pandas hasta que hay cambios.
+# La caché vive en este módulo (y no en app.py) porque Streamlit re-ejecuta app.py en
+# cada interacción y redefine sus funciones.
+#
+# Varios procesos pueden usar el mismo archivo (la app y api.py): cada escritura publica
+# también sus tablas en versiones_tablas, y antes de usar la caché se comprueba con
+# PRAGMA data_version (casi gratis) si alguna otra conexión hizo commit desde la última vez.
+_versiones = defaultdict(int)
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+_versiones_externas = {} # (db_path, tabla) -> última versión leída de versiones_tablas
+_vigilantes = {} # db_path -> [conexión propia, último data_version visto]
+_vigilantes_lock = threading.Lock()
+
+
+def _publicar_versiones(conn, tablas):
+    try:
+        conn.executemany("""
+            INSERT INTO versiones_tablas (tabla, version) VALUES (?, 1)
+            ON CONFLICT (tabla) DO UPDATE SET version = version + 1
+        """, [(t,) for t in tablas])
+    except sqlite3.OperationalError:
+        # Base aún sin migrar (sin versiones_tablas): solo queda la invalidación local
+        pass
+
+
+def _sincronizar_versiones(db_path):
+    """Invalida las tablas que otros procesos modificaron desde la última comprobación."""
+    with _vigilantes_lock:
+        vigilante = _vigilantes.get(db_path)
+        if vigilante is None:
+            conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+            vigilante = _vigilantes[db_path] = [conn, None]
+        conn = vigilante[0]
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == vigilante[1]:
+            return
+        vigilante[1] = data_version
+        try:
+            filas = conn.execute("SELECT tabla, version FROM versiones_tablas").fetchall()
+        except sqlite3.OperationalError:
+            return
+    cambiadas = [tabla for tabla, version in filas if _versiones_externas.get((db_path, tabla)) != version]
+    for tabla, version in filas:
+        _versiones_externas[(db_path, tabla)] = version
+    if cambiadas:
+        invalidar(*cambiadas, db_path=db_path)
+
+
+def version_tablas(tablas, db_path=None):
+    db_path = db_path or base_actual()
+    _sincronizar_versiones(db_path)
+    return tuple(_versiones[(db_path, t)] for t in tablas)
+
+
+def invalidar(*tablas, db_path=None):
+    """Marca como obsoletos los resultados en caché que dependen de `tablas`."""
+    db_path = db_path or base_actual()
+    with _cache_lock:
+        for t in tablas:
+            _versiones[(db_path, t)] += 1
+
+
+def limpiar_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def cache_lectura(*tablas):
+    """
+    Decorador para funciones de solo lectura que dependen de `tablas`.
+    El resultado se comparte entre sesiones: quien lo recibe no debe modificarlo.
+    """
+    def decorador(func):
+        nombre = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def envoltura(*args, **kwargs):
+            db_path = base_actual()
+            clave = (nombre, db_path, args, tuple(sorted(kwargs.items())))
+            # La versión se lee antes de consultar: si hay una escritura a mitad de la
+            # consulta, el resultado queda guardado con una versión ya obsoleta.
+            version = version_tablas(tablas, db_path)
+            with _cache_lock:
+                entrada = _cache.get(clave)
+                if entrada is not None and entrada[0] == version:
+                    _cache.move_to_end(clave)
+                    if TRAZADOR is not None:
+                        TRAZADOR.al_leer_cache(nombre)
+                    return entrada[1]
+            resultado = func(*args, **kwargs)
+            with _cache_lock:
+                _cache[clave] = (version, resultado)
+                _cache.move_to_end(clave)
+                while len(_cache) > MAX_ENTRADAS_CACHE:
+                    _cache.popitem(last=False)
+            return resultado
+
+        envoltura.sin_cache = func
+        return envoltura
+    return decorador
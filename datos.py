@@ -0,0 +1,693 @@
+from datetime import date, datetime, timedelta
+import math
+import re
+import time
+
+import pandas as pd
+
+from database import ESTADOS_PEDIDO, cache_lectura, conexion, consultar_pagina, escritura, invalidar, transaccion
+from inventario import ajustar_stock_a, insertar_movimientos
+from migraciones import migrar
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+# Capa de datos del ERP: inicialización de la base y funciones *_db.
+# No depende de Streamlit, así que la pueden importar la app, los scripts y los benchmarks.
+
+# ==============================================================================
+# 1. FUNCIONES DE INICIALIZACIÓN Y TABLAS
+# ==============================================================================
+def init_db():
+    """
+    Inicializa la base de datos: aplica las migraciones pendientes del esquema y carga los datos iniciales.
+    Devuelve el desglose de tiempos (en segundos) de cada etapa.
+    """
+    tiempos = {}
+    inicio = time.perf_counter()
+
+    # --- DEFINICIÓN DE TABLAS E ÍNDICES (migraciones versionadas, ver migraciones.py) ---
+    with conexion() as conn:
+        migrar(conn)
+    tiempos['migraciones'] = time.perf_counter() - inicio
+
+    marca = time.perf_counter()
+    with transaccion() as conn:
+        _poblar_datos_iniciales(conn)
+    tiempos['datos_iniciales'] = time.perf_counter() - marca
+
+    invalidar("clientes", "categorias", "productos", "pedidos", "movimientos_inventario")
+    tiempos['total'] = time.perf_counter() - inicio
+    return tiempos
+
+def _poblar_datos_iniciales(conn):
+    c = conn.cursor()
+
+    # --- INSERCIÓN DE DATOS INICIALES ---
+
+    # 1. POBLACIÓN INICIAL DE CATEGORÍAS (Alex Fruver)
+    categorias_iniciales = ["Fruta", "Verdura", "Otros"]
+    # OR IGNORE: si ya existe, no hace nada (todo va en el mismo commit que los productos)
+    c.executemany("INSERT OR IGNORE INTO categorias (nombre) VALUES (?)", [(cat_nombre,) for cat_nombre in categorias_iniciales])
+    
+    # 2. Obtener el mapa de IDs de categorías
+    c.execute("SELECT id, nombre FROM categorias")
+    categorias_map = {nombre: id for id, nombre in c.fetchall()}
+    
+    id_fruta = categorias_map.get("Fruta")
+    id_verdura = categorias_map.get("Verdura")
+
+    # 3. Datos de los 39 Productos (Precio Venta COP/Kg)
+    # Formato: (Nombre, id_cat, Precio_Venta_Final)
+    productos_data = [
+        # --- FRUTAS (15 productos) ---
+        ("Mango", id_fruta, 3374), 
+        ("Papaya", id_fruta, 1644), 
+        ("Piña", id_fruta, 1361),
+        ("Banano", id_fruta, 3708), 
+        ("Guayaba", id_fruta, 2180), 
+        ("Maracuyá", id_fruta, 2081),
+        ("Naranja", id_fruta, 2011), 
+        ("Limón", id_fruta, 1736), 
+        ("Mandarina", id_fruta, 3632),
+        ("Manzana", id_fruta, 1614), 
+        ("Pera", id_fruta, 3496), 
+        ("Durazno", id_fruta, 3705),
+        ("Aguacate", id_fruta, 3065), 
+        ("Tomate de Di", id_fruta, 1564), 
+        ("Mora", id_fruta, 3214),
+        
+        # --- VERDURAS/HORTALIZAS (24 productos) ---
+        ("Lechuga", id_verdura, 2862), 
+        ("Repollo", id_verdura, 1384), 
+        ("Espinaca", id_verdura, 1377),
+        ("Tomate", id_verdura, 1585), 
+        ("Pepino", id_verdura, 1995), 
+        ("Calabacín", id_verdura, 2041),
+        ("Pimentón", id_verdura, 2934), 
+        ("Zanahoria", id_verdura, 3251), 
+        ("Remolacha", id_verdura, 1366),
+        ("Rábano", id_verdura, 3118), 
+        ("Cebolla bl", id_verdura, 1931), 
+        ("Cebolla rc", id_verdura, 3625),
+        ("Ajo", id_verdura, 3408), 
+        ("Apio", id_verdura, 3577), 
+        ("Cilantro", id_verdura, 3065),
+        ("Cebollín", id_verdura, 2654), 
+        ("Ají", id_verdura, 2001), 
+        ("Jengibre", id_verdura, 2750),
+        ("Yuca", id_verdura, 3209), 
+        ("Ñame", id_verdura, 2190), 
+        ("Brócoli", id_verdura, 3921),
+        ("Papa", id_verdura, 1300), 
+        ("Plátano", id_verdura, 3766), 
+        ("Ahuyama", id_verdura, 3920) 
+    ]
+    
+    # 4. Insertar Productos solo si la tabla está vacía
+    c.execute("SELECT COUNT(*) FROM productos")
+    if c.fetchone()[0] == 0:
+        # OR IGNORE evita error si el nombre ya existía (aunque ya se chequeó si la tabla estaba vacía)
+        c.executemany("""
+            INSERT OR IGNORE INTO productos (nombre, descripcion, precio_unitario, costo_flete_unitario, stock, id_categoria, unidad_medida) 
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(nombre, 'Producto fresco', precio_venta, 0.0, 0, id_cat, 'Kg') for nombre, id_cat, precio_venta in productos_data])
+        # El stock inicial (100) entra por el libro de inventario, que actualiza productos.stock
+        c.execute("SELECT id FROM productos")
+        insertar_movimientos(conn, [(id_producto, 'inicial', 100, None, None) for id_producto, in c.fetchall()])
+
+
+# ==============================================================================
+# 2. FUNCIONES DE INTERACCIÓN CON LA BASE DE DATOS
+# ==============================================================================
+
+# --- Funciones para clientes (Se mantienen igual) ---
+@escritura("clientes")
+def add_cliente_db(conn, nombre, contacto, email, telefono, direccion):
+    c = conn.cursor()
+    c.execute("INSERT INTO clientes (nombre, contacto, email, telefono, direccion) VALUES (?, ?, ?, ?, ?)",
+              (nombre, contacto, email, telefono, direccion))
+    new_id = c.lastrowid
+    return new_id
+
+@cache_lectura("clientes")
+def get_clientes_db():
+    with conexion() as conn:
+        df = pd.read_sql_query("SELECT * FROM clientes", conn)
+    return df.to_dict(orient='records')
+
+def obtener_cliente_por_id_db(id_cliente):
+    with conexion() as conn:
+        c = conn.cursor()
+        c.execute("SELECT * FROM clientes WHERE id = ?", (id_cliente,))
+        cliente_data = c.fetchone()
+    if cliente_data:
+        columns = [description[0] for description in c.description]
+        return dict(zip(columns, cliente_data))
+    return None
+
+@escritura("clientes")
+def update_cliente_db(conn, id_cliente, nombre, contacto, email, telefono, direccion):
+    conn.execute("UPDATE clientes SET nombre = ?, contacto = ?, email = ?, telefono = ?, direccion = ? WHERE id = ?",
+                 (nombre, contacto, email, telefono, direccion, id_cliente))
+
+@escritura("clientes")
+def delete_cliente_db(conn, cliente_id):
+    conn.execute("DELETE FROM clientes WHERE id = ?", (cliente_id,))
+
+# --- Funciones para Categorías ---
+@cache_lectura("categorias")
+def get_categorias_db():
+    with conexion() as conn:
+        df = pd.read_sql_query("SELECT id, nombre FROM categorias", conn)
+    return df.to_dict(orient='records')
+
+# --- Funciones para Productos (MODIFICADAS) ---
+
+# Función modificada para incluir id_categoria y unidad_medida
+@escritura("productos", "movimientos_inventario")
+def add_producto_db(conn, nombre, descripcion, precio_unitario, stock, id_categoria, unidad_medida):
+    c = conn.cursor()
+
+    # 1. VERIFICACIÓN DE EXISTENCIA
+    c.execute("SELECT id FROM productos WHERE nombre = ?", (nombre,))
+    if c.fetchone():
+        # Devuelve None para indicar que el producto ya existe
+        return None
+
+    # 2. INSERCIÓN (si no existe). El stock inicial se registra como movimiento del libro de inventario
+    c.execute("INSERT INTO productos (nombre, descripcion, precio_unitario, stock, id_categoria, unidad_medida) VALUES (?, ?, ?, 0, ?, ?)",
+              (nombre, descripcion, precio_unitario, id_categoria, unidad_medida))
+    new_id = c.lastrowid
+    insertar_movimientos(conn, [(new_id, 'inicial', int(stock or 0), None, None)])
+    return new_id
+
+# Función modificada para incluir CATEGORIA y UNIDAD_MEDIDA (con JOIN)
+@cache_lectura("productos", "categorias")
+def get_productos_db():
+    # Unir productos con categorías para obtener el nombre de la categoría
+    query = """
+    SELECT 
+        p.id, 
+        p.nombre, 
+        c.nombre AS categoria, 
+        p.descripcion, 
+        p.precio_unitario, 
+        p.stock, 
+        p.unidad_medida,
+        p.id_categoria -- Mantener el ID para la edición
+    FROM productos p
+    LEFT JOIN categorias c ON p.id_categoria = c.id
+    """
+    with conexion() as conn:
+        df = pd.read_sql_query(query, conn)
+    return df.to_dict(orient='records')
+
+@cache_lectura("productos")
+def stock_productos_db(ids=None):
+    """Stock actual por producto (todos, o solo la tupla de `ids`) como lista de dicts."""
+    sql = "SELECT id, nombre, COALESCE(stock, 0) AS stock, unidad_medida, precio_unitario FROM productos"
+    params = ()
+    if ids:
+        params = tuple(ids)
+        sql += f" WHERE id IN ({', '.join('?' * len(params))})"
+    with conexion() as conn:
+        c = conn.execute(sql + " ORDER BY id", params)
+        columnas = [d[0] for d in c.description]
+        return [dict(zip(columnas, fila)) for fila in c.fetchall()]
+
+@cache_lectura("productos")
+def catalogo_productos_db():
+    """
+    Catálogo completo indexado por id: {id: {'nombre', 'precio_unitario', 'unidad_medida', 'stock'}}.
+    Una consulta por versión de la tabla productos; el resultado es compartido, no modificarlo.
+    """
+    return {p['id']: p for p in stock_productos_db()}
+
+def obtener_producto_por_id_db(id_producto):
+    with conexion() as conn:
+        c = conn.cursor()
+        # Modificado para traer la categoria y unidad
+        c.execute("""
+            SELECT p.*, c.nombre AS nombre_categoria 
+            FROM productos p 
+            LEFT JOIN categorias c ON p.id_categoria = c.id
+            WHERE p.id = ?
+        """, (id_producto,))
+        producto_data = c.fetchone()
+    if producto_data:
+        # Nota: La descripción del cursor contendrá las columnas de ambas tablas
+        columns = [description[0] for description in c.description] 
+        return dict(zip(columns, producto_data))
+    return None
+
+# Función modificada para incluir id_categoria y unidad_medida
+@escritura("productos", "movimientos_inventario")
+def update_producto_db(conn, id_producto, nombre, descripcion, precio_unitario, stock, id_categoria, unidad_medida):
+    """
+    Actualiza la información completa de un producto por su ID.
+    
+    CORRECCIÓN: Se asegura que el SQL y el tuple de valores tengan 7 elementos, 
+    incluyendo costo_flete_unitario con valor 0.0, para asegurar la consistencia con la tabla de productos.
+    Si el stock cambia, la diferencia se registra como ajuste en el libro de inventario.
+    """
+    # 7 marcadores de posición (?) en el SQL (6 en SET + 1 en WHERE)
+    conn.execute("""
+        UPDATE productos 
+        SET 
+            nombre = ?, 
+            descripcion = ?, 
+            precio_unitario = ?, 
+            costo_flete_unitario = ?,  
+            id_categoria = ?, 
+            unidad_medida = ? 
+        WHERE id = ?
+    """,
+    # 7 variables en el tuple, con costo_flete_unitario fijado a 0.0:
+    (
+        nombre, 
+        descripcion, 
+        precio_unitario, 
+        0.0, # <--- Valor fijo para costo_flete_unitario
+        id_categoria, 
+        unidad_medida, 
+        id_producto
+    ))
+    ajustar_stock_a(conn, id_producto, stock, "Edición del producto")
+
+# Fijar el stock de un producto (queda un movimiento de ajuste por la diferencia)
+@escritura("productos", "movimientos_inventario")
+def update_producto_stock_db(conn, id_producto, nueva_cantidad_stock, nota=None):
+    ajustar_stock_a(conn, id_producto, nueva_cantidad_stock, nota)
+
+@escritura("productos")
+def delete_producto_db(conn, producto_id):
+    conn.execute("DELETE FROM productos WHERE id = ?", (producto_id,))
+
+# --- Funciones para Pedidos y Stock (Se mantienen/modificadas ligeramente) ---
+def _insertar_pedido(c, id_cliente, nombre_cliente, fecha_creacion, fecha_entrega_estimada, estado, total, items):
+    # Insertar Pedido
+    c.execute("INSERT INTO pedidos (id_cliente, nombre_cliente, fecha_creacion, fecha_entrega_estimada, estado, total) VALUES (?, ?, ?, ?, ?, ?)",
+              (id_cliente, nombre_cliente, fecha_creacion, fecha_entrega_estimada, estado, total))
+    new_pedido_id = c.lastrowid
+    # Insertar Ítems del Pedido (una sola llamada para todos)
+    c.executemany("INSERT INTO items_pedido (id_pedido, id_producto, nombre_producto, cantidad, precio_unitario, subtotal) VALUES (?, ?, ?, ?, ?, ?)",
+                  [(new_pedido_id, item['id_producto'], item['nombre_producto'], item['cantidad'], item['precio_unitario'], item['subtotal']) for item in items])
+    return new_pedido_id
+
+@escritura("pedidos")
+def add_pedido_db(conn, id_cliente, nombre_cliente, fecha_creacion, fecha_entrega_estimada, estado, total, items):
+    new_pedido_id = _insertar_pedido(conn.cursor(), id_cliente, nombre_cliente, fecha_creacion,
+                                     fecha_entrega_estimada, estado, total, items)
+    return new_pedido_id
+
+@escritura("pedidos")
+def crear_pedido_db(conn, id_cliente, items, fecha_entrega_estimada=None, estado="Pendiente", fecha_creacion=None):
+    """
+    Crea un pedido a partir de ids: `items` es una lista de {'id_producto', 'cantidad'} con
+    'precio_unitario' opcional (número finito >= 0; por defecto el del catálogo). Pensada para
+    clientes externos (api.py), que no conocen nombres ni precios.
+
+    Cliente y productos se resuelven en la misma transacción que inserta el pedido
+    (dos consultas, sin importar el número de ítems). Lanza ValueError si algo no es válido.
+    Devuelve un dict con id_pedido, total e items.
+    """
+    if estado not in ESTADOS_PEDIDO:
+        raise ValueError(f"Estado inválido: '{estado}'")
+    if not items:
+        raise ValueError("El pedido no tiene ítems")
+    for item in items:
+        cantidad = item.get('cantidad')
+        if isinstance(cantidad, bool) or not isinstance(cantidad, int) or cantidad <= 0:
+            raise ValueError(f"Cantidad inválida para el producto {item.get('id_producto')}: {cantidad!r}")
+        if 'precio_unitario' in item:
+            precio = item['precio_unitario']
+            # NaN/inf llegarían a la base como NULL (IntegrityError) y un negativo daría totales negativos
+            if (isinstance(precio, bool) or not isinstance(precio, (int, float))
+                    or not math.isfinite(precio) or precio < 0):
+                raise ValueError(f"Precio inválido para el producto {item.get('id_producto')}: {precio!r}")
+    fecha_creacion = fecha_creacion or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    c = conn.cursor()
+    c.execute("SELECT nombre FROM clientes WHERE id = ?", (id_cliente,))
+    fila = c.fetchone()
+    if fila is None:
+        raise ValueError(f"Cliente {id_cliente} no encontrado")
+    nombre_cliente = fila[0]
+
+    ids = sorted({item['id_producto'] for item in items})
+    c.execute(f"SELECT id, nombre, precio_unitario FROM productos WHERE id IN ({', '.join('?' * len(ids))})", ids)
+    catalogo = {id_prod: (nombre, precio) for id_prod, nombre, precio in c.fetchall()}
+    faltantes = [id_prod for id_prod in ids if id_prod not in catalogo]
+    if faltantes:
+        raise ValueError(f"Productos no encontrados: {', '.join(map(str, faltantes))}")
+
+    items_pedido = []
+    for item in items:
+        nombre, precio = catalogo[item['id_producto']]
+        precio = float(item.get('precio_unitario', precio))
+        items_pedido.append({'id_producto': item['id_producto'], 'nombre_producto': nombre, 'cantidad': item['cantidad'],
+                             'precio_unitario': precio, 'subtotal': precio * item['cantidad']})
+    total = sum(item['subtotal'] for item in items_pedido)
+    id_pedido = _insertar_pedido(c, id_cliente, nombre_cliente, fecha_creacion, fecha_entrega_estimada,
+                                 estado, total, items_pedido)
+    return {'id_pedido': id_pedido, 'total': total, 'items': items_pedido}
+
+# Máximo de ids por consulta IN (...) al cargar los ítems por lotes
+TAMANO_LOTE_IN = 500
+
+def _a_fecha(valor):
+    """Acepta date/datetime o texto 'YYYY-MM-DD' y devuelve un date."""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, str):
+        return date.fromisoformat(valor[:10])
+    return valor
+
+def _cargar_items_pedidos(c, pedidos_list, todos=False):
+    """Adjunta a cada pedido su lista de ítems con una sola consulta (o una por lote de ids)."""
+    items_por_pedido = {p['id']: [] for p in pedidos_list}
+    for p in pedidos_list:
+        p['items'] = items_por_pedido[p['id']]
+    if not items_por_pedido:
+        return pedidos_list
+
+    if todos:
+        # Se cargan todos los pedidos: un único recorrido de items_pedido basta
+        consultas = [("SELECT * FROM items_pedido ORDER BY id", ())]
+    else:
+        ids = list(items_por_pedido)
+        consultas = []
+        for i in range(0, len(ids), TAMANO_LOTE_IN):
+            lote = ids[i:i + TAMANO_LOTE_IN]
+            marcadores = ", ".join("?" * len(lote))
+            consultas.append((f"SELECT * FROM items_pedido WHERE id_pedido IN ({marcadores}) ORDER BY id", lote))
+
+    for sql, params in consultas:
+        c.execute(sql, params)
+        columns_items = [description[0] for description in c.description]
+        for fila in c:
+            item = dict(zip(columns_items, fila))
+            items = items_por_pedido.get(item['id_pedido'])
+            if items is not None:
+                items.append(item)
+    return pedidos_list
+
+def buscar_pedidos_db(estado=None, fecha_desde=None, fecha_hasta=None, id_cliente=None,
+                      limite=None, cursor=None, descendente=True, con_items=True):
+    """
+    Consulta pedidos con filtros opcionales y paginación por cursor.
+
+    - estado: un estado o una lista de estados.
+    - fecha_desde / fecha_hasta: rango (inclusive) sobre la fecha de creación.
+    - limite / cursor: tamaño de página y id del último pedido de la página anterior.
+      Para pedir la página siguiente se pasa como cursor el 'id' del último pedido recibido.
+    Los ítems se cargan en bloque (sin una consulta por pedido).
+    """
+    condiciones = []
+    params = []
+    if estado:
+        estados = [estado] if isinstance(estado, str) else list(estado)
+        condiciones.append(f"estado IN ({', '.join('?' * len(estados))})")
+        params.extend(estados)
+    if fecha_desde:
+        condiciones.append("fecha_creacion >= ?")
+        params.append(_a_fecha(fecha_desde).isoformat())
+    if fecha_hasta:
+        # fecha_creacion incluye la hora: se compara contra el inicio del día siguiente
+        condiciones.append("fecha_creacion < ?")
+        params.append((_a_fecha(fecha_hasta) + timedelta(days=1)).isoformat())
+    if id_cliente is not None:
+        condiciones.append("id_cliente = ?")
+        params.append(id_cliente)
+    if cursor is not None:
+        condiciones.append("id < ?" if descendente else "id > ?")
+        params.append(cursor)
+
+    sql = "SELECT * FROM pedidos"
+    if condiciones:
+        sql += " WHERE " + " AND ".join(condiciones)
+    sql += " ORDER BY id DESC" if descendente else " ORDER BY id"
+    if limite:
+        sql += " LIMIT ?"
+        params.append(int(limite))
+
+    with conexion() as conn:
+        c = conn.cursor()
+        c.execute(sql, params)
+        columns_pedidos = [description[0] for description in c.description]
+        pedidos_list = [dict(zip(columns_pedidos, p_data)) for p_data in c.fetchall()]
+        if con_items:
+            _cargar_items_pedidos(c, pedidos_list, todos=not condiciones and not limite)
+    return pedidos_list
+
+def get_pedidos_db():
+    # Todos los pedidos con sus ítems, en orden de creación (2 consultas en total)
+    return buscar_pedidos_db(descendente=False)
+
+# Función para actualizar estado de pedido y manejar el stock
+@escritura("pedidos", "productos", "movimientos_inventario")
+def update_pedido_estado_db(conn, pedido_id, nuevo_estado):
+    """
+    Cambia el estado de un pedido y, si pasa a 'Completado', descuenta el stock de todos sus ítems.
+
+    Corre en el escritor único (database.escritura), en su propio SAVEPOINT dentro del commit
+    en grupo, con un número fijo de consultas (sin importar cuántos ítems tenga el pedido). Las
+    escrituras van en serie, así que dos sesiones completando pedidos a la vez no pierden
+    descuentos; si algo falla, solo se deshace este cambio de estado. El stock nunca queda
+    negativo: se fija en 0 y se informa; el libro registra la venta completa y, aparte, un
+    movimiento 'faltante' por las unidades que no había.
+
+    Devuelve None si el pedido no existe; si no, un dict con:
+    - estado_anterior, estado_nuevo
+    - stock_descontado: True si se descontó stock en esta llamada
+    - movimientos: una entrada por producto con cantidad_vendida, stock_anterior,
+      stock_nuevo y faltante (unidades que no había en stock)
+    """
+    # Puede descontar stock, por eso también invalida productos y el libro de inventario
+    c = conn.cursor()
+
+    # Primero, obtener el estado actual del pedido para evitar doble descuento
+    c.execute("SELECT estado FROM pedidos WHERE id = ?", (pedido_id,))
+    fila = c.fetchone()
+    if fila is None:
+        return None
+    estado_anterior = fila[0]
+
+    c.execute("UPDATE pedidos SET estado = ? WHERE id = ?", (nuevo_estado, pedido_id))
+
+    resultado = {
+        'id_pedido': pedido_id,
+        'estado_anterior': estado_anterior,
+        'estado_nuevo': nuevo_estado,
+        'stock_descontado': False,
+        'movimientos': [],
+    }
+
+    # Lógica de descuento de stock si pasa a 'Completado'
+    if nuevo_estado == "Completado" and estado_anterior != "Completado":
+        # Cantidades vendidas agregadas por producto (un producto puede repetirse en el pedido)
+        c.execute("""
+            SELECT p.id, p.nombre, COALESCE(p.stock, 0), v.cantidad
+            FROM (
+                SELECT id_producto, SUM(cantidad) AS cantidad
+                FROM items_pedido
+                WHERE id_pedido = ?
+                GROUP BY id_producto
+            ) v
+            JOIN productos p ON p.id = v.id_producto
+        """, (pedido_id,))
+        for id_producto, nombre, stock_actual, cantidad_vendida in c.fetchall():
+            resultado['movimientos'].append({
+                'id_producto': id_producto,
+                'nombre': nombre,
+                'cantidad_vendida': cantidad_vendida,
+                'stock_anterior': stock_actual,
+                'stock_nuevo': max(stock_actual - cantidad_vendida, 0),
+                'faltante': max(cantidad_vendida - stock_actual, 0),
+            })
+
+        # Por producto, la venta completa y, si no alcanzó el stock, un 'faltante' que devuelve el
+        # saldo a 0; el trigger del libro aplica ambos a productos.stock
+        movimientos = []
+        for m in resultado['movimientos']:
+            movimientos.append((m['id_producto'], 'venta', -m['cantidad_vendida'], pedido_id, None))
+            if m['faltante']:
+                movimientos.append((m['id_producto'], 'faltante', m['faltante'], pedido_id, f"Faltaron {m['faltante']}"))
+        insertar_movimientos(conn, movimientos)
+        resultado['stock_descontado'] = True
+
+    return resultado
+
+# --- Búsqueda para selectores (FTS5, ver migración 6) ---
+# Cuántas sugerencias devuelve cada búsqueda y longitud mínima del texto para buscar
+LIMITE_SUGERENCIAS = 20
+MIN_CARACTERES_BUSQUEDA = 2
+
+def _consulta_fts(texto):
+    """
+    Convierte lo que escribe el usuario en una consulta FTS5: cada palabra como prefijo y
+    todas obligatorias ('mar gom' -> "mar"* "gom"*). Devuelve None si no hay qué buscar.
+    """
+    palabras = re.findall(r"\w+", texto or "")
+    if not palabras or len("".join(palabras)) < MIN_CARACTERES_BUSQUEDA:
+        return None
+    return " ".join(f'"{palabra}"*' for palabra in palabras)
+
+@cache_lectura("clientes")
+def sugerir_clientes_db(texto="", limite=LIMITE_SUGERENCIAS):
+    """
+    Clientes que coinciden con `texto` (nombre, contacto, teléfono o email), los más recientes
+    primero. Se ordena por rowid y no por relevancia (bm25): así FTS5 se detiene en las
+    primeras `limite` coincidencias aunque la palabra aparezca en toda la tabla.
+    """
+    consulta = _consulta_fts(texto)
+    with conexion() as conn:
+        if consulta is None:
+            c = conn.execute("SELECT id, nombre, contacto, telefono FROM clientes ORDER BY id DESC LIMIT ?", (limite,))
+        else:
+            c = conn.execute("""
+                SELECT c.id, c.nombre, c.contacto, c.telefono
+                FROM clientes_fts f
+                JOIN clientes c ON c.id = f.rowid
+                WHERE clientes_fts MATCH ?
+                ORDER BY f.rowid DESC
+                LIMIT ?
+            """, (consulta, limite))
+        columnas = [d[0] for d in c.description]
+        return [dict(zip(columnas, fila)) for fila in c.fetchall()]
+
+@cache_lectura("productos", "categorias")
+def sugerir_productos_db(texto="", limite=LIMITE_SUGERENCIAS):
+    """Productos que coinciden con `texto` (nombre o descripción), los más recientes primero. Sin texto, por nombre."""
+    consulta = _consulta_fts(texto)
+    columnas_sql = "p.id, p.nombre, c.nombre AS categoria, p.unidad_medida, p.precio_unitario, COALESCE(p.stock, 0) AS stock"
+    with conexion() as conn:
+        if consulta is None:
+            cur = conn.execute(f"""
+                SELECT {columnas_sql}
+                FROM productos p LEFT JOIN categorias c ON c.id = p.id_categoria
+                ORDER BY p.nombre
+                LIMIT ?
+            """, (limite,))
+        else:
+            cur = conn.execute(f"""
+                SELECT {columnas_sql}
+                FROM productos_fts f
+                JOIN productos p ON p.id = f.rowid
+                LEFT JOIN categorias c ON c.id = p.id_categoria
+                WHERE productos_fts MATCH ?
+                ORDER BY f.rowid DESC
+                LIMIT ?
+            """, (consulta, limite))
+        columnas = [d[0] for d in cur.description]
+        return [dict(zip(columnas, fila)) for fila in cur.fetchall()]
+
+@cache_lectura("pedidos", "clientes")
+def sugerir_pedidos_db(texto="", limite=LIMITE_SUGERENCIAS):
+    """
+    Pedidos para el selector: por número de pedido si el texto es un número, o por cliente
+    (misma búsqueda FTS5 que sugerir_clientes_db). Sin texto, los más recientes.
+    """
+    texto = (texto or "").strip().lstrip("#")
+    columnas_sql = "p.id, p.nombre_cliente, p.estado, p.fecha_creacion, p.total"
+    with conexion() as conn:
+        filas = []
+        if texto.isdigit():
+            filas = conn.execute(f"SELECT {columnas_sql} FROM pedidos p WHERE p.id = ?", (int(texto),)).fetchall()
+        consulta = _consulta_fts(texto)
+        if consulta is None and not filas:
+            filas = conn.execute(f"SELECT {columnas_sql} FROM pedidos p ORDER BY p.id DESC LIMIT ?", (limite,)).fetchall()
+        elif consulta is not None:
+            # Los pedidos más recientes de los clientes que coinciden (idx_pedidos_cliente)
+            filas += conn.execute(f"""
+                SELECT {columnas_sql}
+                FROM pedidos p
+                WHERE p.id_cliente IN (SELECT rowid FROM clientes_fts WHERE clientes_fts MATCH ?)
+                ORDER BY p.id DESC
+                LIMIT ?
+            """, (consulta, limite)).fetchall()
+    columnas = ["id", "nombre_cliente", "estado", "fecha_creacion", "total"]
+    pedidos = {fila[0]: dict(zip(columnas, fila)) for fila in filas} # sin repetir el buscado por número
+    return list(pedidos.values())[:limite]
+
+# --- Listados paginados (orden, filtros y paginación resueltos en SQL) ---
+# Opciones de orden: etiqueta visible -> expresión SQL (las columnas con índice son las más rápidas)
+ORDEN_CLIENTES = {"ID": "c.id", "Nombre": "c.nombre"}
+ORDEN_PRODUCTOS = {"ID": "p.id", "Nombre": "p.nombre", "Precio": "p.precio_unitario", "Stock": "COALESCE(p.stock, 0)"}
+ORDEN_PEDIDOS = {"ID": "p.id", "Fecha Creación": "p.fecha_creacion", "Fecha Entrega": "COALESCE(p.fecha_entrega_estimada, '')", "Total": "p.total"}
+
+def _filtro_texto(texto, columnas):
+    """Condición LIKE '%texto%' sobre varias columnas (OR) y sus parámetros."""
+    patron = f"%{texto.strip()}%"
+    return "(" + " OR ".join(f"{col} LIKE ?" for col in columnas) + ")", [patron] * len(columnas)
+
+def listar_clientes_db(texto="", orden="ID", descendente=False, limite=50, cursor=None):
+    """Una página del listado de clientes. Devuelve (DataFrame, siguiente_cursor)."""
+    condiciones, params = [], []
+    if texto and texto.strip():
+        condicion, params = _filtro_texto(texto, ["c.nombre", "c.contacto", "c.email", "c.telefono"])
+        condiciones.append(condicion)
+    with conexion() as conn:
+        columnas, filas, siguiente = consultar_pagina(
+            conn, "c.id, c.nombre, c.contacto, c.email, c.telefono, c.direccion", "clientes c",
+            ORDEN_CLIENTES[orden], "c.id", condiciones, params, descendente, limite, cursor)
+    return pd.DataFrame.from_records(filas, columns=columnas), siguiente
+
+def listar_productos_db(texto="", orden="ID", descendente=False, limite=50, cursor=None):
+    """Una página del inventario de productos (con nombre de categoría). Devuelve (DataFrame, siguiente_cursor)."""
+    condiciones, params = [], []
+    if texto and texto.strip():
+        condicion, params = _filtro_texto(texto, ["p.nombre", "p.descripcion", "c.nombre"])
+        condiciones.append(condicion)
+    with conexion() as conn:
+        columnas, filas, siguiente = consultar_pagina(
+            conn,
+            "p.id, p.nombre, c.nombre AS categoria, p.unidad_medida, p.precio_unitario, p.stock, p.descripcion",
+            "productos p LEFT JOIN categorias c ON p.id_categoria = c.id",
+            ORDEN_PRODUCTOS[orden], "p.id", condiciones, params, descendente, limite, cursor)
+    return pd.DataFrame.from_records(filas, columns=columnas), siguiente
+
+def listar_pedidos_db(texto="", orden="ID", descendente=True, limite=50, cursor=None,
+                      estado=None, fecha_desde=None, fecha_hasta=None):
+    """
+    Una página del listado de pedidos, con la columna 'Ítems' armada solo para los pedidos
+    de la página. Devuelve (DataFrame, siguiente_cursor).
+    """
+    condiciones, params = [], []
+    if texto and texto.strip():
+        condicion, params = _filtro_texto(texto, ["p.nombre_cliente"])
+        if texto.strip().isdigit():
+            condicion = f"({condicion} OR p.id = ?)"
+            params.append(int(texto.strip()))
+        condiciones.append(condicion)
+    if estado:
+        condiciones.append(f"p.estado IN ({', '.join('?' * len(estado))})")
+        params.extend(estado)
+    if fecha_desde:
+        condiciones.append("p.fecha_creacion >= ?")
+        params.append(_a_fecha(fecha_desde).isoformat())
+    if fecha_hasta:
+        condiciones.append("p.fecha_creacion < ?")
+        params.append((_a_fecha(fecha_hasta) + timedelta(days=1)).isoformat())
+
+    with conexion() as conn:
+        columnas, filas, siguiente = consultar_pagina(
+            conn,
+            'p.id AS "ID Pedido", p.nombre_cliente AS "Cliente", p.fecha_creacion AS "Fecha Creación", '
+            'p.fecha_entrega_estimada AS "Fecha Entrega Est.", p.estado AS "Estado", p.total AS "Total"',
+            "pedidos p", ORDEN_PEDIDOS[orden], "p.id", condiciones, params, descendente, limite, cursor)
+        df = pd.DataFrame.from_records(filas, columns=columnas)
+        items_txt = {}
+        if filas:
+            ids = [fila[0] for fila in filas]
+            c = conn.execute(f"""
+                SELECT id_pedido, GROUP_CONCAT(nombre_producto || ' (x' || cantidad || ')', ', ')
+                FROM items_pedido
+                WHERE id_pedido IN ({', '.join('?' * len(ids))})
+                GROUP BY id_pedido
+            """, ids)
+            items_txt = dict(c.fetchall())
+
+    if not df.empty:
+        df['Total'] = df['Total'].map(lambda total: f"${(total or 0):,.2f}")
+        df['Ítems'] = df['ID Pedido'].map(lambda id_pedido: items_txt.get(id_pedido, ""))
+    return df, siguiente
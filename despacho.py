@@ -0,0 +1,110 @@
+import html
+from datetime import date, timedelta
+
+import pandas as pd
+
+from database import cache_lectura, conexion
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+# Lista de despacho (picking) de un día de entrega: cuánto sacar de cada producto para todos
+# los pedidos Pendientes/En Proceso de ese día, y qué lleva cada cliente, agrupado por
+# dirección para armar la ruta.
+#
+# Todo sale de una sola consulta agregada por (dirección, cliente, producto): los pedidos del
+# día se encuentran con el índice (fecha_entrega_estimada, estado) de la migración 10 y sus
+# ítems con idx_items_pedido_pedido. Los totales por producto se suman sobre ese resultado,
+# que es pequeño (clientes x productos del día), sin volver a la base.
+
+ESTADOS_DESPACHO = ("Pendiente", "En Proceso")
+SIN_DIRECCION = "Sin dirección"
+
+COLUMNAS_DETALLE = ["Dirección", "Cliente", "id_producto", "Producto", "Unidad", "Cantidad", "Pedidos"]
+
+
+@cache_lectura("pedidos", "clientes", "productos")
+def detalle_despacho_db(fecha_entrega, estados=ESTADOS_DESPACHO):
+    """
+    Cantidades a despachar en `fecha_entrega` por dirección, cliente y producto (DataFrame en
+    orden de ruta: dirección, cliente, producto). Pedidos = pedidos del cliente con ese producto.
+    """
+    desde = str(fecha_entrega)[:10]
+    hasta = (date.fromisoformat(desde) + timedelta(days=1)).isoformat()
+    estados = tuple(estados)
+    # Rango [día, día siguiente): usa el índice aunque la fecha se haya guardado con hora
+    with conexion() as conn:
+        c = conn.execute(f"""
+            SELECT COALESCE(NULLIF(TRIM(cl.direccion), ''), ?) AS direccion,
+                   pe.nombre_cliente,
+                   i.id_producto,
+                   COALESCE(pr.nombre, MAX(i.nombre_producto)) AS producto,
+                   COALESCE(pr.unidad_medida, ''),
+                   SUM(i.cantidad),
+                   COUNT(DISTINCT pe.id)
+            FROM pedidos pe
+            JOIN items_pedido i ON i.id_pedido = pe.id
+            LEFT JOIN clientes cl ON cl.id = pe.id_cliente
+            LEFT JOIN productos pr ON pr.id = i.id_producto
+            WHERE pe.fecha_entrega_estimada >= ? AND pe.fecha_entrega_estimada < ?
+              AND pe.estado IN ({', '.join('?' * len(estados))})
+            GROUP BY direccion, pe.id_cliente, i.id_producto
+            ORDER BY direccion, pe.nombre_cliente, producto
+        """, (SIN_DIRECCION, desde, hasta) + estados)
+        filas = c.fetchall()
+    return pd.DataFrame.from_records(filas, columns=COLUMNAS_DETALLE)
+
+
+def totales_por_producto(detalle):
+    """Total a sacar de bodega por producto y unidad, a partir del detalle del día."""
+    if detalle.empty:
+        return pd.DataFrame(columns=["Producto", "Unidad", "Cantidad", "Pedidos", "Clientes"])
+    return (detalle.groupby(["id_producto", "Producto", "Unidad"], as_index=False)
+                   .agg(Cantidad=("Cantidad", "sum"), Pedidos=("Pedidos", "sum"), Clientes=("Cliente", "nunique"))
+                   .sort_values("Producto")
+                   .drop(columns=["id_producto"])
+                   .reset_index(drop=True))
+
+
+def lista_despacho(fecha_entrega, estados=ESTADOS_DESPACHO):
+    """{'productos': totales por producto, 'clientes': detalle por dirección y cliente} del día."""
+    detalle = detalle_despacho_db(str(fecha_entrega)[:10], tuple(estados))
+    return {'productos': totales_por_producto(detalle), 'clientes': detalle.drop(columns=["id_producto"])}
+
+
+def lista_despacho_csv(lista):
+    """CSV con las dos secciones (totales por producto y detalle por cliente), listo para descargar."""
+    return ("TOTALES POR PRODUCTO\n" + lista['productos'].to_csv(index=False) +
+            "\nDETALLE POR CLIENTE\n" + lista['clientes'].to_csv(index=False)).encode("utf-8")
+
+
+def _tabla_html(df):
+    encabezado = "".join(f"<th>{html.escape(str(col))}</th>" for col in df.columns)
+    filas = "".join("<tr>" + "".join(f"<td>{html.escape(str(valor))}</td>" for valor in fila) + "<td class='check'></td></tr>"
+                    for fila in df.itertuples(index=False))
+    return f"<table><thead><tr>{encabezado}<th>✓</th></tr></thead><tbody>{filas}</tbody></table>"
+
+
+def hoja_despacho_html(fecha_entrega, lista):
+    """Hoja imprimible (HTML): totales para bodega y una sección por dirección con sus clientes."""
+    fecha = html.escape(str(fecha_entrega)[:10])
+    secciones = []
+    for direccion, grupo in lista['clientes'].groupby("Dirección", sort=False):
+        secciones.append(f"<h3>{html.escape(direccion)}</h3>")
+        for cliente, items in grupo.groupby("Cliente", sort=False):
+            secciones.append(f"<h4>{html.escape(cliente)}</h4>" + _tabla_html(items[["Producto", "Unidad", "Cantidad"]]))
+    return f"""<!DOCTYPE html>
+<html lang="es"><head><meta charset="utf-8"><title>Despacho {fecha}</title>
+<style>
+body {{ font-family: sans-serif; font-size: 12px; }}
+table {{ border-collapse: collapse; width: 100%; margin-bottom: 8px; }}
+th, td {{ border: 1px solid #999; padding: 3px 6px; text-align: left; }}
+td.check {{ width: 24px; }}
+h3 {{ margin: 16px 0 4px; border-bottom: 2px solid #333; }}
+h4 {{ margin: 8px 0 4px; }}
+@media print {{ h3 {{ page-break-after: avoid; }} table {{ page-break-inside: avoid; }} }}
+</style></head><body>
+<h1>Alex Fruver S.A.S. · Despacho del {fecha}</h1>
+<h2>Totales por producto</h2>
+{_tabla_html(lista['productos'])}
+<h2>Detalle por dirección y cliente</h2>
+{''.join(secciones)}
+</body></html>""".encode("utf-8")
@@ -0,0 +1,250 @@
+import argparse
+import csv
+import io
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import database
+from database import ESTADOS_PEDIDO, conexion
+from trabajos import directorio_resultados, tipo_trabajo
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+# Exportación de pedidos (con sus ítems), clientes e inventario a CSV, Parquet o Excel.
+#
+# Las filas se leen de SQLite por lotes (fetchmany) y se escriben lote a lote, sin armar
+# nunca la tabla completa en memoria: exportar millones de ítems usa memoria acotada
+# (unos TAMANO_LOTE registros a la vez). Nada de esto pasa por pandas.
+#
+#   python exportacion.py pedidos --formato parquet --salida pedidos_2025.parquet --desde 2025-01-01
+#   python exportacion.py productos --formato xlsx --salida inventario.xlsx
+
+TAMANO_LOTE = 5000
+FORMATOS = {'csv': "CSV", 'parquet': "Parquet", 'xlsx': "Excel"}
+
+# Columnas de cada conjunto: (nombre en el archivo, expresión SQL, tipo: 'int' | 'float' | 'str')
+# pedidos = una fila por ítem, con los datos del pedido repetidos (los pedidos sin ítems salen una vez)
+CONJUNTOS = {
+    'pedidos': {
+        'descripcion': "Pedidos con sus ítems",
+        'desde': "pedidos p LEFT JOIN items_pedido i ON i.id_pedido = p.id",
+        'columnas': [
+            ("id_pedido", "p.id", 'int'),
+            ("fecha_creacion", "p.fecha_creacion", 'str'),
+            ("fecha_entrega_estimada", "p.fecha_entrega_estimada", 'str'),
+            ("estado", "p.estado", 'str'),
+            ("id_cliente", "p.id_cliente", 'int'),
+            ("cliente", "p.nombre_cliente", 'str'),
+            ("total_pedido", "p.total", 'float'),
+            ("id_item", "i.id", 'int'),
+            ("id_producto", "i.id_producto", 'int'),
+            ("producto", "i.nombre_producto", 'str'),
+            ("cantidad", "i.cantidad", 'int'),
+            ("precio_unitario", "i.precio_unitario", 'float'),
+            ("subtotal", "i.subtotal", 'float'),
+        ],
+    },
+    'clientes': {
+        'descripcion': "Clientes",
+        'desde': "clientes c",
+        'columnas': [
+            ("id", "c.id", 'int'),
+            ("nombre", "c.nombre", 'str'),
+            ("contacto", "c.contacto", 'str'),
+            ("email", "c.email", 'str'),
+            ("telefono", "c.telefono", 'str'),
+            ("direccion", "c.direccion", 'str'),
+        ],
+        'orden': "c.id",
+    },
+    'productos': {
+        'descripcion': "Inventario de productos",
+        'desde': "productos p LEFT JOIN categorias c ON c.id = p.id_categoria",
+        'columnas': [
+            ("id", "p.id", 'int'),
+            ("nombre", "p.nombre", 'str'),
+            ("categoria", "c.nombre", 'str'),
+            ("descripcion", "p.descripcion", 'str'),
+            ("unidad_medida", "p.unidad_medida", 'str'),
+            ("precio_unitario", "p.precio_unitario", 'float'),
+            ("stock", "COALESCE(p.stock, 0)", 'int'),
+        ],
+        'orden': "p.id",
+    },
+}
+
+
+def _consulta(conjunto, estados=None, fecha_desde=None, fecha_hasta=None):
+    """SQL y parámetros del conjunto con los filtros (los filtros solo aplican a pedidos)."""
+    definicion = CONJUNTOS[conjunto]
+    condiciones, params = [], []
+    orden = definicion.get('orden')
+    if conjunto == 'pedidos':
+        if estados:
+            condiciones.append(f"p.estado IN ({', '.join('?' * len(estados))})")
+            params.extend(estados)
+        if fecha_desde:
+            condiciones.append("p.fecha_creacion >= ?")
+            params.append(str(fecha_desde)[:10])
+        if fecha_hasta:
+            # fecha_creacion incluye la hora: se compara contra el inicio del día siguiente
+            condiciones.append("p.fecha_creacion < ?")
+            params.append((datetime.strptime(str(fecha_hasta)[:10], "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d"))
+        # Con rango de fechas se recorre idx_pedidos_fecha_creacion (que ya da ese orden);
+        # sin él, la tabla en orden de id. Así SQLite nunca ordena en memoria.
+        orden = "p.fecha_creacion, p.id" if fecha_desde or fecha_hasta else "p.id"
+    where = " WHERE " + " AND ".join(condiciones) if condiciones else ""
+    return where, params, orden
+
+
+def iterar_lotes(conjunto, estados=None, fecha_desde=None, fecha_hasta=None, tamano_lote=TAMANO_LOTE):
+    """Generador de lotes (listas de tuplas) del conjunto, leídos con fetchmany."""
+    definicion = CONJUNTOS[conjunto]
+    where, params, orden = _consulta(conjunto, estados, fecha_desde, fecha_hasta)
+    columnas = ", ".join(expr for _, expr, _ in definicion['columnas'])
+    with conexion() as conn:
+        c = conn.execute(f"SELECT {columnas} FROM {definicion['desde']}{where} ORDER BY {orden}", params)
+        while True:
+            lote = c.fetchmany(tamano_lote)
+            if not lote:
+                break
+            yield lote
+
+
+def contar_filas(conjunto, estados=None, fecha_desde=None, fecha_hasta=None):
+    definicion = CONJUNTOS[conjunto]
+    where, params, _ = _consulta(conjunto, estados, fecha_desde, fecha_hasta)
+    with conexion() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {definicion['desde']}{where}", params).fetchone()[0]
+
+
+# --- Escritores: reciben los nombres/tipos de columna y un iterable de lotes ---
+def _escribir_csv(destino, columnas, lotes):
+    # utf-8-sig: Excel reconoce las tildes al abrir el CSV con doble clic
+    texto = io.TextIOWrapper(destino, encoding="utf-8-sig", newline="")
+    try:
+        escritor = csv.writer(texto)
+        escritor.writerow([nombre for nombre, _, _ in columnas])
+        for lote in lotes:
+            escritor.writerows(lote)
+        texto.flush()
+    finally:
+        texto.detach() # el archivo destino lo cierra quien lo abrió
+
+
+def _escribir_parquet(destino, columnas, lotes):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Para exportar a Parquet instala 'pyarrow' o usa CSV.")
+    tipos = {'int': pa.int64(), 'float': pa.float64(), 'str': pa.string()}
+    esquema = pa.schema([(nombre, tipos[tipo]) for nombre, _, tipo in columnas])
+    # Un row group por lote: el escritor nunca retiene más de un lote en memoria
+    with pq.ParquetWriter(destino, esquema, compression="snappy") as escritor:
+        for lote in lotes:
+            arrays = [pa.array([fila[i] for fila in lote], type=esquema.field(i).type) for i in range(len(columnas))]
+            escritor.write_batch(pa.RecordBatch.from_arrays(arrays, schema=esquema))
+
+
+def _escribir_xlsx(destino, columnas, lotes):
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ValueError("Para exportar a Excel instala 'openpyxl' o usa CSV/Parquet.")
+    # write_only: las filas se vuelcan a disco a medida que se agregan (memoria constante)
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet("Datos")
+    hoja.append([nombre for nombre, _, _ in columnas])
+    for lote in lotes:
+        for fila in lote:
+            hoja.append(fila)
+    libro.save(destino)
+
+
+_ESCRITORES = {'csv': _escribir_csv, 'parquet': _escribir_parquet, 'xlsx': _escribir_xlsx}
+
+# Excel admite 1.048.576 filas por hoja (una es el encabezado)
+MAX_FILAS_EXCEL = 1_048_575
+
+
+def exportar(conjunto, formato, destino, estados=None, fecha_desde=None, fecha_hasta=None,
+             tamano_lote=TAMANO_LOTE, progreso=None):
+    """
+    Escribe el conjunto en `destino` (ruta o archivo binario abierto) en el formato pedido.
+    `progreso(filas_escritas)` se llama tras cada lote. Devuelve el número de filas exportadas.
+    """
+    if conjunto not in CONJUNTOS:
+        raise ValueError(f"Conjunto desconocido: '{conjunto}'")
+    if formato not in _ESCRITORES:
+        raise ValueError(f"Formato no soportado: '{formato}'. Usa {', '.join(FORMATOS)}.")
+    if estados:
+        invalidos = [e for e in estados if e not in ESTADOS_PEDIDO]
+        if invalidos:
+            raise ValueError(f"Estados inválidos: {', '.join(invalidos)}")
+    if formato == 'xlsx' and contar_filas(conjunto, estados, fecha_desde, fecha_hasta) > MAX_FILAS_EXCEL:
+        raise ValueError("Demasiadas filas para una hoja de Excel: filtra por fechas o usa CSV/Parquet.")
+
+    escritas = [0]
+
+    def lotes():
+        for lote in iterar_lotes(conjunto, estados, fecha_desde, fecha_hasta, tamano_lote):
+            yield lote
+            escritas[0] += len(lote)
+            if progreso is not None:
+                progreso(escritas[0])
+
+    columnas = CONJUNTOS[conjunto]['columnas']
+    if isinstance(destino, (str, os.PathLike)):
+        with open(destino, "wb") as f:
+            _ESCRITORES[formato](f, columnas, lotes())
+    else:
+        _ESCRITORES[formato](destino, columnas, lotes())
+    return escritas[0]
+
+
+@tipo_trabajo("exportacion", "Exportar datos (pedidos, clientes o inventario)")
+def trabajo_exportar(parametros, progreso):
+    """
+    Trabajo en segundo plano: escribe la exportación directamente en directorio_resultados()
+    y devuelve la ruta (no los bytes), para no cargar el archivo en memoria.
+    """
+    conjunto = parametros.get('conjunto', 'pedidos')
+    formato = parametros.get('formato', 'csv')
+    filtros = {
+        'estados': parametros.get('estados') or None,
+        'fecha_desde': parametros.get('fecha_desde'),
+        'fecha_hasta': parametros.get('fecha_hasta'),
+    }
+    total = contar_filas(conjunto, **filtros) or 1
+    progreso(0.0, f"Exportando {total:,} filas")
+    directorio = directorio_resultados()
+    os.makedirs(directorio, exist_ok=True)
+    fd, ruta = tempfile.mkstemp(suffix=f".{formato}", dir=directorio)
+    os.close(fd)
+    try:
+        filas = exportar(conjunto, formato, ruta, progreso=lambda n: progreso(n / total, f"{n:,} de {total:,} filas"),
+                         **filtros)
+    except Exception:
+        os.remove(ruta)
+        raise
+    progreso(1.0, f"{filas:,} filas exportadas")
+    return f"{conjunto}_{datetime.now():%Y%m%d_%H%M}.{formato}", ruta
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta datos de Alex Fruver ERP sin cargarlos en memoria")
+    parser.add_argument("conjunto", choices=list(CONJUNTOS))
+    parser.add_argument("--formato", choices=list(FORMATOS), default="csv")
+    parser.add_argument("--salida", help="Archivo de salida (por defecto <conjunto>.<formato>)")
+    parser.add_argument("--estado", nargs="+", choices=ESTADOS_PEDIDO, help="Solo pedidos en estos estados")
+    parser.add_argument("--desde", help="Pedidos creados desde esta fecha (AAAA-MM-DD)")
+    parser.add_argument("--hasta", help="Pedidos creados hasta esta fecha, inclusive (AAAA-MM-DD)")
+    parser.add_argument("--lote", type=int, default=TAMANO_LOTE, help="Filas leídas por lote")
+    parser.add_argument("--db", default=database.DB_NAME, help="Archivo de base de datos (por defecto: %(default)s)")
+    args = parser.parse_args()
+
+    database.DB_NAME = args.db
+    salida = args.salida or f"{args.conjunto}.{args.formato}"
+    filas = exportar(args.conjunto, args.formato, salida, args.estado, args.desde, args.hasta, args.lote)
+    print(f"{filas:,} filas exportadas a {salida}")
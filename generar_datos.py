@@ -0,0 +1,175 @@
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import database
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+# Generador de bases de datos sintéticas (reproducibles con una semilla) para medir cómo
+# se comportan las funciones de datos a medida que crece alexfruver_erp.db.
+#
+#   python generar_datos.py bench_data/grande.db --escala grande
+#   python generar_datos.py prueba.db --clientes 5000 --pedidos 40000 --semilla 7
+#
+# Los pedidos Completado llevan sus movimientos de 'venta' en el libro de inventario, con la
+# fecha del pedido, y una recepción al inicio de la historia deja el stock final en STOCK_FINAL.
+
+# Escalas predefinidas: (clientes, pedidos). Se generan ~5 ítems por pedido en promedio.
+ESCALAS = {
+    'pequena': (1_000, 10_000),
+    'mediana': (10_000, 100_000),
+    'grande': (100_000, 1_000_000),
+}
+
+NOMBRES = ["Ana", "Carlos", "Luisa", "Jorge", "María", "Andrés", "Diana", "Felipe", "Paola", "Juan",
+           "Camila", "Santiago", "Valentina", "Mateo", "Laura", "Sebastián", "Daniela", "Nicolás"]
+APELLIDOS = ["Gómez", "Rodríguez", "Martínez", "López", "García", "Pérez", "Sánchez", "Ramírez",
+             "Torres", "Díaz", "Vargas", "Moreno", "Castro", "Rojas", "Ortiz", "Herrera"]
+NEGOCIOS = ["Restaurante", "Tienda", "Hotel", "Frutería", "Casino", "Cafetería", "Minimercado", "Panadería"]
+CIUDADES = ["Bogotá", "Medellín", "Cali", "Barranquilla", "Bucaramanga", "Pereira"]
+
+TAMANO_LOTE = 20_000 # pedidos por transacción al insertar
+STOCK_FINAL = 1_000_000 # stock de sobra para las pruebas
+
+
+def _generar_clientes(rnd, n):
+    for _ in range(n):
+        nombre_contacto = f"{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)}"
+        negocio = f"{rnd.choice(NEGOCIOS)} {rnd.choice(APELLIDOS)} {rnd.randint(1, 999)}"
+        usuario = nombre_contacto.lower().replace(" ", ".")
+        yield (negocio, nombre_contacto, f"{usuario}{rnd.randint(1, 99)}@correo.com",
+               f"3{rnd.randint(0, 2)}{rnd.randint(0, 9)}{rnd.randint(1000000, 9999999)}",
+               f"Calle {rnd.randint(1, 170)} # {rnd.randint(1, 99)}-{rnd.randint(1, 99)}, {rnd.choice(CIUDADES)}")
+
+
+def _estado_para(rnd, dias_atras):
+    """Los pedidos viejos ya están cerrados; los recientes siguen abiertos."""
+    r = rnd.random()
+    if dias_atras > 3:
+        return "Completado" if r < 0.93 else "Cancelado"
+    if r < 0.4:
+        return "Pendiente"
+    if r < 0.7:
+        return "En Proceso"
+    return "Completado" if r < 0.97 else "Cancelado"
+
+
+def generar_base(ruta, n_clientes, n_pedidos, items_por_pedido=5, dias_historia=730, semilla=42, verbose=True):
+    """
+    Crea (o amplía) la base en `ruta` con el esquema y catálogo reales más datos sintéticos.
+    Devuelve un dict con los conteos finales de cada tabla.
+    """
+    rnd = random.Random(semilla)
+    inicio = time.perf_counter()
+
+    # Esquema y catálogo de 39 productos exactamente como en producción
+    anterior = database.DB_NAME
+    database.DB_NAME = ruta
+    try:
+        from datos import init_db
+        init_db()
+    finally:
+        database.DB_NAME = anterior
+        database.cerrar_pools()
+
+    conn = sqlite3.connect(ruta)
+    database.configurar_conexion(conn)
+    conn.execute("PRAGMA synchronous=OFF") # carga masiva: se puede regenerar si falla
+
+    productos = conn.execute("SELECT id, nombre, precio_unitario FROM productos ORDER BY id").fetchall()
+    # Popularidad tipo Zipf: unos pocos productos concentran la mayoría de las ventas
+    pesos = [1 / (k + 1) for k in range(len(productos))]
+    rnd.shuffle(pesos)
+
+    base_clientes = conn.execute("SELECT COALESCE(MAX(id), 0) FROM clientes").fetchone()[0]
+    with conn:
+        conn.executemany("INSERT INTO clientes (nombre, contacto, email, telefono, direccion) VALUES (?, ?, ?, ?, ?)",
+                         _generar_clientes(rnd, n_clientes))
+    ids_clientes = range(base_clientes + 1, base_clientes + n_clientes + 1)
+    nombres_clientes = dict(conn.execute("SELECT id, nombre FROM clientes WHERE id > ?", (base_clientes,)).fetchall())
+    if verbose:
+        print(f"{n_clientes:,} clientes en {time.perf_counter() - inicio:.1f} s")
+
+    siguiente_pedido = conn.execute("SELECT COALESCE(MAX(id), 0) FROM pedidos").fetchone()[0] + 1
+    ahora = datetime.now().replace(microsecond=0)
+    creados = 0
+    while creados < n_pedidos:
+        lote = min(TAMANO_LOTE, n_pedidos - creados)
+        filas_pedidos, filas_items, filas_ventas = [], [], []
+        for id_pedido in range(siguiente_pedido, siguiente_pedido + lote):
+            id_cliente = rnd.choice(ids_clientes)
+            dias_atras = rnd.random() * dias_historia
+            fecha_creacion = ahora - timedelta(days=dias_atras)
+            fecha_entrega = (fecha_creacion + timedelta(days=rnd.randint(0, 3))).strftime("%Y-%m-%d")
+            n_items = max(1, min(int(rnd.expovariate(1 / items_por_pedido)) + 1, 40))
+            fecha_txt = fecha_creacion.strftime("%Y-%m-%d %H:%M:%S")
+            total = 0.0
+            vendido = {} # id_producto -> cantidad (un movimiento por producto, como update_pedido_estado_db)
+            for id_producto, nombre, precio in rnd.choices(productos, weights=pesos, k=n_items):
+                cantidad = rnd.randint(1, 20)
+                subtotal = precio * cantidad
+                total += subtotal
+                filas_items.append((id_pedido, id_producto, nombre, cantidad, precio, subtotal))
+                vendido[id_producto] = vendido.get(id_producto, 0) + cantidad
+            estado = _estado_para(rnd, dias_atras)
+            filas_pedidos.append((id_pedido, id_cliente, nombres_clientes[id_cliente], fecha_txt, fecha_entrega,
+                                  estado, total))
+            if estado == "Completado":
+                filas_ventas.extend((id_producto, fecha_txt, -cantidad, id_pedido) for id_producto, cantidad in vendido.items())
+        with conn:
+            conn.executemany("INSERT INTO pedidos (id, id_cliente, nombre_cliente, fecha_creacion, fecha_entrega_estimada, estado, total) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             filas_pedidos)
+            conn.executemany("INSERT INTO items_pedido (id_pedido, id_producto, nombre_producto, cantidad, precio_unitario, subtotal) VALUES (?, ?, ?, ?, ?, ?)",
+                             filas_items)
+            conn.executemany("INSERT INTO movimientos_inventario (id_producto, fecha, tipo, cantidad, id_pedido) VALUES (?, ?, 'venta', ?, ?)",
+                             filas_ventas)
+        siguiente_pedido += lote
+        creados += lote
+        if verbose:
+            print(f"  {creados:,}/{n_pedidos:,} pedidos ({time.perf_counter() - inicio:.1f} s)")
+
+    # Recepción al inicio de la historia, antes de todas las ventas: el saldo nunca es negativo y
+    # termina en STOCK_FINAL. Las ventas quedaron con fechas pasadas, así que las fotos diarias
+    # anteriores ya no cuadran: se reemplazan por una sola con el saldo actual.
+    with conn:
+        conn.execute("""
+            INSERT INTO movimientos_inventario (id_producto, fecha, tipo, cantidad, nota)
+            SELECT id, ?, 'recepcion', ? - COALESCE(stock, 0), 'Datos sintéticos' FROM productos
+        """, ((ahora - timedelta(days=dias_historia + 1)).strftime("%Y-%m-%d %H:%M:%S"), STOCK_FINAL))
+        conn.execute("DELETE FROM snapshots_inventario")
+        conn.execute("""
+            INSERT INTO snapshots_inventario (fecha, id_producto, stock, id_movimiento)
+            SELECT ?, id, COALESCE(stock, 0), (SELECT COALESCE(MAX(id), 0) FROM movimientos_inventario) FROM productos
+        """, (ahora.strftime("%Y-%m-%d %H:%M:%S"),))
+
+    conn.execute("ANALYZE")
+    conteos = {tabla: conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+               for tabla in ("clientes", "productos", "pedidos", "items_pedido", "movimientos_inventario")}
+    conn.close()
+    if verbose:
+        print(f"Base generada en {ruta} en {time.perf_counter() - inicio:.1f} s: {conteos}")
+    return conteos
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera una base de datos sintética de Alex Fruver ERP")
+    parser.add_argument("ruta", help="Archivo .db a crear")
+    parser.add_argument("--escala", choices=list(ESCALAS), help="Tamaño predefinido (clientes, pedidos)")
+    parser.add_argument("--clientes", type=int, default=1_000)
+    parser.add_argument("--pedidos", type=int, default=10_000)
+    parser.add_argument("--items-por-pedido", type=float, default=5)
+    parser.add_argument("--dias-historia", type=int, default=730)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--reemplazar", action="store_true", help="Borra el archivo si ya existe")
+    args = parser.parse_args()
+
+    if args.escala:
+        args.clientes, args.pedidos = ESCALAS[args.escala]
+    if args.reemplazar:
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(args.ruta + sufijo):
+                os.remove(args.ruta + sufijo)
+    generar_base(args.ruta, args.clientes, args.pedidos, args.items_por_pedido, args.dias_historia, args.semilla)
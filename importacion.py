@@ -0,0 +1,191 @@
+import math
+import os
+from datetime import datetime
+
+import pandas as pd
+
+from database import ESTADOS_PEDIDO, conexion, enviar_escritura
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+# Importación masiva de pedidos (planillas de clientes mayoristas, pedidos de la mañana).
+#
+# Formato del archivo: una fila por línea de pedido.
+#   Obligatorias: cliente (nombre o id), producto (nombre), cantidad
+#   Opcionales:   referencia (agrupa líneas en un mismo pedido), fecha_entrega (YYYY-MM-DD),
+#                 estado (por defecto 'Pendiente'), precio_unitario (por defecto el del catálogo)
+# Sin columna 'referencia', las líneas se agrupan por cliente + fecha de entrega.
+
+COLUMNAS_OBLIGATORIAS = ["cliente", "producto", "cantidad"]
+
+
+def leer_archivo_pedidos(archivo, nombre=None):
+    """Lee un CSV, Parquet o Excel (ruta o archivo subido) a un DataFrame con columnas normalizadas."""
+    nombre = nombre or getattr(archivo, "name", None) or str(archivo)
+    extension = os.path.splitext(nombre)[1].lower()
+    if extension == ".csv":
+        df = pd.read_csv(archivo, dtype=str, keep_default_na=False)
+    elif extension == ".parquet":
+        df = pd.read_parquet(archivo)
+    elif extension in (".xlsx", ".xls"):
+        try:
+            df = pd.read_excel(archivo, dtype=str)
+        except ImportError:
+            raise ValueError("Para leer archivos Excel instala 'openpyxl' o usa CSV/Parquet.")
+    else:
+        raise ValueError(f"Formato no soportado: '{extension}'. Usa CSV, Parquet o Excel.")
+    df.columns = [str(col).strip().lower() for col in df.columns]
+    return df
+
+
+def _texto(valor):
+    if valor is None or valor is pd.NA or (isinstance(valor, float) and pd.isna(valor)):
+        return ""
+    # Parquet y Excel traen los números como float: 3.0 -> "3", para que ids y referencias coincidan
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor).strip()
+
+
+def _clave(nombre):
+    return _texto(nombre).casefold()
+
+
+def importar_pedidos_db(df, fecha_creacion=None, db_path=None):
+    """
+    Valida e inserta en una sola transacción todos los pedidos de `df`.
+
+    Productos y clientes se resuelven con un único mapa en memoria (una consulta por tabla), y
+    toda la validación corre antes de pasar al escritor: el hilo escritor solo asigna los ids e
+    inserta, sin tener tomado el BEGIN IMMEDIATE mientras se revisa la planilla.
+    Un pedido con alguna línea inválida se rechaza entero, para no guardar pedidos a medias.
+
+    Devuelve un dict con pedidos_creados, items_creados, pedidos_rechazados, ids_pedidos y errores
+    (lista de {'fila', 'referencia', 'error'}, con 'fila' contando desde 1 como en la planilla).
+    """
+    faltantes = [col for col in COLUMNAS_OBLIGATORIAS if col not in df.columns]
+    if faltantes:
+        raise ValueError(f"Faltan columnas obligatorias: {', '.join(faltantes)}")
+
+    fecha_creacion = fecha_creacion or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    resultado = {'pedidos_creados': 0, 'items_creados': 0, 'pedidos_rechazados': 0, 'ids_pedidos': [], 'errores': []}
+
+    with conexion(db_path) as conn:
+        c = conn.cursor()
+        c.execute("SELECT id, nombre, precio_unitario FROM productos")
+        productos_map = {_clave(nombre): (id_prod, nombre, precio) for id_prod, nombre, precio in c.fetchall()}
+        c.execute("SELECT id, nombre FROM clientes")
+        clientes_filas = c.fetchall()
+    clientes_por_id = {id_cli: nombre for id_cli, nombre in clientes_filas}
+    clientes_por_nombre = {}
+    for id_cli, nombre in clientes_filas:
+        clientes_por_nombre.setdefault(_clave(nombre), (id_cli, nombre))
+
+    tiene_referencia = "referencia" in df.columns
+    pedidos = {} # clave de agrupación -> datos del pedido
+    rechazados = set()
+
+    for numero_fila, fila in enumerate(df.to_dict(orient="records"), start=2): # fila 1 = encabezados
+        referencia = _texto(fila.get("referencia")) if tiene_referencia else ""
+
+        def error(mensaje):
+            resultado['errores'].append({'fila': numero_fila, 'referencia': referencia, 'error': mensaje})
+
+        # Cliente: por id numérico o por nombre
+        cliente_txt = _texto(fila.get("cliente"))
+        cliente = None
+        if cliente_txt.isdigit() and int(cliente_txt) in clientes_por_id:
+            cliente = (int(cliente_txt), clientes_por_id[int(cliente_txt)])
+        else:
+            cliente = clientes_por_nombre.get(_clave(cliente_txt))
+
+        producto = productos_map.get(_clave(fila.get("producto")))
+        fecha_entrega = _texto(fila.get("fecha_entrega"))
+        estado = _texto(fila.get("estado")) or "Pendiente"
+        clave_pedido = referencia if tiene_referencia and referencia else (cliente_txt, fecha_entrega)
+
+        problemas = []
+        if cliente is None:
+            problemas.append(f"Cliente '{cliente_txt}' no encontrado")
+        if producto is None:
+            problemas.append(f"Producto '{_texto(fila.get('producto'))}' no encontrado")
+        try:
+            cantidad = float(_texto(fila.get("cantidad")))
+            # float() acepta "inf" y "nan": int() de esos falla con OverflowError/ValueError
+            if not math.isfinite(cantidad) or cantidad <= 0 or cantidad != int(cantidad):
+                raise ValueError
+            cantidad = int(cantidad)
+        except (ValueError, OverflowError):
+            problemas.append(f"Cantidad inválida: '{_texto(fila.get('cantidad'))}'")
+        if fecha_entrega:
+            try:
+                fecha_entrega = datetime.strptime(fecha_entrega[:10], "%Y-%m-%d").strftime("%Y-%m-%d")
+            except ValueError:
+                problemas.append(f"Fecha de entrega inválida: '{fecha_entrega}' (usa AAAA-MM-DD)")
+        if estado not in ESTADOS_PEDIDO:
+            problemas.append(f"Estado inválido: '{estado}'")
+        precio_txt = _texto(fila.get("precio_unitario"))
+        precio = None
+        if producto is not None:
+            precio = producto[2]
+        if precio_txt:
+            try:
+                precio = float(precio_txt)
+                if not math.isfinite(precio) or precio < 0:
+                    raise ValueError
+            except ValueError:
+                problemas.append(f"Precio inválido: '{precio_txt}'")
+
+        if problemas:
+            error("; ".join(problemas))
+            rechazados.add(clave_pedido)
+            continue
+
+        pedido = pedidos.setdefault(clave_pedido, {
+            'id_cliente': cliente[0],
+            'nombre_cliente': cliente[1],
+            'fecha_entrega': fecha_entrega or None,
+            'estado': estado,
+            'items': [],
+        })
+        if pedido['id_cliente'] != cliente[0]:
+            error(f"La referencia '{referencia}' mezcla clientes distintos")
+            rechazados.add(clave_pedido)
+            continue
+        pedido['items'].append((producto[0], producto[1], cantidad, precio, precio * cantidad))
+
+    for clave_pedido in rechazados:
+        pedidos.pop(clave_pedido, None)
+    resultado['pedidos_rechazados'] = len(rechazados)
+    if not pedidos:
+        return resultado
+    pedidos = list(pedidos.values())
+
+    # En el hilo escritor (BEGIN IMMEDIATE): los ids se asignan aquí mismo sin que otra sesión inserte en medio
+    def insertar(conn):
+        c = conn.cursor()
+        # Ids consecutivos a partir del último usado (AUTOINCREMENT nunca reutiliza ids)
+        c.execute("""
+            SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'pedidos'), 0),
+                       COALESCE((SELECT MAX(id) FROM pedidos), 0))
+        """)
+        siguiente_id = c.fetchone()[0] + 1
+
+        filas_pedidos = []
+        filas_items = []
+        for id_pedido, pedido in enumerate(pedidos, start=siguiente_id):
+            total = sum(item[4] for item in pedido['items'])
+            filas_pedidos.append((id_pedido, pedido['id_cliente'], pedido['nombre_cliente'], fecha_creacion,
+                                  pedido['fecha_entrega'], pedido['estado'], total))
+            filas_items.extend((id_pedido,) + item for item in pedido['items'])
+
+        c.executemany("INSERT INTO pedidos (id, id_cliente, nombre_cliente, fecha_creacion, fecha_entrega_estimada, estado, total) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                      filas_pedidos)
+        c.executemany("INSERT INTO items_pedido (id_pedido, id_producto, nombre_producto, cantidad, precio_unitario, subtotal) VALUES (?, ?, ?, ?, ?, ?)",
+                      filas_items)
+        return [fila[0] for fila in filas_pedidos], len(filas_items)
+
+    ids_pedidos, items_creados = enviar_escritura(insertar, tablas=("pedidos",), db_path=db_path).result()
+    resultado['ids_pedidos'] = ids_pedidos
+    resultado['pedidos_creados'] = len(ids_pedidos)
+    resultado['items_creados'] = items_creados
+    return resultado
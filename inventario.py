@@ -0,0 +1,173 @@
+from datetime import datetime
+
+import pandas as pd
+
+from database import cache_lectura, conexion, escritura
+from trabajos import tipo_trabajo
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+# Libro de inventario: cada cambio de stock es una fila nueva en movimientos_inventario
+# (nunca se edita ni se borra). productos.stock es el saldo actual, mantenido por el trigger
+# de la migración 8 en la misma transacción que el movimiento.
+#
+# Para el stock en una fecha pasada no se suma todo el libro: se parte de la última foto
+# (snapshots_inventario) anterior a esa fecha y se suman solo los movimientos entre la foto
+# y la fecha, con el índice (id_producto, fecha, cantidad).
+
+# tipo -> (descripción, signo permitido: 1 entrada, -1 salida, 0 cualquiera)
+TIPOS_MOVIMIENTO = {
+    'inicial': ("Saldo inicial", 0),
+    'venta': ("Venta (pedido completado)", -1),
+    # Lo vendido sin stock suficiente: devuelve a 0 el saldo que la venta dejó negativo
+    'faltante': ("Faltante en venta (stock llevado a 0)", 1),
+    'recepcion': ("Recepción de mercancía", 1),
+    'merma': ("Merma (daño o vencimiento)", -1),
+    'ajuste': ("Ajuste por conteo", 0),
+}
+
+
+def _ahora():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _fin_del_dia(fecha):
+    """'AAAA-MM-DD' (o date) -> 'AAAA-MM-DD 23:59:59'; una fecha con hora se deja igual."""
+    fecha = str(fecha)
+    return fecha if len(fecha) > 10 else f"{fecha} 23:59:59"
+
+
+def _foto(conn, fecha, forzar=False):
+    """Inserta la foto del stock de todos los productos si hoy aún no hay una (o si `forzar`). Devuelve True si la tomó."""
+    if not forzar and conn.execute("SELECT 1 FROM snapshots_inventario WHERE fecha >= ? LIMIT 1", (fecha[:10],)).fetchone():
+        return False
+    conn.execute("""
+        INSERT OR REPLACE INTO snapshots_inventario (fecha, id_producto, stock, id_movimiento)
+        SELECT ?, id, COALESCE(stock, 0), (SELECT COALESCE(MAX(id), 0) FROM movimientos_inventario)
+        FROM productos
+    """, (fecha,))
+    return True
+
+
+def insertar_movimientos(conn, movimientos):
+    """
+    Registra movimientos dentro de una transacción ya abierta (la de quien llama).
+    `movimientos`: tuplas (id_producto, tipo, cantidad, id_pedido, nota); cantidad con signo.
+    El primer movimiento de cada día toma antes la foto diaria del stock, en la misma transacción.
+    """
+    fecha = _ahora()
+    _foto(conn, fecha)
+    conn.executemany("""
+        INSERT INTO movimientos_inventario (id_producto, fecha, tipo, cantidad, id_pedido, nota)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, [(id_producto, fecha, tipo, cantidad, id_pedido, nota)
+          for id_producto, tipo, cantidad, id_pedido, nota in movimientos if cantidad])
+
+
+@escritura("productos", "movimientos_inventario")
+def registrar_movimiento_db(conn, id_producto, tipo, cantidad, nota=None):
+    """
+    Registra una recepción, merma o ajuste. `cantidad` es el cambio con signo (las mermas
+    pueden pasarse en positivo: se restan). Lanza ValueError si el stock quedaría negativo.
+    Devuelve el stock resultante.
+    """
+    if tipo not in TIPOS_MOVIMIENTO or tipo in ('inicial', 'venta', 'faltante'):
+        raise ValueError(f"Tipo de movimiento no válido: '{tipo}'")
+    signo = TIPOS_MOVIMIENTO[tipo][1]
+    cantidad = int(cantidad)
+    if signo:
+        cantidad = signo * abs(cantidad)
+    if cantidad == 0:
+        raise ValueError("La cantidad no puede ser cero")
+
+    fila = conn.execute("SELECT COALESCE(stock, 0) FROM productos WHERE id = ?", (id_producto,)).fetchone()
+    if fila is None:
+        raise ValueError("Producto no encontrado")
+    if fila[0] + cantidad < 0:
+        raise ValueError(f"No hay suficiente stock: disponible {fila[0]}, se intentan restar {-cantidad}")
+    insertar_movimientos(conn, [(id_producto, tipo, cantidad, None, nota)])
+    return fila[0] + cantidad
+
+
+def ajustar_stock_a(conn, id_producto, stock_nuevo, nota=None):
+    """Lleva el stock de un producto a `stock_nuevo` con un movimiento de ajuste (dentro de la transacción de quien llama)."""
+    fila = conn.execute("SELECT COALESCE(stock, 0) FROM productos WHERE id = ?", (id_producto,)).fetchone()
+    if fila is not None:
+        insertar_movimientos(conn, [(id_producto, 'ajuste', int(stock_nuevo) - fila[0], None, nota)])
+
+
+@escritura("movimientos_inventario")
+def tomar_snapshot_db(conn, forzar=False):
+    """
+    Foto del stock de todos los productos (una por día salvo `forzar`; sin esto, la toma el
+    primer movimiento del día). Se toma en una transacción inmediata, así stock e id del
+    último movimiento son coherentes.
+    Devuelve la fecha de la foto, o None si ya había una hoy.
+    """
+    ahora = _ahora()
+    tomada = _foto(conn, ahora, forzar)
+    return ahora if tomada else None
+
+
+@tipo_trabajo("snapshot_inventario", "Foto del stock de inventario")
+def trabajo_snapshot_inventario(parametros, progreso):
+    fecha = tomar_snapshot_db(forzar=bool(parametros.get('forzar')))
+    progreso(1.0, f"Foto tomada: {fecha}" if fecha else "Ya había una foto de hoy")
+    return None
+
+
+@cache_lectura("movimientos_inventario", "productos")
+def stock_en_fecha_db(fecha, ids=None):
+    """
+    Stock de cada producto (o de la tupla `ids`) al final de `fecha` ('AAAA-MM-DD' o con hora).
+    DataFrame con id, Producto, Stock.
+    """
+    hasta = _fin_del_dia(fecha)
+    with conexion() as conn:
+        foto = conn.execute("""
+            SELECT fecha, MAX(id_movimiento) FROM snapshots_inventario
+            WHERE fecha = (SELECT MAX(fecha) FROM snapshots_inventario WHERE fecha <= ?)
+        """, (hasta,)).fetchone()
+        fecha_foto, id_movimiento = foto if foto[0] is not None else ("", 0)
+        condicion_ids = ""
+        params = [fecha_foto, hasta, id_movimiento, fecha_foto]
+        if ids:
+            ids = tuple(ids)
+            condicion_ids = f" WHERE p.id IN ({', '.join('?' * len(ids))})"
+            params.extend(ids)
+        c = conn.execute(f"""
+            SELECT p.id, p.nombre AS Producto,
+                   COALESCE(s.stock, 0) + COALESCE((
+                       SELECT SUM(m.cantidad) FROM movimientos_inventario m
+                       WHERE m.id_producto = p.id AND m.fecha >= ? AND m.fecha <= ? AND m.id > ?
+                   ), 0) AS Stock
+            FROM productos p
+            LEFT JOIN snapshots_inventario s ON s.fecha = ? AND s.id_producto = p.id
+            {condicion_ids}
+            ORDER BY p.id
+        """, params)
+        filas = c.fetchall()
+    return pd.DataFrame.from_records(filas, columns=["id", "Producto", "Stock"])
+
+
+@cache_lectura("movimientos_inventario")
+def historial_movimientos_db(id_producto, fecha_desde=None, fecha_hasta=None, limite=200):
+    """Movimientos de un producto (más recientes primero) en un rango de fechas opcional, como DataFrame."""
+    condiciones, params = ["id_producto = ?"], [id_producto]
+    if fecha_desde:
+        condiciones.append("fecha >= ?")
+        params.append(str(fecha_desde))
+    if fecha_hasta:
+        condiciones.append("fecha <= ?")
+        params.append(_fin_del_dia(fecha_hasta))
+    with conexion() as conn:
+        c = conn.execute(f"""
+            SELECT fecha AS Fecha, tipo AS Tipo, cantidad AS Cantidad, id_pedido AS Pedido, nota AS Nota
+            FROM movimientos_inventario
+            WHERE {' AND '.join(condiciones)}
+            ORDER BY fecha DESC, id DESC
+            LIMIT ?
+        """, params + [int(limite)])
+        filas = c.fetchall()
+    df = pd.DataFrame.from_records(filas, columns=["Fecha", "Tipo", "Cantidad", "Pedido", "Nota"])
+    df['Tipo'] = df['Tipo'].map(lambda t: TIPOS_MOVIMIENTO.get(t, (t,))[0])
+    return df
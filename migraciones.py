@@ -0,0 +1,413 @@
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+# Migraciones versionadas del esquema. La versión aplicada se guarda en PRAGMA user_version,
+# así que un archivo alexfruver_erp.db existente evoluciona en su lugar sin perder datos.
+#
+# Para cambiar el esquema se AÑADE una migración al final de MIGRACIONES con el número
+# siguiente; nunca se editan las ya publicadas. Cada paso es una sentencia SQL o una
+# función que recibe la conexión.
+
+MIGRACIONES = [
+    (1, "Esquema base (clientes, categorias, productos, pedidos, items_pedido)", [
+        '''
+        CREATE TABLE IF NOT EXISTS clientes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL,
+            contacto TEXT,
+            email TEXT,
+            telefono TEXT,
+            direccion TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS categorias (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL UNIQUE
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS productos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL UNIQUE,
+            descripcion TEXT,
+            precio_unitario REAL NOT NULL,
+            costo_flete_unitario REAL DEFAULT 0.0,
+            stock INTEGER,
+            id_categoria INTEGER,
+            unidad_medida TEXT,
+            FOREIGN KEY (id_categoria) REFERENCES categorias(id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS pedidos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_cliente INTEGER NOT NULL,
+            nombre_cliente TEXT NOT NULL,
+            fecha_creacion TEXT,
+            fecha_entrega_estimada TEXT,
+            estado TEXT,
+            total REAL,
+            FOREIGN KEY (id_cliente) REFERENCES clientes(id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS items_pedido (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_pedido INTEGER NOT NULL,
+            id_producto INTEGER NOT NULL,
+            nombre_producto TEXT NOT NULL,
+            cantidad INTEGER NOT NULL,
+            precio_unitario REAL NOT NULL,
+            subtotal REAL NOT NULL,
+            FOREIGN KEY (id_pedido) REFERENCES pedidos(id),
+            FOREIGN KEY (id_producto) REFERENCES productos(id)
+        )
+        ''',
+    ]),
+    (2, "Índices de claves foráneas, filtros frecuentes y cobertura para el Dashboard", [
+        "CREATE INDEX IF NOT EXISTS idx_items_pedido_pedido ON items_pedido (id_pedido)",
+        # Cubre además la suma de cantidad/subtotal por producto (Productos Más Vendidos)
+        "CREATE INDEX IF NOT EXISTS idx_items_pedido_producto ON items_pedido (id_producto, cantidad, subtotal)",
+        "CREATE INDEX IF NOT EXISTS idx_pedidos_cliente ON pedidos (id_cliente)",
+        # Cubre además el conteo por estado y la suma de ingresos sin leer la tabla
+        "CREATE INDEX IF NOT EXISTS idx_pedidos_estado ON pedidos (estado, total)",
+        "CREATE INDEX IF NOT EXISTS idx_pedidos_fecha_creacion ON pedidos (fecha_creacion)",
+    ]),
+    (3, "Resumen de ventas diarias mantenido por triggers", [
+        # Una fila por (día de creación, producto, estado del pedido)
+        '''
+        CREATE TABLE IF NOT EXISTS ventas_diarias (
+            fecha TEXT NOT NULL,
+            id_producto INTEGER NOT NULL,
+            estado TEXT NOT NULL,
+            cantidad INTEGER NOT NULL DEFAULT 0,
+            ingresos REAL NOT NULL DEFAULT 0,
+            lineas INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (fecha, id_producto, estado)
+        ) WITHOUT ROWID
+        ''',
+        # Cada ítem nuevo suma en el día/estado de su pedido (en la misma transacción del INSERT)
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_ventas_diarias_item_insert
+        AFTER INSERT ON items_pedido
+        BEGIN
+            INSERT INTO ventas_diarias (fecha, id_producto, estado, cantidad, ingresos, lineas)
+            SELECT date(p.fecha_creacion), NEW.id_producto, COALESCE(p.estado, ''), NEW.cantidad, NEW.subtotal, 1
+            FROM pedidos p WHERE p.id = NEW.id_pedido AND date(p.fecha_creacion) IS NOT NULL
+            ON CONFLICT (fecha, id_producto, estado) DO UPDATE SET
+                cantidad = cantidad + excluded.cantidad,
+                ingresos = ingresos + excluded.ingresos,
+                lineas = lineas + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_ventas_diarias_item_delete
+        AFTER DELETE ON items_pedido
+        BEGIN
+            UPDATE ventas_diarias
+            SET cantidad = cantidad - OLD.cantidad, ingresos = ingresos - OLD.subtotal, lineas = lineas - 1
+            WHERE id_producto = OLD.id_producto
+              AND (fecha, estado) = (SELECT date(p.fecha_creacion), COALESCE(p.estado, '') FROM pedidos p WHERE p.id = OLD.id_pedido);
+            DELETE FROM ventas_diarias
+            WHERE id_producto = OLD.id_producto AND lineas <= 0
+              AND (fecha, estado) = (SELECT date(p.fecha_creacion), COALESCE(p.estado, '') FROM pedidos p WHERE p.id = OLD.id_pedido);
+        END
+        ''',
+        # Un cambio de estado mueve todos los ítems del pedido de un estado al otro
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_ventas_diarias_estado
+        AFTER UPDATE OF estado ON pedidos
+        WHEN COALESCE(OLD.estado, '') <> COALESCE(NEW.estado, '')
+        BEGIN
+            UPDATE ventas_diarias
+            SET cantidad = ventas_diarias.cantidad - v.cantidad,
+                ingresos = ventas_diarias.ingresos - v.ingresos,
+                lineas = ventas_diarias.lineas - v.lineas
+            FROM (
+                SELECT id_producto, SUM(cantidad) AS cantidad, SUM(subtotal) AS ingresos, COUNT(*) AS lineas
+                FROM items_pedido WHERE id_pedido = NEW.id GROUP BY id_producto
+            ) AS v
+            WHERE ventas_diarias.fecha = date(OLD.fecha_creacion)
+              AND ventas_diarias.estado = COALESCE(OLD.estado, '')
+              AND ventas_diarias.id_producto = v.id_producto;
+            DELETE FROM ventas_diarias
+            WHERE fecha = date(OLD.fecha_creacion) AND estado = COALESCE(OLD.estado, '') AND lineas <= 0;
+            INSERT INTO ventas_diarias (fecha, id_producto, estado, cantidad, ingresos, lineas)
+            SELECT date(NEW.fecha_creacion), id_producto, COALESCE(NEW.estado, ''), SUM(cantidad), SUM(subtotal), COUNT(*)
+            FROM items_pedido WHERE id_pedido = NEW.id AND date(NEW.fecha_creacion) IS NOT NULL GROUP BY id_producto
+            ON CONFLICT (fecha, id_producto, estado) DO UPDATE SET
+                cantidad = cantidad + excluded.cantidad,
+                ingresos = ingresos + excluded.ingresos,
+                lineas = lineas + excluded.lineas;
+        END
+        ''',
+        # Backfill con los pedidos ya existentes
+        lambda conn: reconstruir_ventas_diarias(conn),
+    ]),
+    (4, "Versiones de tablas compartidas entre procesos (caché de lecturas)", [
+        # database.transaccion incrementa aquí las tablas que invalida cada escritura
+        '''
+        CREATE TABLE IF NOT EXISTS versiones_tablas (
+            tabla TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        ''',
+    ]),
+    (5, "Trabajos en segundo plano (reportes y exportaciones)", [
+        '''
+        CREATE TABLE IF NOT EXISTS trabajos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tipo TEXT NOT NULL,
+            descripcion TEXT,
+            parametros TEXT,
+            estado TEXT NOT NULL,
+            progreso REAL NOT NULL DEFAULT 0,
+            mensaje TEXT,
+            sesion TEXT,
+            proceso INTEGER,
+            creado TEXT NOT NULL,
+            iniciado TEXT,
+            terminado TEXT,
+            archivo TEXT,
+            nombre_archivo TEXT,
+            error TEXT
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_trabajos_estado ON trabajos (estado)",
+    ]),
+    (6, "Búsqueda de texto completo (FTS5) en clientes y productos", [
+        # Índices de contenido externo: guardan solo los términos, el texto sigue en la tabla.
+        # remove_diacritics 2 hace que 'maria' encuentre 'María'; prefix acelera 'ma*' y 'mar*'.
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS clientes_fts USING fts5(
+            nombre, contacto, telefono, email,
+            content='clientes', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_clientes_fts_insert AFTER INSERT ON clientes
+        BEGIN
+            INSERT INTO clientes_fts (rowid, nombre, contacto, telefono, email)
+            VALUES (NEW.id, NEW.nombre, NEW.contacto, NEW.telefono, NEW.email);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_clientes_fts_delete AFTER DELETE ON clientes
+        BEGIN
+            INSERT INTO clientes_fts (clientes_fts, rowid, nombre, contacto, telefono, email)
+            VALUES ('delete', OLD.id, OLD.nombre, OLD.contacto, OLD.telefono, OLD.email);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_clientes_fts_update AFTER UPDATE OF nombre, contacto, telefono, email ON clientes
+        BEGIN
+            INSERT INTO clientes_fts (clientes_fts, rowid, nombre, contacto, telefono, email)
+            VALUES ('delete', OLD.id, OLD.nombre, OLD.contacto, OLD.telefono, OLD.email);
+            INSERT INTO clientes_fts (rowid, nombre, contacto, telefono, email)
+            VALUES (NEW.id, NEW.nombre, NEW.contacto, NEW.telefono, NEW.email);
+        END
+        ''',
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS productos_fts USING fts5(
+            nombre, descripcion,
+            content='productos', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_productos_fts_insert AFTER INSERT ON productos
+        BEGIN
+            INSERT INTO productos_fts (rowid, nombre, descripcion) VALUES (NEW.id, NEW.nombre, NEW.descripcion);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_productos_fts_delete AFTER DELETE ON productos
+        BEGIN
+            INSERT INTO productos_fts (productos_fts, rowid, nombre, descripcion)
+            VALUES ('delete', OLD.id, OLD.nombre, OLD.descripcion);
+        END
+        ''',
+        # Solo nombre/descripción: los cambios de stock (los más frecuentes) no tocan el índice
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_productos_fts_update AFTER UPDATE OF nombre, descripcion ON productos
+        BEGIN
+            INSERT INTO productos_fts (productos_fts, rowid, nombre, descripcion)
+            VALUES ('delete', OLD.id, OLD.nombre, OLD.descripcion);
+            INSERT INTO productos_fts (rowid, nombre, descripcion) VALUES (NEW.id, NEW.nombre, NEW.descripcion);
+        END
+        ''',
+        # Indexar los registros que ya existen
+        "INSERT INTO clientes_fts (clientes_fts) VALUES ('rebuild')",
+        "INSERT INTO productos_fts (productos_fts) VALUES ('rebuild')",
+    ]),
+    (7, "Cola de pedidos cerrados pendientes del snapshot analítico (Parquet)", [
+        # seq crece con cada cierre: analitica.py guarda el último seq exportado como marca de agua
+        '''
+        CREATE TABLE IF NOT EXISTS cola_analitica (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_pedido INTEGER NOT NULL
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_cola_analitica_insert AFTER INSERT ON pedidos
+        WHEN NEW.estado IN ('Completado', 'Cancelado')
+        BEGIN
+            INSERT INTO cola_analitica (id_pedido) VALUES (NEW.id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_cola_analitica_estado AFTER UPDATE OF estado ON pedidos
+        WHEN NEW.estado IN ('Completado', 'Cancelado') AND NEW.estado IS NOT OLD.estado
+        BEGIN
+            INSERT INTO cola_analitica (id_pedido) VALUES (NEW.id);
+        END
+        ''',
+        # Los pedidos ya cerrados entran en el primer snapshot
+        "INSERT INTO cola_analitica (id_pedido) SELECT id FROM pedidos WHERE estado IN ('Completado', 'Cancelado') ORDER BY id",
+    ]),
+    (8, "Libro de movimientos de inventario y fotos periódicas del stock", [
+        # Solo se insertan filas: cantidad es el cambio de stock con signo (ver inventario.py)
+        '''
+        CREATE TABLE IF NOT EXISTS movimientos_inventario (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_producto INTEGER NOT NULL,
+            fecha TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            cantidad INTEGER NOT NULL,
+            id_pedido INTEGER,
+            nota TEXT
+        )
+        ''',
+        # Historial de un producto y suma de sus movimientos en un rango de fechas, solo con el índice
+        "CREATE INDEX IF NOT EXISTS idx_movimientos_producto_fecha ON movimientos_inventario (id_producto, fecha, cantidad)",
+        # Stock de cada producto al tomar la foto; id_movimiento = último movimiento incluido
+        '''
+        CREATE TABLE IF NOT EXISTS snapshots_inventario (
+            fecha TEXT NOT NULL,
+            id_producto INTEGER NOT NULL,
+            stock INTEGER NOT NULL,
+            id_movimiento INTEGER NOT NULL,
+            PRIMARY KEY (fecha, id_producto)
+        ) WITHOUT ROWID
+        ''',
+        # El saldo actual entra como movimiento inicial (antes del trigger, que lo sumaría otra vez)
+        '''
+        INSERT INTO movimientos_inventario (id_producto, fecha, tipo, cantidad, nota)
+        SELECT id, datetime('now', 'localtime'), 'inicial', stock, 'Saldo al crear el libro de inventario'
+        FROM productos WHERE COALESCE(stock, 0) <> 0 ORDER BY id
+        ''',
+        # productos.stock queda como saldo materializado: cada movimiento lo actualiza en la misma transacción
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_movimientos_inventario_stock AFTER INSERT ON movimientos_inventario
+        BEGIN
+            UPDATE productos SET stock = COALESCE(stock, 0) + NEW.cantidad WHERE id = NEW.id_producto;
+        END
+        ''',
+        '''
+        INSERT INTO snapshots_inventario (fecha, id_producto, stock, id_movimiento)
+        SELECT datetime('now', 'localtime'), id, COALESCE(stock, 0), (SELECT COALESCE(MAX(id), 0) FROM movimientos_inventario)
+        FROM productos
+        ''',
+    ]),
+    (9, "Estado incremental del pronóstico de demanda", [
+        # Medias exponenciales de la demanda diaria (y de su cuadrado) hasta el día `hasta`;
+        # dias = días desde la primera venta, para corregir el arranque en cero (ver pronostico.py)
+        '''
+        CREATE TABLE IF NOT EXISTS pronostico_demanda (
+            id_producto INTEGER PRIMARY KEY,
+            media REAL NOT NULL,
+            media_cuadrados REAL NOT NULL,
+            dias INTEGER NOT NULL,
+            hasta TEXT NOT NULL
+        )
+        ''',
+    ]),
+    (10, "Índice de pedidos por fecha de entrega y estado (lista de despacho)", [
+        "CREATE INDEX IF NOT EXISTS idx_pedidos_entrega_estado ON pedidos (fecha_entrega_estimada, estado)",
+    ]),
+    (11, "Cola analítica también al reabrir un pedido cerrado", [
+        # Un pedido que vuelve a Pendiente/En Proceso se exporta otra vez: su versión abierta
+        # (seq más alto) saca del snapshot las filas cerradas anteriores (ver analitica.leer_items)
+        "DROP TRIGGER IF EXISTS trg_cola_analitica_estado",
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_cola_analitica_estado AFTER UPDATE OF estado ON pedidos
+        WHEN NEW.estado IS NOT OLD.estado
+         AND (NEW.estado IN ('Completado', 'Cancelado') OR OLD.estado IN ('Completado', 'Cancelado'))
+        BEGIN
+            INSERT INTO cola_analitica (id_pedido) VALUES (NEW.id);
+        END
+        ''',
+    ]),
+]
+
+VERSION_ESQUEMA = MIGRACIONES[-1][0]
+
+
+def reconstruir_ventas_diarias(conn, archivo=None):
+    """
+    Recalcula ventas_diarias desde cero a partir de pedidos e items_pedido (backfill/reparación).
+    `archivo` es el alias de la base histórica adjunta (ver archivo.py): sus pedidos también
+    suman, salvo los que siguen en la base principal (un lote interrumpido queda en ambas).
+    """
+    origen = """
+        SELECT p.fecha_creacion, p.estado, i.id_producto, i.cantidad, i.subtotal
+        FROM main.items_pedido i
+        JOIN main.pedidos p ON p.id = i.id_pedido
+    """
+    if archivo:
+        origen += f"""
+        UNION ALL
+        SELECT p.fecha_creacion, p.estado, i.id_producto, i.cantidad, i.subtotal
+        FROM {archivo}.items_pedido i
+        JOIN {archivo}.pedidos p ON p.id = i.id_pedido
+        WHERE p.id NOT IN (SELECT id FROM main.pedidos)
+        """
+    conn.execute("DELETE FROM ventas_diarias")
+    conn.execute(f"""
+        INSERT INTO ventas_diarias (fecha, id_producto, estado, cantidad, ingresos, lineas)
+        SELECT date(fecha_creacion), id_producto, COALESCE(estado, ''), SUM(cantidad), SUM(subtotal), COUNT(*)
+        FROM ({origen})
+        WHERE fecha_creacion IS NOT NULL
+        GROUP BY 1, 2, 3
+    """)
+
+
+def version_actual(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrar(conn, migraciones=MIGRACIONES):
+    """
+    Aplica, en orden y una sola vez, las migraciones pendientes.
+    Cada migración corre en su propia transacción junto con el cambio de user_version,
+    de modo que un fallo deja la base en la última versión completa.
+    Devuelve la lista de números de migración aplicados.
+    """
+    aplicadas = []
+    for numero, _descripcion, pasos in migraciones:
+        if version_actual(conn) >= numero:
+            continue
+        # BEGIN IMMEDIATE toma el bloqueo de escritura: si otro proceso migra a la vez,
+        # se espera y se vuelve a comprobar la versión dentro del bloqueo.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version_actual(conn) >= numero:
+                conn.rollback()
+                continue
+            for paso in pasos:
+                if callable(paso):
+                    paso(conn)
+                else:
+                    conn.execute(paso)
+            conn.execute(f"PRAGMA user_version = {int(numero)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        aplicadas.append(numero)
+
+    if aplicadas:
+        # Estadísticas para que el planificador use los índices nuevos
+        conn.execute("ANALYZE")
+        conn.commit()
+    return aplicadas
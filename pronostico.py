@@ -0,0 +1,222 @@
+import argparse
+import math
+from datetime import date, timedelta
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+import database
+from database import cache_lectura, conexion, enviar_escritura
+from trabajos import tipo_trabajo
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+# Pronóstico de demanda y puntos de reorden por producto, en lugar de un único umbral de
+# stock bajo para todo el catálogo.
+#
+# La demanda diaria sale de ventas_diarias (el resumen por día/producto/estado que mantienen
+# los triggers de la migración 3 y que conserva los pedidos archivados): se cuentan todos los
+# pedidos salvo los cancelados, por día de creación. Para cada producto se guarda en
+# pronostico_demanda la media exponencial de la demanda diaria y la de su cuadrado (de ahí la
+# desviación) hasta el último día procesado. Cada actualización procesa solo los días nuevos,
+# para todo el catálogo a la vez: una matriz días x productos y un producto matricial con los
+# pesos del suavizado.
+#
+#   stock de seguridad = z(nivel de servicio) * desviación diaria * raíz(días de reposición)
+#   punto de reorden   = demanda diaria * días de reposición + stock de seguridad
+#   compra sugerida    = demanda diaria * (reposición + revisión) + stock de seguridad - stock
+#                        disponible, solo si el disponible está en el punto de reorden o por debajo
+#
+#   python pronostico.py
+#   python pronostico.py --reconstruir     # recalcula desde el primer día de ventas
+
+# Peso del último día en la media exponencial (0.1 ~ las últimas tres semanas pesan la mitad)
+ALFA = 0.1
+VENTANA_MEDIA_MOVIL = 28
+DIAS_REPOSICION = 3
+DIAS_REVISION = 7
+NIVEL_SERVICIO = 0.95
+# Días procesados por lote: acota la matriz en memoria al reconstruir años de historia
+DIAS_POR_LOTE = 366
+
+ESTADOS_PENDIENTES = ("Pendiente", "En Proceso")
+
+
+def _dias(desde, hasta):
+    """Días entre `desde` y `hasta` (inclusive) como textos AAAA-MM-DD."""
+    return pd.date_range(desde, hasta, freq="D").strftime("%Y-%m-%d")
+
+
+def _demanda(conn, dias):
+    """Matriz días x productos con la demanda diaria (0 los días sin ventas)."""
+    c = conn.execute("""
+        SELECT fecha, id_producto, SUM(cantidad)
+        FROM ventas_diarias
+        WHERE fecha >= ? AND fecha <= ? AND estado <> 'Cancelado'
+        GROUP BY fecha, id_producto
+    """, (dias[0], dias[-1]))
+    ventas = pd.DataFrame.from_records(c.fetchall(), columns=["fecha", "id_producto", "cantidad"])
+    if ventas.empty:
+        return pd.DataFrame(index=dias, dtype=float)
+    return (ventas.pivot(index="fecha", columns="id_producto", values="cantidad")
+                  .reindex(dias, fill_value=0).fillna(0).astype(float))
+
+
+def _suavizar(estado, demanda, alfa):
+    """Avanza las medias exponenciales de `estado` (indexado por id_producto) con los días de `demanda`."""
+    productos = estado.index.union(demanda.columns)
+    estado = estado.reindex(productos, fill_value=0)
+    x = demanda.reindex(columns=productos, fill_value=0).to_numpy()
+    n = len(x)
+    # media_n = (1 - alfa)^n * media_0 + sum(alfa * (1 - alfa)^(n - 1 - t) * x_t)
+    pesos = alfa * (1 - alfa) ** np.arange(n - 1, -1, -1)
+    decaimiento = (1 - alfa) ** n
+    media = decaimiento * estado['media'].to_numpy() + pesos @ x
+    media_cuadrados = decaimiento * estado['media_cuadrados'].to_numpy() + pesos @ (x * x)
+
+    # Días desde la primera venta: los que ya tenían historia suman n; los nuevos, desde su primera venta
+    dias = estado['dias'].to_numpy()
+    vendidos = x > 0
+    primera = np.where(vendidos.any(axis=0), n - vendidos.argmax(axis=0), 0)
+    dias = np.where(dias > 0, dias + n, primera)
+    return pd.DataFrame({'media': media, 'media_cuadrados': media_cuadrados, 'dias': dias}, index=productos)
+
+
+def _leer_estado_db(conn):
+    c = conn.execute("SELECT id_producto, media, media_cuadrados, dias, hasta FROM pronostico_demanda")
+    estado = pd.DataFrame.from_records(c.fetchall(), columns=["id_producto", "media", "media_cuadrados", "dias", "hasta"])
+    return estado.set_index("id_producto")
+
+
+def actualizar_pronostico_db(reconstruir=False, alfa=ALFA, progreso=None):
+    """
+    Procesa los días completos (hasta ayer) que faltan en pronostico_demanda.
+    `reconstruir` recalcula desde el primer día de ventas (p. ej. tras cambiar `alfa` o tras
+    cancelar pedidos de días ya procesados). Devuelve {'dias', 'productos', 'hasta'}.
+    """
+    hasta = (date.today() - timedelta(days=1)).isoformat()
+    with conexion() as conn:
+        estado = _leer_estado_db(conn)
+        if reconstruir or estado.empty:
+            primera = conn.execute("SELECT MIN(fecha) FROM ventas_diarias").fetchone()[0]
+            estado = estado.iloc[0:0]
+            desde = primera
+        else:
+            desde = (date.fromisoformat(estado['hasta'].min()) + timedelta(days=1)).isoformat()
+    if desde is None or desde > hasta:
+        return {'dias': 0, 'productos': len(estado), 'hasta': hasta if desde else None}
+
+    estado = estado[['media', 'media_cuadrados', 'dias']]
+    dias = _dias(desde, hasta)
+    for inicio in range(0, len(dias), DIAS_POR_LOTE):
+        lote = dias[inicio:inicio + DIAS_POR_LOTE]
+        with conexion() as conn:
+            demanda = _demanda(conn, lote)
+        estado = _suavizar(estado, demanda, alfa)
+        if progreso is not None:
+            progreso(min((inicio + len(lote)) / len(dias), 0.99), f"Demanda procesada hasta {lote[-1]}")
+
+    filas = [(int(fila.Index), float(fila.media), float(fila.media_cuadrados), int(fila.dias), hasta)
+             for fila in estado.itertuples()]
+
+    # El cálculo corre fuera; el escritor único solo guarda el resultado
+    def guardar(conn):
+        if reconstruir:
+            conn.execute("DELETE FROM pronostico_demanda")
+        conn.executemany("""
+            INSERT OR REPLACE INTO pronostico_demanda (id_producto, media, media_cuadrados, dias, hasta)
+            VALUES (?, ?, ?, ?, ?)
+        """, filas)
+
+    enviar_escritura(guardar, tablas=("pronostico_demanda",)).result()
+    return {'dias': len(dias), 'productos': len(estado), 'hasta': hasta}
+
+
+def pronostico_pendiente_db():
+    """True si faltan días completos por procesar (la actualización de un día es inmediata)."""
+    with conexion() as conn:
+        fila = conn.execute("SELECT MIN(hasta), (SELECT MIN(fecha) FROM ventas_diarias) FROM pronostico_demanda").fetchone()
+    hasta, primera_venta = fila
+    ayer = (date.today() - timedelta(days=1)).isoformat()
+    return hasta < ayer if hasta else primera_venta is not None and primera_venta <= ayer
+
+
+@tipo_trabajo("pronostico_demanda", "Actualizar el pronóstico de demanda")
+def trabajo_pronostico(parametros, progreso):
+    resultado = actualizar_pronostico_db(reconstruir=bool(parametros.get('reconstruir')), progreso=progreso)
+    progreso(1.0, f"{resultado['dias']:,} días procesados para {resultado['productos']:,} productos")
+    return None
+
+
+@cache_lectura("pronostico_demanda", "productos", "pedidos", "ventas_diarias")
+def sugerencias_compra_db(fecha, dias_reposicion=DIAS_REPOSICION, dias_revision=DIAS_REVISION,
+                          nivel_servicio=NIVEL_SERVICIO, alfa=ALFA, solo_sugeridas=True):
+    """
+    Demanda pronosticada, stock de seguridad, punto de reorden y compra sugerida por producto
+    al día `fecha` (AAAA-MM-DD; es parte de la clave de caché, así que al cambiar de día no se
+    reutiliza la media móvil de ayer). El stock disponible descuenta lo comprometido en pedidos
+    Pendientes/En Proceso (el stock solo baja al completarlos). DataFrame ordenado por compra sugerida.
+    """
+    hoy = date.fromisoformat(str(fecha)[:10])
+    desde_media_movil = (hoy - timedelta(days=VENTANA_MEDIA_MOVIL)).isoformat()
+    ayer = (hoy - timedelta(days=1)).isoformat()
+    with conexion() as conn:
+        c = conn.execute(f"""
+            SELECT p.id, p.nombre, p.unidad_medida, COALESCE(p.stock, 0),
+                   COALESCE(c.cantidad, 0), COALESCE(m.cantidad, 0),
+                   COALESCE(d.media, 0), COALESCE(d.media_cuadrados, 0), COALESCE(d.dias, 0)
+            FROM productos p
+            LEFT JOIN pronostico_demanda d ON d.id_producto = p.id
+            LEFT JOIN (
+                SELECT i.id_producto, SUM(i.cantidad) AS cantidad
+                FROM pedidos pe JOIN items_pedido i ON i.id_pedido = pe.id
+                WHERE pe.estado IN ({', '.join('?' * len(ESTADOS_PENDIENTES))})
+                GROUP BY i.id_producto
+            ) c ON c.id_producto = p.id
+            LEFT JOIN (
+                SELECT id_producto, SUM(cantidad) AS cantidad
+                FROM ventas_diarias
+                WHERE fecha >= ? AND fecha <= ? AND estado <> 'Cancelado'
+                GROUP BY id_producto
+            ) m ON m.id_producto = p.id
+            ORDER BY p.id
+        """, ESTADOS_PENDIENTES + (desde_media_movil, ayer))
+        filas = c.fetchall()
+    df = pd.DataFrame.from_records(filas, columns=["id", "Producto", "Unidad", "Stock", "Comprometido", "vendido_ventana",
+                                                   "media", "media_cuadrados", "dias"])
+
+    # Corrección del arranque en cero: con pocos días de historia la media exponencial aún no pesa 1
+    peso = 1 - (1 - alfa) ** df['dias'].to_numpy(dtype=float)
+    peso[peso == 0] = 1
+    demanda = df['media'].to_numpy(dtype=float) / peso
+    desviacion = np.sqrt(np.maximum(df['media_cuadrados'].to_numpy(dtype=float) / peso - demanda ** 2, 0))
+
+    z = NormalDist().inv_cdf(nivel_servicio)
+    seguridad = z * desviacion * math.sqrt(dias_reposicion)
+    punto_reorden = demanda * dias_reposicion + seguridad
+    objetivo = demanda * (dias_reposicion + dias_revision) + seguridad
+    disponible = (df['Stock'] - df['Comprometido']).to_numpy()
+    sugerida = np.where(disponible <= punto_reorden, np.ceil(np.maximum(objetivo - disponible, 0)), 0).astype(int)
+
+    df = df.assign(**{
+        'Disponible': disponible,
+        'Demanda diaria': demanda.round(2),
+        f'Media móvil {VENTANA_MEDIA_MOVIL} días': (df['vendido_ventana'] / VENTANA_MEDIA_MOVIL).round(2),
+        'Stock de seguridad': np.ceil(seguridad).astype(int),
+        'Punto de reorden': np.ceil(punto_reorden).astype(int),
+        'Compra sugerida': sugerida,
+    }).drop(columns=["vendido_ventana", "media", "media_cuadrados", "dias"])
+    if solo_sugeridas:
+        df = df[df['Compra sugerida'] > 0]
+    return df.sort_values(["Compra sugerida", "Producto"], ascending=[False, True]).reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pronóstico de demanda y puntos de reorden de Alex Fruver ERP")
+    parser.add_argument("--reconstruir", action="store_true", help="Recalcula desde el primer día de ventas")
+    parser.add_argument("--db", default=database.DB_NAME, help="Archivo de base de datos (por defecto: %(default)s)")
+    args = parser.parse_args()
+
+    database.DB_NAME = args.db
+    resultado = actualizar_pronostico_db(reconstruir=args.reconstruir)
+    print(f"{resultado['dias']:,} días procesados para {resultado['productos']:,} productos (hasta {resultado['hasta']})")
@@ -0,0 +1,215 @@
+import argparse
+import io
+import os
+import zipfile
+from datetime import datetime
+
+import pandas as pd
+
+import database
+from archivo import resumen_archivado_db, ruta_archivo
+from database import cache_lectura, conexion, transaccion
+from migraciones import reconstruir_ventas_diarias
+from trabajos import tipo_trabajo
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+# Consultas del Dashboard/Reportes. Todas las agregaciones (COUNT/SUM/GROUP BY) se hacen
+# en SQLite y solo viajan a Python los resultados ya resumidos, así que el costo del
+# Dashboard no depende del número de ítems de pedido cargados en memoria.
+#
+# Los totales incluyen los pedidos archivados (archivo.py): ventas_diarias los conserva y los
+# conteos por estado suman resumen_archivado_db.
+
+
+@cache_lectura("clientes", "productos", "pedidos", "pedidos_archivados")
+def resumen_general_db():
+    """Totales de clientes, productos y pedidos (incluidos los archivados) en una sola consulta."""
+    with conexion() as conn:
+        fila = conn.execute("""
+            SELECT
+                (SELECT COUNT(*) FROM clientes),
+                (SELECT COUNT(*) FROM productos),
+                (SELECT COUNT(*) FROM pedidos),
+                (SELECT COALESCE(SUM(total), 0) FROM pedidos)
+        """).fetchone()
+    archivados = resumen_archivado_db().values()
+    return {'clientes': fila[0], 'productos': fila[1],
+            'pedidos': fila[2] + sum(pedidos for pedidos, _ in archivados),
+            'ingresos': fila[3] + sum(ingresos for _, ingresos in archivados)}
+
+
+@cache_lectura("pedidos", "pedidos_archivados")
+def pedidos_por_estado_db():
+    """Número de pedidos e ingresos por estado, incluidos los archivados (índice de cobertura de pedidos)."""
+    with conexion() as conn:
+        c = conn.execute("SELECT estado, COUNT(*), COALESCE(SUM(total), 0) FROM pedidos GROUP BY estado")
+        por_estado = {estado: [pedidos, ingresos] for estado, pedidos, ingresos in c.fetchall()}
+    for estado, (pedidos, ingresos) in resumen_archivado_db().items():
+        actual = por_estado.setdefault(estado, [0, 0.0])
+        actual[0] += pedidos
+        actual[1] += ingresos
+    df = pd.DataFrame([(estado, pedidos, ingresos) for estado, (pedidos, ingresos) in por_estado.items()],
+                      columns=["Estado", "Número de Pedidos", "Ingresos"])
+    return df.sort_values("Número de Pedidos", ascending=False, kind="stable").reset_index(drop=True)
+
+
+@cache_lectura("pedidos", "ventas_diarias", "productos")
+def productos_mas_vendidos_db(limite=None):
+    """
+    Cantidad vendida e ingresos por producto, de mayor a menor cantidad, desde ventas_diarias
+    (que conserva los pedidos archivados). Se une por id_producto (no por nombre); si el
+    producto ya no existe en el catálogo se usa el nombre guardado en el ítem.
+    """
+    sql = """
+        SELECT
+            COALESCE(p.nombre, (SELECT nombre_producto FROM items_pedido WHERE id_producto = v.id_producto LIMIT 1),
+                     'Producto #' || v.id_producto) AS "Producto",
+            p.unidad_medida AS "Unidad de Venta",
+            v.cantidad AS "Cantidad Vendida",
+            v.ingresos AS "Ingresos"
+        FROM (
+            SELECT id_producto, SUM(cantidad) AS cantidad, SUM(ingresos) AS ingresos
+            FROM ventas_diarias
+            GROUP BY id_producto
+        ) v
+        LEFT JOIN productos p ON p.id = v.id_producto
+        ORDER BY v.cantidad DESC
+    """
+    params = ()
+    if limite:
+        sql += " LIMIT ?"
+        params = (int(limite),)
+    with conexion() as conn:
+        return pd.read_sql_query(sql, conn, params=params)
+
+
+@cache_lectura("productos", "categorias")
+def reporte_stock_db():
+    """Stock actual del catálogo con categoría y unidad."""
+    with conexion() as conn:
+        return pd.read_sql_query("""
+            SELECT p.nombre AS "Producto", c.nombre AS "Categoría", p.unidad_medida AS "Unidad",
+                   p.stock AS "Stock Actual", p.precio_unitario AS "Precio Unitario"
+            FROM productos p
+            LEFT JOIN categorias c ON p.id_categoria = c.id
+            ORDER BY p.nombre
+        """, conn)
+
+
+@cache_lectura("productos", "categorias")
+def productos_bajo_stock_db(umbral):
+    """Productos con stock igual o menor al umbral."""
+    with conexion() as conn:
+        return pd.read_sql_query("""
+            SELECT p.nombre, c.nombre AS categoria, p.stock, p.unidad_medida
+            FROM productos p
+            LEFT JOIN categorias c ON p.id_categoria = c.id
+            WHERE COALESCE(p.stock, 0) <= ?
+            ORDER BY p.stock
+        """, conn, params=(umbral,))
+
+
+# --- Ventas en el tiempo (leen solo la tabla resumen ventas_diarias) ---
+# Expresión SQL que agrupa la fecha de ventas_diarias en cada periodo
+PERIODOS = {
+    'Día': "fecha",
+    'Semana': "date(fecha, '-6 days', 'weekday 1')", # lunes de la semana
+    'Mes': "strftime('%Y-%m', fecha)",
+}
+
+
+@cache_lectura("pedidos", "ventas_diarias")
+def ventas_por_periodo_db(periodo='Día', fecha_desde=None, fecha_hasta=None, estados=None, id_producto=None):
+    """
+    Cantidad, ingresos y líneas vendidas por día, semana o mes.
+    No recorre pedidos/items_pedido: suma filas de ventas_diarias usando su clave (fecha, ...).
+    """
+    condiciones, params = [], []
+    if fecha_desde:
+        condiciones.append("fecha >= ?")
+        params.append(str(fecha_desde))
+    if fecha_hasta:
+        condiciones.append("fecha <= ?")
+        params.append(str(fecha_hasta))
+    if estados:
+        condiciones.append(f"estado IN ({', '.join('?' * len(estados))})")
+        params.extend(estados)
+    if id_producto is not None:
+        condiciones.append("id_producto = ?")
+        params.append(id_producto)
+    where = " WHERE " + " AND ".join(condiciones) if condiciones else ""
+    expr = PERIODOS[periodo]
+    with conexion() as conn:
+        return pd.read_sql_query(f"""
+            SELECT {expr} AS "Periodo", SUM(cantidad) AS "Cantidad", SUM(ingresos) AS "Ingresos", SUM(lineas) AS "Líneas"
+            FROM ventas_diarias{where}
+            GROUP BY 1
+            ORDER BY 1
+        """, conn, params=params)
+
+
+def reconstruir_ventas_diarias_db(db_path=None):
+    """
+    Reconstruye el resumen ventas_diarias (backfill tras importar datos antiguos o reparación),
+    incluidas las ventas de los pedidos ya movidos a la base histórica (ver archivo.py).
+    """
+    historica = ruta_archivo(db_path)
+    adjuntas = {'archivo': historica} if os.path.exists(historica) else None
+    # Fuera del escritor único: ATTACH no se permite dentro de su transacción abierta
+    with transaccion(db_path, invalida=("ventas_diarias",), inmediata=True, adjuntas=adjuntas) as conn:
+        reconstruir_ventas_diarias(conn, 'archivo' if adjuntas else None)
+
+
+# --- Trabajos en segundo plano (ver trabajos.py) ---
+@tipo_trabajo("reporte_dashboard", "Reporte completo del Dashboard")
+def generar_reporte_dashboard(parametros, progreso):
+    """
+    Todas las tablas del Dashboard en un Excel (una hoja por tabla), o en un ZIP de CSV
+    si openpyxl no está instalado. `parametros` admite 'umbral_stock' y 'periodo'.
+    """
+    umbral = parametros.get('umbral_stock', 10)
+    periodo = parametros.get('periodo', 'Mes')
+    pasos = [
+        ("Resumen", lambda: pd.DataFrame([resumen_general_db()])),
+        ("Pedidos por estado", pedidos_por_estado_db),
+        ("Más vendidos", productos_mas_vendidos_db),
+        (f"Ventas por {periodo.lower()}", lambda: ventas_por_periodo_db(periodo)),
+        ("Stock", reporte_stock_db),
+        ("Stock bajo", lambda: productos_bajo_stock_db(umbral)),
+    ]
+    hojas = {}
+    for i, (nombre, consulta) in enumerate(pasos):
+        progreso(i / (len(pasos) + 1), f"Calculando '{nombre}'")
+        hojas[nombre] = consulta()
+
+    progreso(len(pasos) / (len(pasos) + 1), "Escribiendo archivo")
+    sufijo = datetime.now().strftime("%Y%m%d_%H%M")
+    salida = io.BytesIO()
+    try:
+        with pd.ExcelWriter(salida) as writer:
+            for nombre, df in hojas.items():
+                df.to_excel(writer, sheet_name=nombre[:31], index=False)
+        return f"reporte_dashboard_{sufijo}.xlsx", salida.getvalue()
+    except ImportError:
+        salida = io.BytesIO()
+        with zipfile.ZipFile(salida, "w", zipfile.ZIP_DEFLATED) as zf:
+            for nombre, df in hojas.items():
+                zf.writestr(f"{nombre}.csv", df.to_csv(index=False))
+        return f"reporte_dashboard_{sufijo}.zip", salida.getvalue()
+
+
+@tipo_trabajo("reconstruir_ventas_diarias", "Recalcular el resumen de ventas diarias")
+def trabajo_reconstruir_ventas_diarias(parametros, progreso):
+    progreso(0.0, "Recalculando ventas_diarias desde pedidos e ítems")
+    reconstruir_ventas_diarias_db()
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tareas de mantenimiento de los reportes de Alex Fruver ERP")
+    parser.add_argument("comando", choices=["reconstruir-ventas-diarias"])
+    parser.add_argument("--db", default=database.DB_NAME, help="Archivo de base de datos (por defecto: %(default)s)")
+    args = parser.parse_args()
+    if args.comando == "reconstruir-ventas-diarias":
+        reconstruir_ventas_diarias_db(args.db)
+        print(f"ventas_diarias reconstruida en {args.db}")
@@ -0,0 +1,174 @@
+import json
+import multiprocessing
+import os
+import re
+import threading
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import database
+from reportes import pedidos_por_estado_db, productos_mas_vendidos_db, reporte_stock_db, resumen_general_db, ventas_por_periodo_db
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+# Sucursales: cada punto de venta trabaja sobre su propio archivo SQLite. La sucursal
+# "Principal" es DB_NAME; las demás se registran en sucursales.json (nombre -> archivo).
+#
+# La app elige la sucursal de cada sesión con database.seleccionar_base: pools, escritor
+# único, caché de lecturas y versiones de tablas ya van por archivo, así que la carga de
+# escritura de una sucursal no bloquea a las otras.
+#
+# El reporte consolidado corre las agregaciones del Dashboard (reportes.py) sobre todas las
+# sucursales en paralelo, un proceso por sucursal (hasta un proceso por núcleo), y combina
+# los resultados parciales. Los procesos se reutilizan entre reportes y conservan su caché
+# de lecturas, que se invalida con las versiones de tablas de cada archivo.
+
+ARCHIVO_SUCURSALES = "sucursales.json"
+SUCURSAL_PRINCIPAL = "Principal"
+
+# Tablas que leen las agregaciones del reporte consolidado
+TABLAS_CONSOLIDADO = ("clientes", "categorias", "productos", "pedidos", "ventas_diarias", "pedidos_archivados")
+MAX_ENTRADAS_CONSOLIDADO = 16
+
+_procesos = None
+_procesos_lock = threading.Lock()
+_consolidados = {} # (parámetros, versiones de cada sucursal) -> resultado combinado
+_consolidados_lock = threading.Lock()
+_registradas = {} # ruta absoluta de sucursales.json -> ((mtime_ns, tamaño), {nombre: archivo})
+
+
+def _sucursales_registradas():
+    # La app lista las sucursales en cada recarga: el JSON solo se vuelve a leer si el archivo
+    # cambió (crear_sucursal lo reemplaza entero, desde esta sesión o desde otra)
+    ruta = os.path.abspath(ARCHIVO_SUCURSALES)
+    try:
+        estado = os.stat(ruta)
+    except FileNotFoundError:
+        return {}
+    firma = (estado.st_mtime_ns, estado.st_size)
+    leida = _registradas.get(ruta)
+    if leida is None or leida[0] != firma:
+        with open(ruta, encoding="utf-8") as f:
+            leida = _registradas[ruta] = (firma, json.load(f))
+    return leida[1]
+
+
+def listar_sucursales():
+    """Sucursales en orden: {nombre: archivo}, con la Principal primero."""
+    sucursales = {SUCURSAL_PRINCIPAL: database.DB_NAME}
+    sucursales.update(_sucursales_registradas())
+    return sucursales
+
+
+def _archivo_para(nombre):
+    base = unicodedata.normalize("NFKD", nombre).encode("ascii", "ignore").decode("ascii")
+    base = re.sub(r"[^a-z0-9]+", "_", base.lower()).strip("_")
+    if not base:
+        raise ValueError("El nombre de la sucursal debe tener letras o números")
+    return f"alexfruver_{base}.db"
+
+
+def crear_sucursal(nombre):
+    """Registra una sucursal con su propio archivo y crea su esquema. Devuelve la ruta del archivo."""
+    import datos
+
+    nombre = (nombre or "").strip()
+    sucursales = listar_sucursales()
+    if not nombre or nombre in sucursales:
+        raise ValueError(f"Ya existe una sucursal '{nombre}'" if nombre else "La sucursal necesita un nombre")
+    ruta = _archivo_para(nombre)
+    if ruta in sucursales.values():
+        raise ValueError(f"El archivo {ruta} ya pertenece a otra sucursal")
+
+    with database.usando_base(ruta):
+        datos.init_db()
+    sucursales.pop(SUCURSAL_PRINCIPAL)
+    sucursales[nombre] = ruta
+    temporal = ARCHIVO_SUCURSALES + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(sucursales, f, ensure_ascii=False, indent=2)
+    os.replace(temporal, ARCHIVO_SUCURSALES)
+    _registradas.pop(os.path.abspath(ARCHIVO_SUCURSALES), None)
+    return ruta
+
+
+# --- Reporte consolidado ---
+def _get_procesos():
+    global _procesos
+    with _procesos_lock:
+        if _procesos is None:
+            # spawn: los procesos no heredan conexiones SQLite ni hilos del servidor
+            _procesos = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                            mp_context=multiprocessing.get_context("spawn"))
+    return _procesos
+
+
+def _reporte_sucursal(ruta, periodo, fecha_desde, fecha_hasta, estados):
+    """Agregaciones del Dashboard de una sucursal (se ejecuta en un proceso del pool)."""
+    with database.usando_base(ruta):
+        return {
+            'resumen': resumen_general_db(),
+            'estados': pedidos_por_estado_db(),
+            'ventas': ventas_por_periodo_db(periodo, fecha_desde, fecha_hasta, estados),
+            'productos': productos_mas_vendidos_db(),
+            'stock': reporte_stock_db(),
+        }
+
+
+def _combinar(parciales):
+    """Suma los resultados parciales de cada sucursal (por estado, periodo y producto)."""
+    resumenes = pd.DataFrame([{'Sucursal': nombre, 'Clientes': p['resumen']['clientes'], 'Productos': p['resumen']['productos'],
+                               'Pedidos': p['resumen']['pedidos'], 'Ingresos': p['resumen']['ingresos']}
+                              for nombre, p in parciales.items()])
+
+    def concatenar(clave):
+        return pd.concat([p[clave].assign(Sucursal=nombre) for nombre, p in parciales.items()], ignore_index=True)
+
+    estados = (concatenar('estados').groupby("Estado", as_index=False)[["Número de Pedidos", "Ingresos"]].sum()
+                                    .sort_values("Número de Pedidos", ascending=False))
+    ventas = (concatenar('ventas').groupby("Periodo", as_index=False)[["Cantidad", "Ingresos", "Líneas"]].sum()
+                                  .sort_values("Periodo"))
+    # Los ids de producto son de cada archivo: se combinan por nombre y unidad
+    productos = (concatenar('productos').groupby(["Producto", "Unidad de Venta"], as_index=False, dropna=False)
+                                        [["Cantidad Vendida", "Ingresos"]].sum()
+                                        .sort_values("Cantidad Vendida", ascending=False))
+    stock = concatenar('stock')
+    return {
+        'resumen': {'clientes': int(resumenes['Clientes'].sum()), 'productos': int(resumenes['Productos'].sum()),
+                    'pedidos': int(resumenes['Pedidos'].sum()), 'ingresos': float(resumenes['Ingresos'].sum())},
+        'sucursales': resumenes,
+        'estados': estados.reset_index(drop=True),
+        'ventas': ventas.reset_index(drop=True),
+        'productos': productos.reset_index(drop=True),
+        'stock': stock[["Sucursal"] + [c for c in stock.columns if c != "Sucursal"]],
+    }
+
+
+def reporte_consolidado(periodo='Día', fecha_desde=None, fecha_hasta=None, estados=None):
+    """
+    Resumen, pedidos por estado, ventas por periodo, productos más vendidos y stock de todas
+    las sucursales. En caché hasta que alguna sucursal modifica las tablas que lee.
+    """
+    sucursales = listar_sucursales()
+    estados = tuple(estados or ())
+    parametros = (periodo, str(fecha_desde or ""), str(fecha_hasta or ""), estados)
+    clave = parametros + tuple((ruta, database.version_tablas(TABLAS_CONSOLIDADO, ruta)) for ruta in sucursales.values())
+    with _consolidados_lock:
+        if clave in _consolidados:
+            return _consolidados[clave]
+
+    argumentos = (periodo, fecha_desde or None, fecha_hasta or None, estados or None)
+    if len(sucursales) == 1:
+        parciales = {nombre: _reporte_sucursal(ruta, *argumentos) for nombre, ruta in sucursales.items()}
+    else:
+        procesos = _get_procesos()
+        futuros = {nombre: procesos.submit(_reporte_sucursal, ruta, *argumentos) for nombre, ruta in sucursales.items()}
+        parciales = {nombre: futuro.result() for nombre, futuro in futuros.items()}
+    resultado = _combinar(parciales)
+
+    with _consolidados_lock:
+        _consolidados[clave] = resultado
+        while len(_consolidados) > MAX_ENTRADAS_CONSOLIDADO:
+            _consolidados.pop(next(iter(_consolidados)))
+    return resultado
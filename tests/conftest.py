@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+
+
+@pytest.fixture
+def base(tmp_path, monkeypatch):
+    """Base nueva con esquema y datos iniciales en un directorio temporal (también directorio de trabajo)."""
+    import datos
+
+    monkeypatch.chdir(tmp_path)
+    ruta = str(tmp_path / "prueba.db")
+    with database.usando_base(ruta):
+        datos.init_db()
+        yield ruta
+    database.cerrar_pools()
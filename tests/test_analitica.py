@@ -0,0 +1,81 @@
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import analitica
+import datos
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+
+
+def test_completado_luego_cancelado_no_cuenta_como_completado(base, tmp_path):
+    directorio = str(tmp_path / "items_pedido")
+    id_cliente = datos.add_cliente_db("Cliente Prueba", "", "", "", "Calle 1")
+    id_producto = datos.get_productos_db()[0]['id']
+    pedido = datos.crear_pedido_db(id_cliente, [{'id_producto': id_producto, 'cantidad': 2}],
+                                   estado="Completado", fecha_creacion="2025-03-10 10:00:00")
+
+    analitica.actualizar_snapshot(directorio)
+    assert len(analitica.leer_items(["id_pedido"], estados=["Completado"], directorio=directorio)) == 1
+
+    # Segunda foto: el mismo pedido ya cancelado
+    datos.update_pedido_estado_db(pedido['id_pedido'], "Cancelado")
+    analitica.actualizar_snapshot(directorio)
+
+    assert analitica.leer_items(["id_pedido"], estados=["Completado"], directorio=directorio).empty
+    cancelados = analitica.leer_items(["id_pedido", "estado"], estados=["Cancelado"], directorio=directorio)
+    assert cancelados['id_pedido'].tolist() == [pedido['id_pedido']]
+    assert len(analitica.leer_items(["id_pedido"], directorio=directorio)) == 1
+
+
+def test_pedido_reabierto_sale_del_snapshot(base, tmp_path):
+    directorio = str(tmp_path / "items_pedido")
+    id_cliente = datos.add_cliente_db("Cliente Prueba", "", "", "", "")
+    id_producto = datos.get_productos_db()[0]['id']
+    pedido = datos.crear_pedido_db(id_cliente, [{'id_producto': id_producto, 'cantidad': 2}],
+                                   estado="Completado", fecha_creacion="2025-03-10 10:00:00")
+    analitica.actualizar_snapshot(directorio)
+
+    datos.update_pedido_estado_db(pedido['id_pedido'], "Pendiente")
+    analitica.actualizar_snapshot(directorio)
+    assert analitica.leer_items(["id_pedido"], directorio=directorio).empty
+    assert analitica.leer_items(["id_pedido"], estados=["Pendiente"], directorio=directorio).empty
+
+    # Se vuelve a cerrar: cuenta otra vez
+    datos.update_pedido_estado_db(pedido['id_pedido'], "Completado")
+    analitica.actualizar_snapshot(directorio)
+    assert analitica.leer_items(["id_pedido"], directorio=directorio)['id_pedido'].tolist() == [pedido['id_pedido']]
+
+
+def test_reconstruir_incluye_pedidos_archivados(base, tmp_path):
+    import archivo
+
+    directorio = analitica.directorio_analitica()
+    id_cliente = datos.add_cliente_db("Cliente Prueba", "", "", "", "")
+    id_producto = datos.get_productos_db()[0]['id']
+    antiguo = datos.crear_pedido_db(id_cliente, [{'id_producto': id_producto, 'cantidad': 2}],
+                                    estado="Completado", fecha_creacion="2020-01-10 10:00:00")
+    reciente = datos.crear_pedido_db(id_cliente, [{'id_producto': id_producto, 'cantidad': 1}], estado="Cancelado")
+    assert archivo.archivar_pedidos_db(dias=30)['pedidos'] == 1
+
+    analitica.reconstruir_snapshot()
+
+    ids = sorted(analitica.leer_items(["id_pedido"], directorio=directorio)['id_pedido'])
+    assert ids == sorted([antiguo['id_pedido'], reciente['id_pedido']])
+
+
+def test_cola_pendiente_de_un_pedido_archivado_se_exporta(base, monkeypatch):
+    import archivo
+
+    id_cliente = datos.add_cliente_db("Cliente Prueba", "", "", "", "")
+    id_producto = datos.get_productos_db()[0]['id']
+    pedido = datos.crear_pedido_db(id_cliente, [{'id_producto': id_producto, 'cantidad': 2}],
+                                   estado="Completado", fecha_creacion="2020-01-10 10:00:00")
+    # Archivado sin pyarrow: el pedido queda pendiente en la cola
+    with monkeypatch.context() as m:
+        m.setattr(analitica, "disponible", lambda: False)
+        assert archivo.archivar_pedidos_db(dias=30)['pedidos'] == 1
+
+    analitica.actualizar_snapshot()
+
+    assert analitica.leer_items(["id_pedido"])['id_pedido'].tolist() == [pedido['id_pedido']]
@@ -0,0 +1,68 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+import api
+import database
+import datos
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+
+
+@pytest.fixture
+def servidor(base, monkeypatch):
+    """API escuchando en un puerto libre sobre la base de prueba (los hilos del servidor usan DB_NAME)."""
+    monkeypatch.setattr(database, "DB_NAME", base)
+    monkeypatch.setattr(api, "TOKEN", None)
+    srv = api.crear_servidor(puerto=0)
+    hilo = threading.Thread(target=srv.serve_forever, daemon=True)
+    hilo.start()
+    yield srv.server_address[1]
+    srv.shutdown()
+    srv.server_close()
+
+
+def _post(puerto, ruta, cuerpo):
+    conn = http.client.HTTPConnection("127.0.0.1", puerto, timeout=10)
+    try:
+        conn.request("POST", ruta, body=cuerpo, headers={"Content-Type": "application/json"})
+        respuesta = conn.getresponse()
+        return respuesta.status, json.loads(respuesta.read())
+    finally:
+        conn.close()
+
+
+def _pedido(precio):
+    id_cliente = datos.add_cliente_db("Cliente API", "", "", "", "Calle 1")
+    id_producto = datos.get_productos_db()[0]['id']
+    # json.dumps escribe NaN/Infinity tal cual, como lo mandaría un cliente descuidado
+    return json.dumps({'id_cliente': id_cliente,
+                       'items': [{'id_producto': id_producto, 'cantidad': 2, 'precio_unitario': precio}]})
+
+
+@pytest.mark.parametrize("precio", [-1500, float("nan"), float("inf"), "mil", None, True])
+def test_precio_invalido_responde_400_sin_crear_el_pedido(servidor, precio):
+    estado_http, respuesta = _post(servidor, "/pedidos", _pedido(precio))
+
+    assert estado_http == 400
+    assert "Precio inválido" in respuesta['error']
+    assert datos.get_pedidos_db() == []
+
+
+def test_precio_valido_crea_el_pedido(servidor):
+    estado_http, respuesta = _post(servidor, "/pedidos", _pedido(1250.5))
+
+    assert estado_http == 201
+    assert respuesta['total'] == 2501.0
+
+
+def test_cantidad_invalida_responde_400(servidor):
+    cuerpo = json.loads(_pedido(100))
+    cuerpo['items'][0]['cantidad'] = 0
+
+    estado_http, respuesta = _post(servidor, "/pedidos", json.dumps(cuerpo))
+
+    assert estado_http == 400
+    assert "Cantidad inválida" in respuesta['error']
@@ -0,0 +1,106 @@
+import pytest
+
+import analitica
+import archivo
+import datos
+from database import conexion, transaccion
+from reportes import (pedidos_por_estado_db, productos_mas_vendidos_db, reconstruir_ventas_diarias_db,
+                      resumen_general_db)
+
+con_pyarrow = pytest.mark.skipif(not analitica.disponible(), reason="requiere pyarrow")
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+
+
+def _pedido_antiguo(estado="Completado"):
+    id_cliente = datos.add_cliente_db("Cliente Prueba", "", "", "", "Calle 1")
+    id_producto = datos.get_productos_db()[0]['id']
+    return datos.crear_pedido_db(id_cliente, [{'id_producto': id_producto, 'cantidad': 3}],
+                                 estado=estado, fecha_creacion="2020-01-15 09:00:00")['id_pedido']
+
+
+def _ventas():
+    with conexion() as conn:
+        return conn.execute("SELECT fecha, id_producto, estado, cantidad, lineas FROM ventas_diarias ORDER BY 1, 2, 3").fetchall()
+
+
+@con_pyarrow
+def test_archivar_exporta_la_cola_antes_de_mover(base):
+    id_pedido = _pedido_antiguo()
+
+    resultado = archivo.archivar_pedidos_db(dias=30)
+
+    assert resultado['pedidos'] == 1
+    assert archivo.obtener_pedido_archivado_db(id_pedido) is not None
+    assert analitica.leer_items(["id_pedido"])['id_pedido'].tolist() == [id_pedido]
+
+
+def test_archivar_no_mueve_pedidos_pendientes_del_snapshot(base, monkeypatch):
+    monkeypatch.setattr(analitica, "actualizar_snapshot", lambda *a, **k: None)
+    id_pedido = _pedido_antiguo()
+
+    assert archivo.archivar_pedidos_db(dias=30)['pedidos'] == 0
+    assert archivo.obtener_pedido_archivado_db(id_pedido) is None
+
+
+@con_pyarrow
+def test_reconstruir_ventas_diarias_conserva_las_archivadas(base):
+    _pedido_antiguo()
+    antes = _ventas()
+    archivo.archivar_pedidos_db(dias=30)
+
+    reconstruir_ventas_diarias_db()
+
+    assert _ventas() == antes
+
+
+@con_pyarrow
+def test_reconstruir_ventas_diarias_no_duplica_un_lote_interrumpido(base):
+    id_pedido = _pedido_antiguo()
+    antes = _ventas()
+    archivo.archivar_pedidos_db(dias=30)
+    # Lote copiado al archivo pero aún no borrado de la base principal
+    pedido = archivo.obtener_pedido_archivado_db(id_pedido)
+    with transaccion() as conn:
+        conn.execute("INSERT INTO pedidos (id, id_cliente, nombre_cliente, fecha_creacion, estado, total) VALUES (?, ?, ?, ?, ?, ?)",
+                     (id_pedido, pedido['id_cliente'], pedido['nombre_cliente'], pedido['fecha_creacion'], pedido['estado'], pedido['total']))
+        conn.executemany("INSERT INTO items_pedido (id_pedido, id_producto, nombre_producto, cantidad, precio_unitario, subtotal) VALUES (?, ?, ?, ?, ?, ?)",
+                         [(id_pedido, i['id_producto'], i['nombre_producto'], i['cantidad'], i['precio_unitario'], i['subtotal'])
+                          for i in pedido['items']])
+
+    reconstruir_ventas_diarias_db()
+
+    assert _ventas() == antes
+
+
+def _sin_pyarrow(monkeypatch):
+    def no_exportar(*args, **kwargs):
+        raise AssertionError("sin pyarrow no se exporta el snapshot")
+    monkeypatch.setattr(analitica, "disponible", lambda: False)
+    monkeypatch.setattr(analitica, "actualizar_snapshot", no_exportar)
+
+
+def test_archivar_sin_pyarrow_no_espera_la_cola(base, monkeypatch):
+    _sin_pyarrow(monkeypatch)
+    id_pedido = _pedido_antiguo()
+
+    assert archivo.archivar_pedidos_db(dias=30)['pedidos'] == 1
+    assert archivo.obtener_pedido_archivado_db(id_pedido) is not None
+
+
+def test_dashboard_no_cambia_al_archivar(base, monkeypatch):
+    _sin_pyarrow(monkeypatch)
+    _pedido_antiguo("Completado")
+    _pedido_antiguo("Cancelado")
+    id_cliente = datos.add_cliente_db("Cliente Reciente", "", "", "", "")
+    datos.crear_pedido_db(id_cliente, [{'id_producto': datos.get_productos_db()[1]['id'], 'cantidad': 1}])
+
+    def tablero():
+        return (resumen_general_db(), pedidos_por_estado_db().sort_values("Estado").to_dict("records"),
+                productos_mas_vendidos_db().to_dict("records"))
+
+    antes = tablero()
+    assert archivo.archivar_pedidos_db(dias=30)['pedidos'] == 2
+
+    assert tablero() == antes
+    assert antes[0]['pedidos'] == 3
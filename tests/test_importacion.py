@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+
+import datos
+from database import conexion
+from importacion import importar_pedidos_db
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+
+
+@pytest.fixture
+def planilla(base):
+    datos.add_cliente_db("Cliente Importado", "", "", "", "")
+    producto = datos.get_productos_db()[0]['nombre']
+    return lambda **columnas: pd.DataFrame([{'cliente': "Cliente Importado", 'producto': producto, 'cantidad': "2", **columnas}])
+
+
+@pytest.mark.parametrize("valor", ["inf", "-inf", "nan", "1e999"])
+def test_cantidad_no_finita_se_rechaza(planilla, valor):
+    resultado = importar_pedidos_db(planilla(cantidad=valor))
+
+    assert resultado['pedidos_creados'] == 0
+    assert resultado['pedidos_rechazados'] == 1
+    assert "Cantidad inválida" in resultado['errores'][0]['error']
+
+
+@pytest.mark.parametrize("valor", ["inf", "-inf", "nan", "1e999", "-1500"])
+def test_precio_no_finito_o_negativo_se_rechaza(planilla, valor):
+    resultado = importar_pedidos_db(planilla(precio_unitario=valor))
+
+    assert resultado['pedidos_creados'] == 0
+    assert resultado['pedidos_rechazados'] == 1
+    assert "Precio inválido" in resultado['errores'][0]['error']
+
+
+def test_planilla_valida_se_importa(planilla):
+    resultado = importar_pedidos_db(planilla(precio_unitario="1500.5"))
+
+    assert resultado['pedidos_creados'] == 1
+    assert resultado['errores'] == []
+
+
+def test_numeros_de_parquet_como_float_se_resuelven(planilla):
+    # read_parquet entrega float64 en columnas numéricas con nulos: id de cliente 1.0, cantidad 3.0
+    id_cliente = datos.get_clientes_db()[0]['id']
+    resultado = importar_pedidos_db(planilla(cliente=float(id_cliente), cantidad=3.0, referencia=7.0))
+
+    assert resultado['errores'] == []
+    with conexion() as conn:
+        assert conn.execute("SELECT p.id_cliente, i.cantidad FROM pedidos p JOIN items_pedido i ON i.id_pedido = p.id "
+                            "WHERE p.id = ?", (resultado['ids_pedidos'][0],)).fetchall() == [(id_cliente, 3)]
+
+
+def test_planilla_invalida_no_pasa_por_el_escritor(planilla, monkeypatch):
+    def sin_escritor(*args, **kwargs):
+        raise AssertionError("la validación no debe ocupar el escritor")
+    monkeypatch.setattr("importacion.enviar_escritura", sin_escritor)
+
+    resultado = importar_pedidos_db(planilla(cantidad="-1"))
+
+    assert resultado['pedidos_rechazados'] == 1
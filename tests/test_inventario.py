@@ -0,0 +1,45 @@
+from datetime import date
+
+import datos
+from database import conexion
+from inventario import stock_en_fecha_db
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+
+
+def _completar_con_stock(stock, cantidad):
+    id_cliente = datos.add_cliente_db("Cliente Prueba", "", "", "", "Calle 1")
+    id_producto = datos.get_productos_db()[0]['id']
+    datos.update_producto_stock_db(id_producto, stock)
+    id_pedido = datos.crear_pedido_db(id_cliente, [{'id_producto': id_producto, 'cantidad': cantidad}])['id_pedido']
+    datos.update_pedido_estado_db(id_pedido, "Completado")
+    with conexion() as conn:
+        movimientos = dict(conn.execute(
+            "SELECT tipo, cantidad FROM movimientos_inventario WHERE id_pedido = ?", (id_pedido,)).fetchall())
+        stock_final, suma_libro = conn.execute(
+            "SELECT stock, (SELECT SUM(cantidad) FROM movimientos_inventario WHERE id_producto = p.id) "
+            "FROM productos p WHERE id = ?", (id_producto,)).fetchone()
+    return id_producto, movimientos, stock_final, suma_libro
+
+
+def test_completar_sin_stock_registra_la_venta_completa_y_el_faltante(base):
+    id_producto, movimientos, stock_final, suma_libro = _completar_con_stock(0, 5)
+
+    assert movimientos == {'venta': -5, 'faltante': 5}
+    assert stock_final == 0 and suma_libro == 0
+    foto = stock_en_fecha_db(date.today().isoformat(), ids=(id_producto,))
+    assert foto['Stock'].tolist() == [0]
+
+
+def test_completar_con_stock_parcial(base):
+    id_producto, movimientos, stock_final, suma_libro = _completar_con_stock(3, 5)
+
+    assert movimientos == {'venta': -5, 'faltante': 2}
+    assert stock_final == 0 and suma_libro == 0
+
+
+def test_completar_con_stock_suficiente_no_registra_faltante(base):
+    id_producto, movimientos, stock_final, suma_libro = _completar_con_stock(10, 4)
+
+    assert movimientos == {'venta': -4}
+    assert stock_final == 6 and suma_libro == 6
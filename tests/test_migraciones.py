@@ -0,0 +1,47 @@
+import sqlite3
+
+import pytest
+
+import datos
+from database import conexion
+from migraciones import MIGRACIONES, migrar, version_actual
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+
+
+def _foto_base(conn):
+    esquema = conn.execute("SELECT type, name, sql FROM sqlite_master WHERE name NOT LIKE 'sqlite_%' ORDER BY 1, 2").fetchall()
+    conteos = {tabla: conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+               for tabla in ("productos", "categorias", "movimientos_inventario", "snapshots_inventario", "ventas_diarias")}
+    return esquema, conteos
+
+
+def test_migrar_e_init_db_dos_veces_no_cambian_nada(base):
+    with conexion() as conn:
+        assert version_actual(conn) == MIGRACIONES[-1][0]
+        antes = _foto_base(conn)
+        assert migrar(conn) == []
+
+    datos.init_db()
+
+    with conexion() as conn:
+        assert version_actual(conn) == MIGRACIONES[-1][0]
+        assert _foto_base(conn) == antes
+
+
+def test_migracion_fallida_no_avanza_la_version(tmp_path):
+    conn = sqlite3.connect(tmp_path / "migraciones.db")
+    pasos = [
+        (1, "Tabla", ["CREATE TABLE t (x INTEGER)"]),
+        (2, "Falla a medias", ["INSERT INTO t VALUES (1)", "INSERT INTO tabla_inexistente VALUES (1)"]),
+    ]
+    with pytest.raises(sqlite3.OperationalError):
+        migrar(conn, pasos)
+    assert version_actual(conn) == 1
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+    pasos[1] = (2, "Corregida", ["INSERT INTO t VALUES (1)"])
+    assert migrar(conn, pasos) == [2]
+    assert migrar(conn, pasos) == []
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+    conn.close()
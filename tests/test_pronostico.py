@@ -0,0 +1,27 @@
+from datetime import date, timedelta
+
+import datos
+import pronostico
+import trabajos
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+
+
+def test_pronostico_en_segundo_plano_y_sugerencias_por_fecha(base):
+    id_cliente = datos.add_cliente_db("Cliente Pronóstico", "", "", "", "")
+    producto = datos.get_productos_db()[0]
+    hace_tres_dias = (date.today() - timedelta(days=3)).isoformat()
+    datos.crear_pedido_db(id_cliente, [{'id_producto': producto['id'], 'cantidad': 28}], fecha_creacion=f"{hace_tres_dias} 08:00:00")
+
+    assert pronostico.pronostico_pendiente_db()
+    trabajo = trabajos.esperar_trabajo(trabajos.enviar_trabajo("pronostico_demanda"), timeout=10)
+    assert trabajo['estado'] == "Terminado"
+    assert not pronostico.pronostico_pendiente_db()
+
+    # La fecha es parte de la clave: la venta entra en la media móvil solo a partir del día siguiente
+    def media_movil(fecha):
+        df = pronostico.sugerencias_compra_db(fecha, solo_sugeridas=False)
+        return df.loc[df['id'] == producto['id'], f'Media móvil {pronostico.VENTANA_MEDIA_MOVIL} días'].iloc[0]
+
+    assert media_movil(hace_tres_dias) == 0
+    assert media_movil(date.today().isoformat()) == 1
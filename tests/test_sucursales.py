@@ -0,0 +1,23 @@
+import json
+
+import sucursales
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+
+
+def test_listar_sucursales_solo_relee_el_json_si_cambia(base, monkeypatch):
+    ruta = sucursales.crear_sucursal("Norte")
+    assert sucursales.listar_sucursales()["Norte"] == ruta
+
+    lecturas = []
+    cargar = json.load
+    monkeypatch.setattr(sucursales.json, "load", lambda f: lecturas.append(f.name) or cargar(f))
+    for _ in range(3):
+        assert list(sucursales.listar_sucursales()) == [sucursales.SUCURSAL_PRINCIPAL, "Norte"]
+    assert lecturas == []
+
+    # Otra sesión (u otro proceso) registra una sucursal: el archivo cambia y se vuelve a leer
+    with open(sucursales.ARCHIVO_SUCURSALES, "w", encoding="utf-8") as f:
+        json.dump({"Norte": ruta, "Sur": "alexfruver_sur.db"}, f)
+    assert list(sucursales.listar_sucursales()) == [sucursales.SUCURSAL_PRINCIPAL, "Norte", "Sur"]
+    assert len(lecturas) == 1
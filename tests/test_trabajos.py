@@ -0,0 +1,59 @@
+import os
+
+import database
+import datos
+import trabajos
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+
+
+@trabajos.tipo_trabajo("prueba_resultado", "Trabajo de prueba con archivo")
+def _trabajo_prueba(parametros, progreso):
+    return "resultado.txt", parametros['contenido'].encode("utf-8")
+
+
+def _terminar(contenido):
+    trabajo = trabajos.esperar_trabajo(trabajos.enviar_trabajo("prueba_resultado", {'contenido': contenido}), timeout=10)
+    assert trabajo['estado'] == "Terminado"
+    return trabajo
+
+
+def test_resultados_y_limpieza_separados_por_sucursal(base, tmp_path):
+    otra = str(tmp_path / "alexfruver_norte.db")
+    with database.usando_base(otra):
+        datos.init_db()
+        trabajo_otra = _terminar("norte")
+    trabajo = _terminar("principal")
+
+    # Mismo id en cada base, archivos distintos
+    assert trabajo['id'] == trabajo_otra['id']
+    assert trabajo['archivo'] != trabajo_otra['archivo']
+    assert trabajos.leer_resultado(trabajo) == b"principal"
+
+    with database.usando_base(otra):
+        assert trabajos.leer_resultado(trabajos.obtener_trabajo_db(trabajo_otra['id'])) == b"norte"
+        assert trabajos.limpiar_trabajos_db(dias=-1) == 1
+    assert not os.path.exists(trabajo_otra['archivo'])
+    assert trabajos.leer_resultado(trabajo) == b"principal"
+
+
+@trabajos.tipo_trabajo("prueba_error", "Trabajo de prueba que falla")
+def _trabajo_error(parametros, progreso):
+    raise RuntimeError("sin datos")
+
+
+def test_ultimo_trabajo_muestra_el_error_y_los_interrumpidos(base):
+    assert trabajos.ultimo_trabajo_db("prueba_error") is None
+    trabajos.esperar_trabajo(trabajos.enviar_trabajo("prueba_error"), timeout=10)
+
+    ultimo = trabajos.ultimo_trabajo_db("prueba_error")
+    assert ultimo['estado'] == "Error" and "sin datos" in ultimo['error']
+
+    # Un trabajo que quedó en cola en otro proceso ya no cuenta como pendiente
+    otra = base.replace("prueba.db", "otra.db")
+    with database.usando_base(otra):
+        datos.init_db()
+        with database.transaccion() as conn:
+            conn.execute("INSERT INTO trabajos (tipo, descripcion, parametros, estado, proceso, creado) "
+                         "VALUES ('prueba_error', '', '{}', 'En cola', -1, '2020-01-01 00:00:00')")
+        assert trabajos.ultimo_trabajo_db("prueba_error")['estado'] == "Error"
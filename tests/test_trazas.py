@@ -0,0 +1,17 @@
+import datos
+import trazas
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+
+
+def test_escrituras_del_escritor_cuentan_en_el_registro_de_la_sesion(base):
+    registro = trazas.iniciar_rerun()
+    try:
+        datos.add_cliente_db("Cliente Trazado", "", "", "", "")
+    finally:
+        trazas.terminar_rerun()
+        trazas.desactivar()
+
+    assert registro.funciones['add_cliente_db'][0] == 1
+    assert registro.funciones['add_cliente_db'][2] >= 1
+    assert registro.consultas >= 1
@@ -0,0 +1,261 @@
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import database
+from database import conexion, enviar_escritura
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+# Ejecución de trabajos pesados (reportes, exportaciones, recálculos) fuera del hilo del
+# script de Streamlit. El estado y el progreso de cada trabajo se guardan en la tabla
+# `trabajos`, así que cualquier sesión puede consultarlos en su siguiente recarga, y el
+# resultado queda en un archivo en el directorio de resultados de su base (sucursal),
+# directorio_resultados(), listo para descargar.
+#
+# Se usan hilos y no procesos: SQLite y las operaciones de pandas sobre columnas liberan
+# el GIL, y así los trabajos comparten el pool de conexiones y la caché de lecturas.
+#
+# Un tipo de trabajo se registra junto a la función que lo implementa:
+#
+#   @tipo_trabajo("reporte_dashboard", "Reporte completo del Dashboard")
+#   def generar_reporte_dashboard(parametros, progreso):
+#       progreso(0.5, "Calculando...")
+#       return "reporte.xlsx", contenido_en_bytes   # o None si no produce archivo
+#
+# Un trabajo que produce archivos grandes puede escribirlos él mismo dentro de
+# directorio_resultados() y devolver (nombre, ruta) en lugar de los bytes.
+#
+# El estado y el progreso se guardan por el escritor único de cada base (database.enviar_escritura),
+# igual que el resto de escrituras: un trabajo nunca compite con las ventas por el bloqueo.
+
+ESTADOS_TRABAJO = ["En cola", "En ejecución", "Terminado", "Error"]
+MAX_TRABAJADORES = 2
+DIRECTORIO_RESULTADOS = "resultados_trabajos"
+# Como mucho una escritura de progreso en la base cada este número de segundos
+INTERVALO_PROGRESO_S = 0.5
+
+TIPOS = {} # tipo -> (descripción, función)
+
+_ejecutor = None
+_ejecutor_lock = threading.Lock()
+_bases_revisadas = set() # bases (sucursales) cuyos trabajos interrumpidos ya se marcaron
+
+
+def tipo_trabajo(tipo, descripcion):
+    """Decorador que registra una función como tipo de trabajo en segundo plano."""
+    def decorador(funcion):
+        TIPOS[tipo] = (descripcion, funcion)
+        return funcion
+    return decorador
+
+
+def _ahora():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def directorio_resultados(db_path=None):
+    """
+    Resultados de la base `db_path` (por defecto, la actual): DIRECTORIO_RESULTADOS para DB_NAME,
+    resultados_trabajos/<base> para cada sucursal. Los ids de trabajo son de cada base, así que
+    dos sucursales no pueden compartir directorio.
+    """
+    db_path = db_path or database.base_actual()
+    if db_path == database.DB_NAME:
+        return DIRECTORIO_RESULTADOS
+    return os.path.join(DIRECTORIO_RESULTADOS, os.path.splitext(os.path.basename(db_path))[0])
+
+
+def _revisar_base(db_path):
+    # Una vez por base y proceso, antes de encolar o de consultar el estado de un tipo de trabajo
+    if db_path not in _bases_revisadas:
+        _marcar_interrumpidos_db(db_path)
+        _bases_revisadas.add(db_path)
+
+
+def _get_ejecutor(db_path):
+    global _ejecutor
+    with _ejecutor_lock:
+        _revisar_base(db_path)
+        if _ejecutor is None:
+            _ejecutor = ThreadPoolExecutor(MAX_TRABAJADORES, thread_name_prefix="trabajo")
+    return _ejecutor
+
+
+def _ejecutar_sql(conn, sql, params):
+    conn.execute(sql, params)
+
+
+def _actualizar_db(db_path, sql, params):
+    """Una sentencia sobre `trabajos` en el escritor de `db_path`; espera a que se confirme."""
+    enviar_escritura(_ejecutar_sql, sql, params, tablas=("trabajos",), db_path=db_path).result()
+
+
+def _marcar_interrumpidos_db(db_path):
+    # Trabajos que quedaron a medias en un proceso anterior (el servidor se reinició)
+    _actualizar_db(db_path, """
+        UPDATE trabajos SET estado = 'Error', error = 'Interrumpido: el servidor se reinició', terminado = ?
+        WHERE estado IN ('En cola', 'En ejecución') AND COALESCE(proceso, 0) <> ?
+    """, (_ahora(), os.getpid()))
+
+
+class Progreso:
+    """Callable que recibe cada trabajo para informar su avance (fracción 0..1 y mensaje)."""
+
+    def __init__(self, id_trabajo, db_path):
+        self.id_trabajo = id_trabajo
+        self.db_path = db_path
+        self._ultima = 0.0
+
+    def __call__(self, fraccion, mensaje=None):
+        ahora = time.monotonic()
+        if ahora - self._ultima < INTERVALO_PROGRESO_S and fraccion < 1:
+            return
+        self._ultima = ahora
+        _actualizar_db(self.db_path, "UPDATE trabajos SET progreso = ?, mensaje = COALESCE(?, mensaje) WHERE id = ?",
+                       (max(0.0, min(float(fraccion), 1.0)), mensaje, self.id_trabajo))
+
+
+def enviar_trabajo(tipo, parametros=None, sesion=None):
+    """
+    Encola un trabajo y devuelve su id sin esperar a que termine.
+    Si ya hay un trabajo igual (mismo tipo y parámetros) en cola o en ejecución, devuelve
+    ese id: varias sesiones pidiendo el mismo reporte lo calculan una sola vez.
+    """
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo de trabajo desconocido: '{tipo}'")
+    descripcion, _ = TIPOS[tipo]
+    parametros_json = json.dumps(parametros or {}, sort_keys=True, ensure_ascii=False, default=str)
+    db_path = database.base_actual()
+    ejecutor = _get_ejecutor(db_path)
+
+    # En el escritor (BEGIN IMMEDIATE): dos sesiones pidiendo lo mismo a la vez no lo encolan dos veces
+    def encolar(conn):
+        fila = conn.execute("""
+            SELECT id FROM trabajos
+            WHERE tipo = ? AND parametros = ? AND estado IN ('En cola', 'En ejecución')
+            ORDER BY id DESC LIMIT 1
+        """, (tipo, parametros_json)).fetchone()
+        if fila:
+            return fila[0], False
+        c = conn.execute("""
+            INSERT INTO trabajos (tipo, descripcion, parametros, estado, sesion, proceso, creado)
+            VALUES (?, ?, ?, 'En cola', ?, ?, ?)
+        """, (tipo, descripcion, parametros_json, sesion, os.getpid(), _ahora()))
+        return c.lastrowid, True
+
+    id_trabajo, nuevo = enviar_escritura(encolar, tablas=("trabajos",), db_path=db_path).result()
+    if not nuevo:
+        return id_trabajo
+    ejecutor.submit(_ejecutar, id_trabajo, tipo, parametros or {}, db_path)
+    return id_trabajo
+
+
+def _ejecutar(id_trabajo, tipo, parametros, db_path):
+    _actualizar_db(db_path, "UPDATE trabajos SET estado = 'En ejecución', iniciado = ? WHERE id = ?", (_ahora(), id_trabajo))
+    try:
+        _, funcion = TIPOS[tipo]
+        # El trabajo usa la base (sucursal) de la sesión que lo pidió
+        with database.usando_base(db_path):
+            resultado = funcion(parametros, Progreso(id_trabajo, db_path))
+        archivo = nombre_archivo = None
+        if resultado is not None:
+            nombre_archivo, contenido = resultado
+            directorio = directorio_resultados(db_path)
+            os.makedirs(directorio, exist_ok=True)
+            archivo = os.path.join(directorio, f"{id_trabajo}_{nombre_archivo}")
+            if isinstance(contenido, str):
+                os.replace(contenido, archivo) # ya escrito en disco por el trabajo
+            else:
+                with open(archivo, "wb") as f:
+                    f.write(contenido)
+        _actualizar_db(db_path, """
+            UPDATE trabajos SET estado = 'Terminado', progreso = 1, terminado = ?, archivo = ?, nombre_archivo = ?
+            WHERE id = ?
+        """, (_ahora(), archivo, nombre_archivo, id_trabajo))
+    except Exception as e:
+        traceback.print_exc()
+        _actualizar_db(db_path, "UPDATE trabajos SET estado = 'Error', error = ?, terminado = ? WHERE id = ?",
+                       (f"{type(e).__name__}: {e}", _ahora(), id_trabajo))
+
+
+def _filas_a_dicts(c):
+    columnas = [d[0] for d in c.description]
+    return [dict(zip(columnas, fila)) for fila in c.fetchall()]
+
+
+def obtener_trabajo_db(id_trabajo):
+    with conexion() as conn:
+        trabajos = _filas_a_dicts(conn.execute("SELECT * FROM trabajos WHERE id = ?", (id_trabajo,)))
+    return trabajos[0] if trabajos else None
+
+
+def ultimo_trabajo_db(tipo):
+    """
+    Último trabajo de `tipo` en la base actual (de cualquier sesión), o None. Los que quedaron a
+    medias en un proceso anterior ya aparecen con estado 'Error'.
+    """
+    db_path = database.base_actual()
+    with _ejecutor_lock:
+        _revisar_base(db_path)
+    with conexion() as conn:
+        trabajos = _filas_a_dicts(conn.execute("SELECT * FROM trabajos WHERE tipo = ? ORDER BY id DESC LIMIT 1", (tipo,)))
+    return trabajos[0] if trabajos else None
+
+
+def listar_trabajos_db(limite=10, sesion=None):
+    """Últimos trabajos (de todas las sesiones, o solo de `sesion`), del más reciente al más antiguo."""
+    sql = "SELECT * FROM trabajos"
+    params = []
+    if sesion is not None:
+        sql += " WHERE sesion = ?"
+        params.append(sesion)
+    sql += " ORDER BY id DESC LIMIT ?"
+    params.append(int(limite))
+    with conexion() as conn:
+        return _filas_a_dicts(conn.execute(sql, params))
+
+
+def leer_resultado(trabajo):
+    """Contenido del archivo resultado de un trabajo terminado (None si no hay o ya se borró)."""
+    if not trabajo or not trabajo.get('archivo') or not os.path.exists(trabajo['archivo']):
+        return None
+    with open(trabajo['archivo'], "rb") as f:
+        return f.read()
+
+
+def esperar_trabajo(id_trabajo, timeout=None, intervalo=0.2):
+    """Bloquea hasta que el trabajo termine (para scripts y pruebas, no para la interfaz)."""
+    limite = None if timeout is None else time.monotonic() + timeout
+    while True:
+        trabajo = obtener_trabajo_db(id_trabajo)
+        if trabajo is None or trabajo['estado'] in ("Terminado", "Error"):
+            return trabajo
+        if limite is not None and time.monotonic() > limite:
+            return trabajo
+        time.sleep(intervalo)
+
+
+def limpiar_trabajos_db(dias=7):
+    """
+    Borra los trabajos terminados hace más de `dias` días y sus archivos. Devuelve cuántos.
+    Solo borra archivos del directorio de resultados de la base actual, nunca los de otra sucursal.
+    """
+    directorio = os.path.abspath(directorio_resultados())
+    corte = (datetime.now() - timedelta(days=dias)).strftime("%Y-%m-%d %H:%M:%S")
+
+    def borrar(conn):
+        viejos = conn.execute("""
+            SELECT id, archivo FROM trabajos WHERE estado IN ('Terminado', 'Error') AND terminado < ?
+        """, (corte,)).fetchall()
+        conn.executemany("DELETE FROM trabajos WHERE id = ?", [(id_trabajo,) for id_trabajo, _ in viejos])
+        return viejos
+
+    viejos = enviar_escritura(borrar, tablas=("trabajos",)).result()
+    for _, archivo in viejos:
+        if archivo and os.path.dirname(os.path.abspath(archivo)) == directorio and os.path.exists(archivo):
+            os.remove(archivo)
+    return len(viejos)
@@ -0,0 +1,148 @@
+import contextlib
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+import database
+
+# Creado por UkeGedo. Adaptado para Alex Fruver S.A.S.
+# Instrumentación opcional de la capa de datos: cuenta y cronometra cada sentencia SQL
+# (con set_trace_callback) y cada función de datos que pide una conexión al pool o una
+# escritura al escritor único (que la mide en el registro de la sesión que la pidió).
+#
+# Apagada no cuesta nada: database.TRAZADOR queda en None y el pool solo comprueba eso.
+# Encendida, solo se registran los hilos que abrieron un registro con iniciar_rerun()
+# (en Streamlit, las sesiones que activaron el panel de rendimiento).
+
+# Sentencias más lentas que esto (ms) van al registro de consultas lentas
+UMBRAL_LENTA_MS = float(os.environ.get("ALEXFRUVER_UMBRAL_LENTA_MS", "50"))
+MAX_CONSULTAS_LENTAS = 200
+# ALEXFRUVER_TRAZAS=1 deja el panel de rendimiento encendido por defecto
+ACTIVAS_POR_DEFECTO = os.environ.get("ALEXFRUVER_TRAZAS") == "1"
+
+consultas_lentas = deque(maxlen=MAX_CONSULTAS_LENTAS)
+
+_local = threading.local()
+_ARCHIVOS_INTERNOS = {os.path.abspath(__file__), os.path.abspath(database.__file__), os.path.abspath(contextlib.__file__)}
+
+
+class RegistroRerun:
+    """Métricas de una ejecución del script (o de cualquier bloque de trabajo de un hilo)."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tiempo_db = 0.0
+        self.lecturas_cache = 0
+        self.funciones = {} # nombre -> [llamadas, segundos, consultas]
+
+    def tiempo_total(self):
+        return time.perf_counter() - self.inicio
+
+
+class _Trazador:
+    """Ganchos que el pool y el escritor único de database.py llaman al prestar/devolver conexiones."""
+
+    def al_prestar(self, conn, nombre=None):
+        registro = getattr(_local, "registro", None)
+        if registro is None:
+            return
+        conn.set_trace_callback(_al_ejecutar_sentencia)
+        pila = _local.__dict__.setdefault("pila", [])
+        pila.append([nombre or _funcion_llamadora(), time.perf_counter(), registro.consultas])
+
+    def al_devolver(self, conn):
+        registro = getattr(_local, "registro", None)
+        pila = getattr(_local, "pila", None)
+        if registro is None or not pila:
+            return
+        _cerrar_sentencia(registro)
+        conn.set_trace_callback(None)
+        nombre, inicio, consultas_previas = pila.pop()
+        funcion = registro.funciones.setdefault(nombre, [0, 0.0, 0])
+        funcion[0] += 1
+        funcion[1] += time.perf_counter() - inicio
+        funcion[2] += registro.consultas - consultas_previas
+
+    def al_leer_cache(self, nombre):
+        registro = getattr(_local, "registro", None)
+        if registro is not None:
+            registro.lecturas_cache += 1
+
+    def contexto(self):
+        """Registro del hilo actual (None si no se está midiendo), para medir en otro hilo lo que pide."""
+        return getattr(_local, "registro", None)
+
+    @contextlib.contextmanager
+    def en_contexto(self, registro):
+        """Registra en `registro` lo que ocurra en este hilo durante el bloque (p. ej. en el escritor único)."""
+        anterior = (getattr(_local, "registro", None), getattr(_local, "pila", None), getattr(_local, "sentencia", None))
+        _local.registro, _local.pila, _local.sentencia = registro, [], None
+        try:
+            yield
+        finally:
+            _local.registro, _local.pila, _local.sentencia = anterior
+
+
+def _funcion_llamadora():
+    """Nombre de la primera función fuera de database/contextlib/trazas en la pila."""
+    frame = sys._getframe(1)
+    while frame is not None and os.path.abspath(frame.f_code.co_filename) in _ARCHIVOS_INTERNOS:
+        frame = frame.f_back
+    return frame.f_code.co_name if frame is not None else "?"
+
+
+def _al_ejecutar_sentencia(sql):
+    # SQLite avisa al empezar cada sentencia: la anterior se da por terminada ahora.
+    # La duración incluye el recorrido de sus filas hasta que arranca la siguiente.
+    registro = getattr(_local, "registro", None)
+    if registro is None:
+        return
+    _cerrar_sentencia(registro)
+    registro.consultas += 1
+    _local.sentencia = (sql, time.perf_counter())
+
+
+def _cerrar_sentencia(registro):
+    sentencia = getattr(_local, "sentencia", None)
+    if sentencia is None:
+        return
+    _local.sentencia = None
+    sql, inicio = sentencia
+    duracion = time.perf_counter() - inicio
+    registro.tiempo_db += duracion
+    if duracion * 1000 >= UMBRAL_LENTA_MS:
+        pila = getattr(_local, "pila", None)
+        consultas_lentas.append({
+            'fecha': time.strftime("%Y-%m-%d %H:%M:%S"),
+            'funcion': pila[-1][0] if pila else "?",
+            'ms': round(duracion * 1000, 2),
+            'sql': " ".join(sql.split()),
+        })
+
+
+def activar():
+    """Instala los ganchos en el pool (una vez por proceso)."""
+    if database.TRAZADOR is None:
+        database.TRAZADOR = _Trazador()
+
+
+def desactivar():
+    database.TRAZADOR = None
+
+
+def iniciar_rerun():
+    """Abre un registro nuevo para el hilo actual y lo devuelve."""
+    activar()
+    _local.registro = RegistroRerun()
+    _local.pila = []
+    _local.sentencia = None
+    return _local.registro
+
+
+def terminar_rerun():
+    """Deja de registrar en el hilo actual."""
+    _local.registro = None
+